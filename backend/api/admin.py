@@ -1,12 +1,125 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Airline, Flight , Reservation
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.utils.functional import cached_property
+
+from . import inventory
+from .jobs import cancellation_notices
+from .models import Airline, Flight , Reservation, city_key
 from .models import PasswordResetRequest
 from .models import ContactMessage
 
+
+def estimated_rows(model, using):
+    """Row count of ``model``'s table from the planner statistics, or None if the backend has none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'mysql':
+        sql = "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"
+    elif connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)"
+    else:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Unfiltered changelists of big tables show the estimated row count instead of running COUNT(*)."""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimated_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate >= getattr(settings, 'ADMIN_ESTIMATED_COUNT_MIN', 100000):
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Pas de second COUNT(*) sur toute la table quand un filtre est actif
+    show_full_result_count = False
+
+
+@admin.register(Flight)
+class FlightAdmin(LargeTableAdmin):
+    list_display = ('id', 'airline', 'departure_city', 'arrival_city', 'departure_time', 'price',
+                    'available_seats', 'total_seats', 'cancelled')
+    list_select_related = ('airline',)
+    list_filter = ('airline', 'cancelled')
+    raw_id_fields = ('airline',)
+    # Index flight_departure_idx (departure_time, id)
+    date_hierarchy = 'departure_time'
+    ordering = ('-departure_time', '-id')
+    search_fields = ('departure_key',)
+    search_help_text = "Numéro de vol, ville de départ, ou trajet « Casablanca > Paris »"
+    actions = ('cancel_flights', 'release_orphan_seats')
+
+    def get_search_results(self, request, queryset, search_term):
+        # Recherche exacte sur les clés indexées (flight_route_idx) au lieu d'un LIKE '%...%'
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if term.isdigit():
+            return queryset.filter(pk=int(term)), False
+        origin, _, destination = term.partition('>')
+        queryset = queryset.filter(departure_key=city_key(origin))
+        if destination.strip():
+            queryset = queryset.filter(arrival_key=city_key(destination))
+        return queryset, False
+
+    @admin.action(description="Annuler les vols sélectionnés (réservations supprimées, passagers prévenus)")
+    def cancel_flights(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        # Les e-mails partent dans la même transaction que l'annulation
+        with transaction.atomic():
+            dropped = inventory.cancel_flights(ids)
+            notices = cancellation_notices(dropped)
+        self.message_user(request, f"{len(ids)} vol(s) annulé(s), {len(dropped)} réservation(s) "
+                                   f"supprimée(s), {len(notices)} e-mail(s) en file d'attente.")
+
+    @admin.action(description="Libérer les sièges sans réservation ni blocage")
+    def release_orphan_seats(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        written = inventory.release_orphan_seats(ids)
+        self.message_user(request, f"Sièges libérés sur {len(written)} vol(s) sur {len(ids)}.")
+
+
+@admin.register(Reservation)
+class ReservationAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'flight', 'seat_count', 'reserved_at')
+    # __str__ de l'utilisateur et du vol: une seule requête avec jointures
+    list_select_related = ('user', 'flight')
+    raw_id_fields = ('user', 'flight')
+    # Index reservation_reserved_idx
+    date_hierarchy = 'reserved_at'
+    search_fields = ('=user__username',)
+
+    @admin.display(description="Sièges")
+    def seat_count(self, obj):
+        return len(obj.seats)
+
+    # La suppression libère aussi les sièges du vol (voir api/inventory.py)
+    def delete_model(self, request, obj):
+        inventory.cancel_reservations([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        inventory.cancel_reservations(list(queryset.values_list('pk', flat=True)))
+
+
+@admin.register(ContactMessage)
+class ContactMessageAdmin(LargeTableAdmin):
+    list_display = ('email', 'subject', 'date_sent')
+    date_hierarchy = 'date_sent'
+    search_fields = ('=email',)
+
+
 admin.site.register(Airline)
-admin.site.register(Flight)
-admin.site.register(Reservation)
-admin.site.register(ContactMessage)
 
 class PasswordResetRequestAdmin(admin.ModelAdmin):
     list_display = ('username', 'email', 'message', 'requested_at')  # Assure-toi que 'requested_at' est un champ valide
@@ -0,0 +1,79 @@
+"""Async variants of the read-only catalog endpoints.
+
+They reuse the DRF views' querysets, filters, paginator and serializers and
+only swap query execution for Django's async ORM, so under backend/asgi.py a
+slow query parks a coroutine instead of pinning a worker thread.  Responses
+are identical to the sync endpoints, minus the response cache.
+"""
+from functools import wraps
+
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+
+from .inventory import reserved_labels
+from .models import Flight
+from .views import AirlineDetailView, AirlineFlightList, AirlineList, FlightDetail, FlightList
+
+
+def json_errors(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            return JsonResponse(detail, status=exc.status_code, safe=False)
+    return wrapper
+
+
+def _bind(view_class, request, kwargs):
+    return view_class(request=Request(request), args=(), kwargs=kwargs, format_kwarg=None)
+
+
+async def _list(view_class, request, **kwargs):
+    view = _bind(view_class, request, kwargs)
+    queryset = view.filter_queryset(view.get_queryset())
+    page = await view.paginator.apaginate_queryset(queryset, view.request, view=view)
+    return JsonResponse(view.paginator.get_paginated_data(view.get_serializer(page, many=True).data))
+
+
+async def _detail(view_class, request, **kwargs):
+    view = _bind(view_class, request, kwargs)
+    lookup = view.lookup_url_kwarg or view.lookup_field
+    instance = await view.filter_queryset(view.get_queryset()).filter(**{view.lookup_field: kwargs[lookup]}).afirst()
+    if instance is None:
+        raise NotFound()
+    return JsonResponse(view.get_serializer(instance).data)
+
+
+@json_errors
+async def airline_list(request):
+    return await _list(AirlineList, request)
+
+
+@json_errors
+async def airline_detail(request, id):
+    return await _detail(AirlineDetailView, request, id=id)
+
+
+@json_errors
+async def airline_flights(request, id):
+    return await _list(AirlineFlightList, request, id=id)
+
+
+@json_errors
+async def flight_list(request):
+    return await _list(FlightList, request)
+
+
+@json_errors
+async def flight_detail(request, pk):
+    return await _detail(FlightDetail, request, pk=pk)
+
+
+async def flight_seats(request, flight_id):
+    flight = await Flight.objects.only('id', 'total_seats', 'seat_map', 'available_seats').filter(id=flight_id).afirst()
+    if flight is None:
+        return JsonResponse({"error": "Flight not found"}, status=404)
+    return JsonResponse({"available_seats": flight.available_seats, "reserved_seats": reserved_labels(flight)})
@@ -0,0 +1,78 @@
+"""JWT authentication without a per-request ``auth_user`` query.
+
+Tokens issued by ``tokens_for`` carry the user's username, email and a
+fingerprint of the password hash.  ``ClaimsJWTAuthentication`` builds the
+request user from those claims and only checks the mutable parts (still
+active, still staff, password unchanged) against a small cache entry that
+lives ``AUTH_USER_CACHE_SECONDS`` and is dropped whenever the user row is
+saved or deleted.  A password change therefore revokes every older token.
+Tokens without the claims fall back to the regular database lookup.
+
+The entry lives in the shared ``default`` cache, so a revocation reaches
+every worker at once.  It is dropped on save and again once the transaction
+commits, since a request in between could cache the old row again.  Queryset
+``update()`` calls send no signal: call ``forget_user_status`` for each user
+they touch, or the change takes up to ``AUTH_USER_CACHE_SECONDS`` to apply.
+
+The request user is a real ``User`` instance that holds only the claimed
+fields: it works as a foreign key value and with the serializers, but must
+never be ``save()``d.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+CLAIMS = ('username', 'email', 'auth')
+
+
+def _status_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def tokens_for(user):
+    """Refresh token (and through it the access token) carrying the stateless claims."""
+    refresh = RefreshToken.for_user(user)
+    refresh['username'] = user.username
+    refresh['email'] = user.email
+    refresh['auth'] = user.get_session_auth_hash()
+    return refresh
+
+
+def user_status(user_id):
+    """(is_active, is_staff, auth hash) of a user, cached; None if the user is gone."""
+    key = _status_key(user_id)
+    status = cache.get(key)
+    if status is None:
+        user = User.objects.filter(pk=user_id).only('id', 'password', 'is_active', 'is_staff').first()
+        status = (user.is_active, user.is_staff, user.get_session_auth_hash()) if user else ()
+        cache.set(key, status, getattr(settings, 'AUTH_USER_CACHE_SECONDS', 60))
+    return status or None
+
+
+def forget_user_status(user_id):
+    cache.delete(_status_key(user_id))
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not all(claim in validated_token for claim in CLAIMS):
+            return super().get_user(validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        status = user_status(user_id)
+        if status is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        is_active, is_staff, auth_hash = status
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token['auth'] != auth_hash:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        user = User(id=user_id, username=validated_token['username'], email=validated_token['email'],
+                    is_active=True, is_staff=is_staff)
+        user._state.adding = False
+        user._state.db = 'default'
+        return user
@@ -0,0 +1,178 @@
+"""Reproducible end-to-end benchmark of the catalog and booking endpoints.
+
+``seed`` creates a fixed data set (``Bench`` airlines, a season of flights
+with partly sold seat maps and one large "hot" flight) from a seeded RNG, so
+two runs on two commits measure the same thing.  ``run`` drives each
+scenario through the WSGI handler with ``loadtest.run_sync`` and returns
+one ``LoadResult`` per scenario and concurrency; ``compare`` checks them
+against a saved baseline.  The median query count per request is exact and
+compared strictly; throughput, latency and errors (lock timeouts under
+contention) vary between runs and machines and are compared within a
+tolerance, so keep the baseline of the machine that runs the comparison.
+"""
+import json
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from . import cache, fares
+from .authentication import tokens_for
+from .loadtest import HOST, run_sync
+from .models import Airline, Flight, city_key
+from .seatmap import SeatBitmap
+
+PREFIX = 'Bench'
+CITIES = ['Casablanca', 'Rabat', 'Marrakech', 'Agadir', 'Fes', 'Tanger', 'Paris', 'Lyon', 'Madrid',
+          'London', 'Brussels', 'Amsterdam', 'Rome', 'Lisbon', 'Dubai', 'Istanbul']
+SEAT_CONFIGS = [120, 150, 180, 200, 240]
+HOT_SEATS = 20000
+START = datetime(2030, 1, 1)
+SCENARIOS = ('search', 'seatmap', 'reserve-hot', 'create-reservation')
+ERROR_SLACK = 0.02
+
+# Les réponses ne passent pas par le cache et les seaux de throttling sont coupés
+UNTHROTTLED = {
+    'CACHES': {**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'API_CACHE_ALIAS': 'benchmark',
+    'THROTTLE_BUCKETS': {},
+    # Le client de charge s'annonce comme HOST, accepté même avec DEBUG=False (tests, production)
+    'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, HOST],
+}
+
+
+def clear():
+    """Delete every benchmark airline with its flights, reservations and users."""
+    deleted = Airline.objects.filter(name__startswith=PREFIX).delete()[0]
+    User.objects.filter(username__startswith=f'{PREFIX.lower()}-').delete()
+    return deleted
+
+
+def seed(flights=5000, airlines=5, days=90, users=50, seed=0):
+    """Replace the benchmark data set; returns the hot flight."""
+    rng = random.Random(seed)
+    clear()
+    start = timezone.make_aware(START)
+    carriers = Airline.objects.bulk_create(
+        [Airline(name=f"{PREFIX} Air {i}", description="Benchmark airline") for i in range(1, airlines + 1)]
+    )
+    batch = []
+    for _ in range(flights):
+        origin, destination = rng.sample(CITIES, 2)
+        departs = start + timedelta(minutes=rng.randrange(days * 24 * 60 // 5) * 5)
+        total_seats = rng.choice(SEAT_CONFIGS)
+        # Remplissage réaliste: la plupart des vols sont à moitié pleins, quelques-uns complets
+        bitmap = SeatBitmap.for_flight(total_seats)
+        sold = min(bitmap.size, int(bitmap.size * rng.betavariate(2, 2.5)))
+        for index in rng.sample(range(bitmap.size), sold):
+            bitmap.reserve(index)
+        batch.append(_flight(rng.choice(carriers), origin, destination, departs,
+                             departs + timedelta(minutes=rng.randrange(60, 8 * 60, 5)),
+                             Decimal(rng.randrange(300, 4000)), total_seats, bitmap))
+    hot_map = SeatBitmap.for_flight(HOT_SEATS)
+    batch.append(_flight(carriers[0], 'Casablanca', 'Paris', start + timedelta(days=1),
+                         start + timedelta(days=1, hours=3), Decimal('1200'), HOT_SEATS, hot_map))
+    with transaction.atomic():
+        Flight.objects.bulk_create(batch, batch_size=1000)
+    User.objects.bulk_create([
+        User(username=f"{PREFIX.lower()}-{i}", email=f"{PREFIX.lower()}-{i}@example.com", password='!')
+        for i in range(users)
+    ])
+    fares.rebuild()
+    cache.bump(cache.FLIGHT, cache.SCHEDULE, cache.AIRLINE)
+    return batch[-1]
+
+
+def _flight(airline, origin, destination, departs, arrives, price, total_seats, bitmap):
+    # bulk_create skips Flight.save(), so the keys and the inventory are filled in here
+    return Flight(
+        airline=airline, departure_city=origin, arrival_city=destination,
+        departure_key=city_key(origin), arrival_key=city_key(destination),
+        departure_time=departs, arrival_time=arrives, price=price, total_seats=total_seats,
+        seat_map=bitmap.to_bytes(), available_seats=bitmap.free_count(),
+    )
+
+
+def _post(path, payload, token=None):
+    headers = {'HTTP_AUTHORIZATION': f"Bearer {token}"} if token else {}
+
+    def request(client, i):
+        return client.post(path, json.dumps(payload(i) if callable(payload) else payload),
+                           content_type='application/json', **headers)
+    return request
+
+
+def scenarios(requests, seed=0):
+    """Request lists per scenario, built from the seeded data."""
+    rng = random.Random(seed)
+    bench = Flight.objects.filter(airline__name__startswith=PREFIX)
+    hot = bench.filter(total_seats=HOT_SEATS).order_by('-id').first()
+    if hot is None:
+        raise LookupError("no benchmark data, run seed() first")
+    flights = list(bench.exclude(pk=hot.pk).values_list('id', 'departure_city', 'arrival_city', 'departure_time'))
+    bookable = list(bench.exclude(pk=hot.pk).filter(available_seats__gte=10).values_list('id', flat=True))
+    users = list(User.objects.filter(username__startswith=f'{PREFIX.lower()}-').order_by('id'))
+    tokens = [str(tokens_for(user).access_token) for user in users]
+
+    search = []
+    for _ in range(min(requests, 200)):
+        _, origin, destination, departs = rng.choice(flights)
+        search.append(rng.choice([
+            f'/api/flights/?search={origin}&ordering=price&page_size=20',
+            f'/api/flights/?departure_from={departs.date()}&is_available=true&page_size=20',
+            f'/api/flights/search/?origin={origin}&destination={destination}&date={departs.date()}',
+            f'/api/flights/search/?origin={origin}&destination={destination}&sort=price&min_seats=2',
+        ]))
+    booking = []
+    for i in range(requests):
+        flight_id = rng.choice(bookable)
+        booking.append(_post('/api/reservations/', {'flight': flight_id, 'seats': 1}, tokens[i % len(tokens)]))
+    return {
+        'search': search,
+        'seatmap': [f'/api/flights/{flight[0]}/seatmap/' for flight in rng.sample(flights, min(requests, len(flights)))],
+        'reserve-hot': [_post(f'/api/flights/{hot.pk}/reserve/', {'seats': 1})],
+        'create-reservation': booking,
+    }
+
+
+def run(names, requests, concurrencies, seed=0):
+    """Run ``names`` at each concurrency; returns {"scenario@c": LoadResult}."""
+    results = {}
+    with override_settings(**UNTHROTTLED):
+        plans = scenarios(requests, seed)
+        for name in names:
+            for concurrency in concurrencies:
+                results[f"{name}@{concurrency}"] = run_sync(name, plans[name], requests, concurrency)
+    return results
+
+
+def save(results, path):
+    with open(path, 'w') as stream:
+        json.dump({key: result.summary() for key, result in results.items()}, stream, indent=2, sort_keys=True)
+        stream.write('\n')
+
+
+def compare(results, baseline, tolerance=0.5):
+    """Regressions of ``results`` against a baseline mapping, as human-readable lines."""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        now = result.summary()
+        # Les retries sous contention font varier la moyenne: la médiane est comparée strictement
+        if now['median_queries'] > before['median_queries']:
+            regressions.append(f"{key}: {now['median_queries']} queries/request, was {before['median_queries']}")
+        # 409 sur le vol chargé: attendus sous contention, seule une hausse nette compte
+        if now['errors'] > before['errors'] * (1 + tolerance) + now['requests'] * ERROR_SLACK:
+            regressions.append(f"{key}: {now['errors']} errors, was {before['errors']}")
+        if now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {now['p95_ms']}ms, was {before['p95_ms']}ms")
+        if now['rps'] < before['rps'] * (1 - tolerance):
+            regressions.append(f"{key}: {now['rps']} req/s, was {before['rps']}")
+    return regressions
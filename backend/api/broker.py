@@ -0,0 +1,137 @@
+"""Fan-out of seat changes to open seat maps.
+
+``publish`` is called from sync code after a seat write commits;
+``subscribe`` is used by the async SSE view.  Each subscriber keeps one
+merged "pending" state instead of a queue of events, so a burst of bookings
+reaches a slow client as a single message and memory per client stays
+bounded.  The backend is chosen with ``settings.SEAT_BROKER`` so a
+multi-process deployment can swap ``LocalBroker`` for a Redis pub/sub one
+exposing the same two methods.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Beyond this many pending seat changes the client is told to refetch the full map
+MAX_PENDING = 500
+
+
+class Subscription:
+    def __init__(self, broker, flight_id):
+        self.broker = broker
+        self.flight_id = flight_id
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._version = None
+        self._resync = False
+
+    def push(self, version, reserved, released):
+        with self._lock:
+            # Commits from different threads may arrive out of order; the newest version wins per seat
+            self._version = max(version, self._version or 0)
+            for state, labels in ((True, reserved), (False, released)):
+                for label in labels:
+                    if version >= self._pending.get(label, (None, 0))[1]:
+                        self._pending[label] = (state, version)
+            if len(self._pending) > MAX_PENDING:
+                self._pending.clear()
+                self._resync = True
+        try:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        except RuntimeError:
+            # Event loop already closed: the client is gone
+            self.close()
+
+    def drain(self):
+        with self._lock:
+            if self._version is None:
+                return None
+            batch = {
+                'version': self._version,
+                'reserved': sorted(label for label, (on, _) in self._pending.items() if on),
+                'released': sorted(label for label, (on, _) in self._pending.items() if not on),
+            }
+            if self._resync:
+                batch['resync'] = True
+            self._pending, self._version, self._resync = {}, None, False
+            self.wakeup.clear()
+            return batch
+
+    async def next(self, timeout, window=0.05):
+        """Wait for changes, let a burst settle for ``window`` seconds, return the merged batch."""
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        await asyncio.sleep(window)
+        return self.drain()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """In-process broker: every worker only sees bookings made in that worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, flight_id):
+        subscription = Subscription(self, flight_id)
+        with self._lock:
+            self._subscribers[flight_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.flight_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.flight_id]
+
+    def publish(self, flight_id, version, reserved, released):
+        with self._lock:
+            subscribers = list(self._subscribers.get(flight_id, ()))
+        for subscription in subscribers:
+            subscription.push(version, reserved, released)
+
+    def subscriber_count(self, flight_id=None):
+        with self._lock:
+            if flight_id is None:
+                return sum(len(s) for s in self._subscribers.values())
+            return len(self._subscribers.get(flight_id, ()))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'SEAT_BROKER', 'api.broker.LocalBroker'))()
+        return _broker
+
+
+async def event_stream(flight_id, keepalive=15):
+    """Server-Sent Events for one flight: one ``seats`` event per merged batch."""
+    subscription = get_broker().subscribe(flight_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            batch = await subscription.next(timeout=keepalive)
+            if batch is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"id: {batch['version']}\nevent: seats\ndata: {json.dumps(batch)}\n\n"
+    finally:
+        subscription.close()
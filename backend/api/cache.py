@@ -0,0 +1,104 @@
+"""Versioned response cache for the catalog endpoints.
+
+Every cached response is keyed by its normalized URL plus the current
+version stamp of the data it depends on ("airline", "flight").  Writes never
+delete cache entries; they bump the stamp, which changes every key at once
+and leaves the stale entries to expire.  The same key doubles as the ETag.
+
+There is no Last-Modified: the newest ``updated_at`` of a response does not
+move when a row is deleted or leaves the result, so If-Modified-Since would
+answer 304 with a stale list.  Clients revalidate with the ETag.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .routers import reading_from_replica
+
+AIRLINE = 'airline'
+FLIGHT = 'flight'
+# Flight schedule only (not seats), for the itinerary index
+SCHEDULE = 'schedule'
+# Fare calendar rows (FareDay)
+FARES = 'fares'
+
+
+def api_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def _version_key(namespace):
+    return f"api:version:{namespace}"
+
+
+def bump(*namespaces):
+    """Move the stamps of ``namespaces`` on; returns the new stamps, in order."""
+    cache = api_cache()
+    stamps = []
+    for namespace in namespaces:
+        try:
+            stamps.append(cache.incr(_version_key(namespace)))
+        except ValueError:
+            # Missing (evicted or first write): restart from a clock value so old keys never match again
+            stamps.append(time.time_ns())
+            cache.set(_version_key(namespace), stamps[-1], None)
+    return stamps
+
+
+def versions(namespaces):
+    cache = api_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def response_key(request, namespaces):
+    params = sorted((k, v) for k in request.query_params for v in request.query_params.getlist(k) if v != '')
+    query = '&'.join(f"{k}={v}" for k, v in params)
+    stamp = ':'.join(str(v) for v in versions(namespaces))
+    raw = f"{request.get_host()}{request.path}?{query}|{stamp}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+class CachedResponseMixin:
+    """Serve GET from the versioned cache, with ETag revalidation."""
+    cache_namespaces = (FLIGHT, AIRLINE)
+
+    def cache_timeout(self):
+        timeout = getattr(settings, 'API_CACHE_TIMEOUT', 300)
+        if reading_from_replica():
+            # A lagging replica may still return rows older than the current stamp
+            timeout = min(timeout, getattr(settings, 'REPLICA_CACHE_TIMEOUT', 5))
+        return timeout
+
+    def _stamp(self, response, etag):
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        key = response_key(request, self.cache_namespaces)
+        etag = f'"{key}"'
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+            return self._stamp(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        cache = api_cache()
+        entry = cache.get(f"api:response:{key}")
+        if entry is None:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cache.set(f"api:response:{key}", {'data': response.data}, self.cache_timeout())
+        else:
+            response = Response(entry['data'])
+        return self._stamp(response, etag)
@@ -0,0 +1,176 @@
+"""Streaming CSV / NDJSON exports of reservations and passenger manifests.
+
+Rows are read in keyset chunks of ``EXPORT_CHUNK_SIZE`` (``WHERE (flight,
+id) > (last...) LIMIT n``, see pagination.py) and encoded one chunk at a time,
+so an export of millions of rows holds one chunk in memory whatever the
+database: ``QuerySet.iterator()`` alone would not be enough on MySQL, whose
+client library buffers the whole result set.  Each chunk is a short query of
+its own, so an export also never holds a long-running transaction open.
+"""
+import csv
+from itertools import groupby
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Reservation
+from .pagination import KeysetPagination
+from .seatmap import SeatError, seat_index
+
+RESERVATION_COLUMNS = (
+    'reservation', 'reserved_at', 'flight', 'departure_city', 'arrival_city', 'departure_time',
+    'user', 'username', 'email', 'seat_count', 'seats',
+)
+MANIFEST_COLUMNS = (
+    'flight', 'departure_city', 'arrival_city', 'departure_time', 'seat',
+    'reservation', 'user', 'username', 'first_name', 'last_name', 'email', 'reserved_at',
+)
+_FIELDS = (
+    'flight_id', 'id', 'reserved_at', 'flight__departure_city', 'flight__arrival_city', 'flight__departure_time',
+    'flight__total_seats', 'user_id', 'user__username', 'user__first_name', 'user__last_name', 'user__email', 'seats',
+)
+ORDERING = ('flight_id', 'id')
+
+
+def chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def reservations(flight=None, departs_from=None, departs_before=None, using='default'):
+    queryset = Reservation.objects.using(using)
+    if flight is not None:
+        queryset = queryset.filter(flight_id=flight)
+    if departs_from is not None:
+        queryset = queryset.filter(flight__departure_time__gte=departs_from)
+    if departs_before is not None:
+        queryset = queryset.filter(flight__departure_time__lt=departs_before)
+    return queryset
+
+
+def chunks(queryset, size=None):
+    """Lists of row dicts in (flight, id) order, ``size`` rows per query."""
+    size = size or chunk_size()
+    after = KeysetPagination().after
+    queryset = queryset.order_by(*ORDERING)
+    last = None
+    while True:
+        page = queryset.filter(after(ORDERING, last)) if last else queryset
+        rows = list(page.values(*_FIELDS)[:size])
+        if not rows:
+            return
+        yield rows
+        if len(rows) < size:
+            return
+        last = [rows[-1]['flight_id'], rows[-1]['id']]
+
+
+def whole_flights(chunks):
+    """Re-cut chunks so that a flight's reservations are never split between two of them."""
+    pending = []
+    for rows in chunks:
+        rows = pending + rows
+        last = rows[-1]['flight_id']
+        cut = len(rows)
+        while cut and rows[cut - 1]['flight_id'] == last:
+            cut -= 1
+        pending = rows[cut:]
+        if cut:
+            yield rows[:cut]
+    if pending:
+        yield pending
+
+
+def reservation_rows(rows):
+    return [{
+        'reservation': row['id'],
+        'reserved_at': row['reserved_at'],
+        'flight': row['flight_id'],
+        'departure_city': row['flight__departure_city'],
+        'arrival_city': row['flight__arrival_city'],
+        'departure_time': row['flight__departure_time'],
+        'user': row['user_id'],
+        'username': row['user__username'],
+        'email': row['user__email'],
+        'seat_count': len(row['seats']),
+        'seats': row['seats'],
+    } for row in rows]
+
+
+def _seat_order(total_seats):
+    def key(label):
+        try:
+            return 0, seat_index(label, total_seats)
+        except SeatError:
+            return 1, str(label)
+    return key
+
+
+def manifest_rows(rows):
+    """One row per seat, in seat order within each flight (chunks cut by ``whole_flights``)."""
+    out = []
+    for _, booked in groupby(rows, key=lambda row: row['flight_id']):
+        seats = [(label, row) for row in booked for label in row['seats']]
+        if not seats:
+            continue
+        order = _seat_order(seats[0][1]['flight__total_seats'])
+        seats.sort(key=lambda seat: order(seat[0]))
+        out += [{
+            'flight': row['flight_id'],
+            'departure_city': row['flight__departure_city'],
+            'arrival_city': row['flight__arrival_city'],
+            'departure_time': row['flight__departure_time'],
+            'seat': label,
+            'reservation': row['id'],
+            'user': row['user_id'],
+            'username': row['user__username'],
+            'first_name': row['user__first_name'],
+            'last_name': row['user__last_name'],
+            'email': row['user__email'],
+            'reserved_at': row['reserved_at'],
+        } for label, row in seats]
+    return out
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return ' '.join(map(str, value))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def encode_csv(columns, chunks):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for rows in chunks:
+        yield ''.join(writer.writerow([_csv_value(row[column]) for column in columns]) for row in rows)
+
+
+def encode_ndjson(columns, chunks):
+    encoder = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    for rows in chunks:
+        yield ''.join(encoder.encode(row) + '\n' for row in rows)
+
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', encode_csv),
+    'ndjson': ('application/x-ndjson', encode_ndjson),
+}
+# Colonnes, construction des lignes, découpage des morceaux
+KINDS = {
+    'reservations': (RESERVATION_COLUMNS, reservation_rows, lambda chunks: chunks),
+    'manifest': (MANIFEST_COLUMNS, manifest_rows, whole_flights),
+}
+
+
+def export(kind, fmt, queryset, size=None):
+    """Generator of encoded text chunks: ``kind`` is reservations or manifest, ``fmt`` csv or ndjson."""
+    columns, build, cut = KINDS[kind]
+    encode = FORMATS[fmt][1]
+    # A chunk whose reservations hold no seat encodes to nothing; skip it rather than send ''
+    return (text for text in encode(columns, (build(rows) for rows in cut(chunks(queryset, size)))) if text)
@@ -0,0 +1,107 @@
+"""Materialized fare calendar.
+
+``FareDay`` holds, per route and local departure day, the cheapest fare
+still on sale and how many flights have seats left.  Cells are recomputed
+from ``Flight`` (one grouped query over ``flight_route_idx``) only when
+something that changes them happens: a flight is created, moved, repriced
+or deleted, a bulk import lands, or a booking sells out or reopens a flight.
+Ordinary bookings do not touch the calendar.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import cache
+from .filters import start_of_day
+from .models import FareDay, Flight
+
+# A save touching none of these leaves the calendar as it is
+FARE_FIELDS = frozenset({'departure_city', 'arrival_city', 'departure_time', 'price', 'available_seats'})
+
+
+def day_of(moment):
+    return timezone.localtime(moment).date()
+
+
+def cell_of(flight):
+    return (flight.departure_key, flight.arrival_key, day_of(flight.departure_time))
+
+
+def _any(conditions):
+    return reduce(lambda a, b: a | b, conditions)
+
+
+def aggregate(queryset):
+    """Calendar cells of ``queryset``, as (departure_key, arrival_key, day) -> field values."""
+    bookable = Q(available_seats__gt=0)
+    rows = (
+        queryset.annotate(day=TruncDate('departure_time', tzinfo=timezone.get_current_timezone()))
+        .values('departure_key', 'arrival_key', 'day')
+        .annotate(
+            lowest_price=Min('price', filter=bookable),
+            flights=Count('id'),
+            available_flights=Count('id', filter=bookable),
+        )
+        .order_by()
+    )
+    return {
+        (row.pop('departure_key'), row.pop('arrival_key'), row.pop('day')): row
+        for row in rows
+    }
+
+
+def refresh(cells):
+    """Recompute the given (departure_key, arrival_key, day) cells."""
+    cells = set(cells)
+    if not cells:
+        return
+    days = defaultdict(list)
+    for origin, destination, day in cells:
+        days[origin, destination].append(day)
+    flights = Flight.objects.filter(_any(
+        Q(departure_key=origin, arrival_key=destination,
+          departure_time__gte=start_of_day(min(route_days)),
+          departure_time__lt=start_of_day(max(route_days)) + timedelta(days=1))
+        for (origin, destination), route_days in days.items()
+    ))
+    found = {cell: values for cell, values in aggregate(flights).items() if cell in cells}
+    empty = cells - found.keys()
+    upsert = {'update_conflicts': True, 'update_fields': ['lowest_price', 'flights', 'available_flights', 'updated_at']}
+    # MySQL (ON DUPLICATE KEY UPDATE) takes no conflict target: fareday_route_day_uniq is the only one that can fire
+    if connection.features.supports_update_conflicts_with_target:
+        upsert['unique_fields'] = ['departure_key', 'arrival_key', 'day']
+    with transaction.atomic():
+        FareDay.objects.bulk_create(
+            [FareDay(departure_key=o, arrival_key=d, day=day, **values) for (o, d, day), values in found.items()],
+            **upsert,
+        )
+        if empty:
+            FareDay.objects.filter(_any(
+                Q(departure_key=o, arrival_key=d, day=day) for o, d, day in empty
+            )).delete()
+    cache.bump(cache.FARES)
+
+
+def refresh_flight(flight_id):
+    """Recompute the cell of one flight (after a booking sold it out or reopened it)."""
+    flight = Flight.objects.only('departure_key', 'arrival_key', 'departure_time').filter(pk=flight_id).first()
+    if flight is not None:
+        refresh([cell_of(flight)])
+
+
+def rebuild():
+    """Recompute the whole calendar from ``Flight``."""
+    cells = aggregate(Flight.objects.all())
+    with transaction.atomic():
+        FareDay.objects.all().delete()
+        FareDay.objects.bulk_create(
+            [FareDay(departure_key=o, arrival_key=d, day=day, **values) for (o, d, day), values in cells.items()],
+            batch_size=1000,
+        )
+    cache.bump(cache.FARES)
+    return len(cells)
@@ -0,0 +1,38 @@
+from datetime import datetime, time, timedelta
+
+import django_filters
+from django.utils import timezone
+
+from .models import Flight
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class FlightFilter(django_filters.FilterSet):
+    # Filtre sur la colonne airline_id, sans requête de validation sur Airline
+    airline = django_filters.NumberFilter(field_name='airline_id')
+    is_available = django_filters.BooleanFilter(method='filter_is_available')
+    min_seats = django_filters.NumberFilter(field_name='available_seats', lookup_expr='gte')
+    departure_from = django_filters.DateFilter(method='filter_departure_from')
+    departure_to = django_filters.DateFilter(method='filter_departure_to')
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+
+    class Meta:
+        model = Flight
+        fields = {
+            'departure_time': ['exact'],
+            'available_seats': ['exact', 'gte'],
+        }
+
+    def filter_is_available(self, queryset, name, value):
+        return queryset.filter(available_seats__gt=0) if value else queryset.filter(available_seats=0)
+
+    # Bornes de dates converties en plages sur departure_time pour rester sur l'index
+    def filter_departure_from(self, queryset, name, value):
+        return queryset.filter(departure_time__gte=start_of_day(value))
+
+    def filter_departure_to(self, queryset, name, value):
+        return queryset.filter(departure_time__lt=start_of_day(value) + timedelta(days=1))
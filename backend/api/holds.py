@@ -0,0 +1,99 @@
+"""Temporary seat holds for checkout.
+
+A hold claims its seats in the bitmap right away, so the seats a user is
+paying for cannot be sold under them.  Paying converts the hold into a
+Reservation; otherwise ``expire_holds`` releases it once ``expires_at``
+passes.  Whoever deletes the hold row (payment or sweeper) owns the seats,
+which keeps the two from racing.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import claim_seats, release_seats
+from .models import Flight, Reservation, SeatHold
+from .seatmap import FlightCancelled
+
+
+class HoldExpired(Exception):
+    pass
+
+
+def hold_minutes(requested=None):
+    default = getattr(settings, 'SEAT_HOLD_MINUTES', 10)
+    maximum = getattr(settings, 'SEAT_HOLD_MAX_MINUTES', 30)
+    try:
+        minutes = int(requested) if requested is not None else default
+    except (TypeError, ValueError):
+        minutes = default
+    return max(1, min(minutes, maximum))
+
+
+def create_hold(user, flight_id, labels, minutes=None):
+    seats = claim_seats(flight_id, labels)
+    try:
+        return SeatHold.objects.create(
+            user=user, flight_id=flight_id, seats=seats,
+            expires_at=timezone.now() + timedelta(minutes=hold_minutes(minutes)),
+        )
+    except Exception:
+        release_seats(flight_id, seats)
+        raise
+
+
+def _release(holds):
+    # One bitmap write per flight, whatever the number of holds in the batch
+    by_flight = defaultdict(list)
+    for hold in holds:
+        by_flight[hold.flight_id].extend(hold.seats)
+    for flight_id, seats in by_flight.items():
+        release_seats(flight_id, seats)
+
+
+def cancel_hold(user, hold_id):
+    with transaction.atomic():
+        hold = SeatHold.objects.select_for_update().get(id=hold_id, user=user)
+        hold.delete()
+        _release([hold])
+
+
+def convert_hold(user, hold_id, on_booked=None):
+    """Turn a live hold into a Reservation; raises HoldExpired once it lapsed.
+
+    ``on_booked(reservation)`` runs in the same transaction, as in ``inventory.book_seats``.
+    """
+    with transaction.atomic():
+        hold = SeatHold.objects.select_for_update().get(id=hold_id, user=user)
+        if Flight.objects.filter(pk=hold.flight_id, cancelled=True).exists():
+            raise FlightCancelled(hold.flight_id)
+        hold.delete()
+        if hold.expires_at <= timezone.now():
+            _release([hold])
+            reservation = None
+        else:
+            reservation = Reservation.objects.create(user=user, flight_id=hold.flight_id, seats=hold.seats)
+            if on_booked is not None:
+                on_booked(reservation)
+    if reservation is None:
+        raise HoldExpired(hold_id)
+    return reservation
+
+
+def expire_holds(batch_size=500, now=None):
+    """Release expired holds, oldest first, one batch per transaction; returns how many."""
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                SeatHold.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now).order_by('expires_at')[:batch_size]
+            )
+            if not batch:
+                return expired
+            SeatHold.objects.filter(id__in=[hold.id for hold in batch]).delete()
+            _release(batch)
+        expired += len(batch)
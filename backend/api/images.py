@@ -0,0 +1,133 @@
+"""Pre-sized variants of airline logos.
+
+When a logo is uploaded a ``logo_variants`` job is queued (see signals.py);
+the ``run_jobs`` worker renders every size in ``VARIANTS`` as WebP and PNG
+and records them on ``Airline.logo_variants``.  File names carry a hash of
+their content, so a URL never changes meaning and the files can be served
+with a one-year immutable cache lifetime by ``variant_response``.
+"""
+import hashlib
+import io
+import mimetypes
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_etags
+from PIL import Image, UnidentifiedImageError
+
+from . import cache
+from .jobs import enqueue, handler
+from .models import Airline
+
+LOGO_VARIANTS = 'logo_variants'
+VARIANT_DIR = 'airlines/variants'
+# Nom -> boîte englobante (px); les logos gardent leurs proportions
+VARIANTS = {'thumb': 64, 'small': 256, 'medium': 480}
+FORMATS = {'webp': ('WEBP', {'quality': 85, 'method': 6}), 'png': ('PNG', {'optimize': True})}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+VARIANT_NAME = re.compile(r'^[0-9a-f]{16}\.[a-z]+\.(webp|png)$')
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+mimetypes.add_type('image/webp', '.webp')
+
+
+def render(image, box, fmt):
+    """Encode ``image`` scaled down to fit ``box`` x ``box``; returns (bytes, width, height)."""
+    variant = image.copy()
+    variant.thumbnail((box, box), Image.LANCZOS)
+    name, options = FORMATS[fmt]
+    buffer = io.BytesIO()
+    variant.save(buffer, name, **options)
+    return buffer.getvalue(), variant.width, variant.height
+
+
+def build_variants(airline):
+    """Render and store every variant of ``airline.logo``; returns the ``logo_variants`` mapping."""
+    with airline.logo.open('rb') as source:
+        image = Image.open(source)
+        image.load()
+    image = image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+    variants = {}
+    for size, box in VARIANTS.items():
+        entry = {}
+        for fmt in FORMATS:
+            data, entry['width'], entry['height'] = render(image, box, fmt)
+            digest = hashlib.sha256(data).hexdigest()[:16]
+            name = f"{VARIANT_DIR}/{digest}.{size}.{fmt}"
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(data))
+            entry[fmt] = name
+        variants[size] = entry
+    return variants
+
+
+def queue_variants(airline_id):
+    return enqueue(LOGO_VARIANTS, {'airline': airline_id})
+
+
+@handler(LOGO_VARIANTS)
+def build_logo_variants(payloads):
+    errors = []
+    for payload in payloads:
+        airline = Airline.objects.filter(pk=payload['airline']).first()
+        if airline is None or not airline.logo:
+            errors.append(None)
+            continue
+        try:
+            variants = build_variants(airline)
+        except (OSError, UnidentifiedImageError) as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            continue
+        # update(): pas de post_save, donc pas de nouvelle tâche; le cache est invalidé à la main
+        Airline.objects.filter(pk=airline.pk, logo=airline.logo.name).update(logo_variants=variants)
+        cache.bump(cache.AIRLINE)
+        errors.append(None)
+    return errors
+
+
+def variant_url(name, request=None):
+    url = settings.MEDIA_URL + name
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def variant_response(request, name):
+    """Serve one stored variant: immutable caching, ETag, single byte ranges, optional X-Sendfile."""
+    path = f"{VARIANT_DIR}/{name}"
+    if not VARIANT_NAME.match(name) or not default_storage.exists(path):
+        return HttpResponse(status=404)
+    etag = f'"{name}"'
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = IMMUTABLE
+        return response
+
+    size = default_storage.size(path)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    sendfile = getattr(settings, 'MEDIA_SENDFILE_HEADER', None)
+    match = _RANGE.match(request.headers.get('Range', ''))
+    if sendfile:
+        # The web server (nginx X-Accel-Redirect, Apache X-Sendfile) streams the file and answers ranges itself
+        response = HttpResponse(content_type=content_type)
+        response[sendfile] = getattr(settings, 'MEDIA_SENDFILE_PREFIX', settings.MEDIA_URL) + path
+    elif match and any(match.groups()):
+        first, last = match.groups()
+        start, end = (int(first), min(int(last or size - 1), size - 1)) if first else (max(0, size - int(last)), size - 1)
+        if start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            return response
+        with default_storage.open(path, 'rb') as stored:
+            stored.seek(start)
+            response = HttpResponse(stored.read(end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    else:
+        response = FileResponse(default_storage.open(path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Cache-Control'] = IMMUTABLE
+    response['Last-Modified'] = http_date(default_storage.get_modified_time(path).timestamp())
+    return response
@@ -0,0 +1,217 @@
+"""Bulk flight import from CSV, JSON-lines or JSON array schedules.
+
+Rows are streamed, resolved against an in-memory airline map and written
+with ``bulk_create`` one chunk per transaction, so a season schedule never
+sits in memory and a bad row only costs its own line.
+"""
+import csv
+import io
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache, fares
+from .models import Airline, Flight, city_key
+from .seatmap import SeatBitmap
+
+DEFAULT_CHUNK_SIZE = 1000
+FORMATS = ('csv', 'jsonl', 'json')
+# Format implied by a file name when none is given
+EXTENSIONS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.json': 'json'}
+JSON_READ_SIZE = 64 * 1024
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    errors: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rate(self):
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'errors': [{'line': line, 'error': message} for line, message in self.errors],
+            'seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rate, 1),
+        }
+
+
+def read_rows(stream, fmt):
+    """Yield dict rows from a text stream without loading it whole."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ImportRowError(f"invalid JSON: {e.msg}")
+    elif fmt == 'json':
+        yield from _json_array(stream)
+    else:
+        raise ValueError(f"Unknown format {fmt}, expected one of {', '.join(FORMATS)}")
+
+
+def _json_array(stream):
+    """Elements of a top-level JSON array, decoded one at a time from ``JSON_READ_SIZE`` reads.
+
+    A syntax error ends the file: it is yielded as one ImportRowError, the
+    elements before it are kept.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    expect = '['
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                if expect != 'end':
+                    yield ImportRowError("invalid JSON: unexpected end of file")
+                return
+            data = stream.read(JSON_READ_SIZE)
+            buffer, pos, eof = buffer[pos:] + data, 0, not data
+            continue
+        char = buffer[pos]
+        if expect == '[':
+            if char != '[':
+                yield ImportRowError("invalid JSON: expected an array of objects")
+                return
+            pos, expect = pos + 1, 'first'
+        elif expect == 'first' and char == ']':
+            pos, expect = pos + 1, 'end'
+        elif expect in ('first', 'value'):
+            try:
+                row, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                error, end = e, None
+            # A value cut by the read boundary (or a number that may go on) needs the next read
+            if not eof and (end is None or end == len(buffer)):
+                data = stream.read(JSON_READ_SIZE)
+                buffer, pos, eof = buffer[pos:] + data, 0, not data
+                continue
+            if end is None:
+                yield ImportRowError(f"invalid JSON: {error.msg}")
+                return
+            pos, expect = end, ','
+            yield row
+        elif expect == ',' and char in ',]':
+            pos, expect = pos + 1, ('value' if char == ',' else 'end')
+        else:
+            yield ImportRowError("invalid JSON: expected ',' or ']'" if expect == ',' else "invalid JSON: data after the array")
+            return
+
+
+def format_for(name):
+    """The format implied by ``name``'s extension (csv when unknown)."""
+    return EXTENSIONS.get(os.path.splitext(name)[1].lower(), 'csv')
+
+
+def text_stream(uploaded):
+    return io.TextIOWrapper(uploaded, encoding='utf-8', newline='')
+
+
+def _datetime(value, name):
+    parsed = parse_datetime(str(value or '').strip())
+    if parsed is None:
+        raise ImportRowError(f"invalid {name}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _clean(name, value):
+    # The model's validators (max_digits, max_length): bulk_create does not run them
+    try:
+        return Flight._meta.get_field(name).clean(value, None)
+    except ValidationError as e:
+        raise ImportRowError(f"invalid {name}: {' '.join(e.messages)}")
+
+
+class FlightImporter:
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = max(1, int(chunk_size))
+        self.airlines = {name.strip().lower(): pk for pk, name in Airline.objects.values_list('id', 'name')}
+        self._empty_maps = {}
+
+    def build(self, row):
+        if isinstance(row, ImportRowError):
+            raise row
+        if not isinstance(row, dict):
+            raise ImportRowError("row must be an object")
+        airline = str(row.get('airline') or '').strip()
+        airline_id = self.airlines.get(airline.lower())
+        if airline_id is None:
+            raise ImportRowError(f"unknown airline {airline!r}")
+        departure_time = _datetime(row.get('departure_time'), 'departure_time')
+        arrival_time = _datetime(row.get('arrival_time'), 'arrival_time')
+        if arrival_time <= departure_time:
+            raise ImportRowError("arrival_time must be after departure_time")
+        try:
+            price = Decimal(str(row.get('price')))
+            total_seats = int(row.get('total_seats') or Flight._meta.get_field('total_seats').default)
+        except (InvalidOperation, TypeError, ValueError):
+            raise ImportRowError("invalid price or total_seats")
+        if not price.is_finite() or price < 0 or total_seats <= 0:
+            raise ImportRowError("invalid price or total_seats")
+        departure_city = str(row.get('departure_city') or '').strip()
+        arrival_city = str(row.get('arrival_city') or '').strip()
+        if not departure_city or not arrival_city:
+            raise ImportRowError("departure_city and arrival_city are required")
+        price = _clean('price', price)
+        departure_city = _clean('departure_city', departure_city)
+        arrival_city = _clean('arrival_city', arrival_city)
+        # bulk_create skips Flight.save(), so the seat inventory is filled in here
+        if total_seats not in self._empty_maps:
+            bitmap = SeatBitmap.for_flight(total_seats)
+            self._empty_maps[total_seats] = (bitmap.to_bytes(), bitmap.free_count())
+        seat_map, free = self._empty_maps[total_seats]
+        return Flight(
+            airline_id=airline_id, departure_city=departure_city, arrival_city=arrival_city,
+            departure_key=city_key(departure_city), arrival_key=city_key(arrival_city),
+            departure_time=departure_time, arrival_time=arrival_time, price=price,
+            total_seats=total_seats, seat_map=seat_map, available_seats=free,
+        )
+
+    def _flush(self, batch, result):
+        with transaction.atomic():
+            Flight.objects.bulk_create(batch, batch_size=self.chunk_size)
+        result.created += len(batch)
+        fares.refresh(fares.cell_of(flight) for flight in batch)
+        batch.clear()
+        # bulk_create sends no post_save signal; other processes' itinerary indexes rebuild on the new stamp
+        cache.bump(cache.FLIGHT, cache.SCHEDULE)
+
+    def run(self, rows):
+        result = ImportResult()
+        started = time.perf_counter()
+        batch = []
+        for line, row in enumerate(rows, start=1):
+            try:
+                batch.append(self.build(row))
+            except ImportRowError as e:
+                result.errors.append((line, str(e)))
+                continue
+            if len(batch) >= self.chunk_size:
+                self._flush(batch, result)
+        if batch:
+            self._flush(batch, result)
+        result.elapsed = time.perf_counter() - started
+        return result
@@ -0,0 +1,453 @@
+"""Claim/release operations on a flight's seat bitmap.
+
+Writers do not lock the Flight row.  Each attempt reads the bitmap and its
+``seat_version``, computes the new map in Python and writes it back with a
+single ``UPDATE ... WHERE seat_version = <read version>``.  If another booker
+got there first the UPDATE matches no row and the attempt is retried after a
+short randomized backoff.  Only callers that already hold a transaction get
+a locking read, since a retry inside their snapshot could never succeed.
+"""
+import random
+import threading
+import time
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import BinaryField, Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from . import cache, fares, metrics
+from .broker import get_broker
+from .models import Flight, Reservation, SeatHold
+from .seatmap import FlightCancelled, SeatConflict, SeatError, SeatUnavailable, resized, seat_index, seat_label
+
+MAX_ATTEMPTS = 8
+# Versions of seat deltas kept for /seatmap/?since=
+SEAT_LOG_LENGTH = 50
+SEAT_LOG_TIMEOUT = 600
+BACKOFF_BASE = 0.002
+BACKOFF_CAP = 0.05
+
+INVENTORY_COLUMNS = ('id', 'total_seats', 'seat_map', 'seat_version', 'cancelled')
+
+
+class ContentionStats:
+    """Process-wide counters for the optimistic write path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.writes = self.attempts = self.conflicts = self.exhausted = 0
+
+    def reset(self):
+        with self._lock:
+            self.writes = self.attempts = self.conflicts = self.exhausted = 0
+
+    def record(self, attempts, won):
+        with self._lock:
+            self.attempts += attempts
+            self.conflicts += attempts - 1 if won else attempts
+            if won:
+                self.writes += 1
+            else:
+                self.exhausted += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'writes': self.writes,
+                'attempts': self.attempts,
+                'conflicts': self.conflicts,
+                'exhausted': self.exhausted,
+            }
+
+
+stats = ContentionStats()
+
+
+def _backoff(attempt):
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    # Waiting out a competing writer is the optimistic path's lock wait
+    metrics.add_time('lock', delay)
+    time.sleep(delay)
+
+
+# Sentinel for an attempt whose UPDATE lost the version race
+_LOST = object()
+
+
+def _attempt(flight_id, plan, then, lock):
+    queryset = Flight.objects.select_for_update() if lock else Flight.objects
+    flight = queryset.only(*INVENTORY_COLUMNS).get(pk=flight_id)
+    before, bitmap = flight.seat_bitmap, flight.seat_bitmap
+    delta, result = plan(flight, bitmap)
+    if not delta:
+        return result
+    change = before.diff(bitmap)
+    sold_out_changed = (before.free_count() == 0) != (bitmap.free_count() == 0)
+
+    def committed():
+        _log_change(flight, change)
+        _publish(flight, change)
+        # Seat writes go through update(), so no post_save signal fires
+        cache.bump(cache.FLIGHT)
+        if sold_out_changed:
+            fares.refresh_flight(flight.id)
+
+    with transaction.atomic():
+        won = Flight.objects.filter(pk=flight_id, seat_version=flight.seat_version).update(
+            seat_map=bitmap.to_bytes(),
+            seat_version=F('seat_version') + 1,
+            available_seats=F('available_seats') + delta,
+            updated_at=timezone.now(),
+        )
+        if not won:
+            return _LOST
+        transaction.on_commit(committed)
+        return then(flight, result) if then else result
+
+
+def _write(flight_id, plan, then=None):
+    """Run ``plan(flight, bitmap)`` until its result is stored without conflict.
+
+    ``plan`` mutates the bitmap and returns ``(delta, result)`` where delta is
+    the change in free seats.  A delta of 0 means nothing to write.  ``then``
+    runs in the same transaction as the winning UPDATE and its return value
+    replaces the result.
+
+    The read runs outside the write transaction, so a retry sees a fresh
+    snapshot.  When the caller already holds a transaction a retry could not
+    see newer data, so the row is read with a lock instead.
+    """
+    lock = transaction.get_connection().in_atomic_block
+    for attempt in range(MAX_ATTEMPTS):
+        result = _attempt(flight_id, plan, then, lock)
+        if result is not _LOST:
+            stats.record(attempt + 1, True)
+            return result
+        _backoff(attempt)
+    stats.record(MAX_ATTEMPTS, False)
+    raise SeatConflict(flight_id)
+
+
+def _log_key(flight_id, version):
+    return f"seatlog:{flight_id}:{version}"
+
+
+def _log_change(flight, change):
+    # One key per version: the winner of a version is the only writer of its key
+    cache.api_cache().set(_log_key(flight.id, flight.seat_version + 1), change, SEAT_LOG_TIMEOUT)
+
+
+def _publish(flight, change):
+    claimed, released = change
+    get_broker().publish(
+        flight.id, flight.seat_version + 1,
+        [seat_label(i, flight.total_seats) for i in claimed],
+        [seat_label(i, flight.total_seats) for i in released],
+    )
+
+
+def changes_since(flight, since):
+    """Seat labels (claimed, released) between ``since`` and the flight's version.
+
+    Returns None when the log no longer covers that range and the caller
+    must send the full map instead.
+    """
+    if not 0 <= flight.seat_version - since <= SEAT_LOG_LENGTH:
+        return None
+    keys = [_log_key(flight.id, v) for v in range(since + 1, flight.seat_version + 1)]
+    found = cache.api_cache().get_many(keys)
+    if len(found) != len(keys):
+        return None
+    state = {}
+    for key in keys:
+        claimed, released = found[key]
+        state.update({i: True for i in claimed})
+        state.update({i: False for i in released})
+    claimed = [seat_label(i, flight.total_seats) for i in sorted(state) if state[i]]
+    released = [seat_label(i, flight.total_seats) for i in sorted(state) if not state[i]]
+    return claimed, released
+
+
+def _normalize(labels, total_seats):
+    # Dedupe while keeping the caller's order, and resolve labels to bit indexes
+    indexes = {}
+    for label in labels:
+        index = seat_index(label, total_seats)
+        indexes.setdefault(seat_label(index, total_seats), index)
+    return indexes
+
+
+def _claim_plan(labels, partial=False):
+    def plan(flight, bitmap):
+        if flight.cancelled:
+            raise FlightCancelled(flight.id)
+        indexes = _normalize(labels, flight.total_seats)
+        taken = [label for label, i in indexes.items() if bitmap.is_reserved(i)]
+        if taken and not partial:
+            raise SeatUnavailable(taken)
+        won = [label for label in indexes if label not in taken]
+        for label in won:
+            bitmap.reserve(indexes[label])
+        return -len(won), won
+    return plan
+
+
+def _any_plan(count):
+    def plan(flight, bitmap):
+        if flight.cancelled:
+            raise FlightCancelled(flight.id)
+        free = bitmap.free_indexes(limit=count)
+        if len(free) < count:
+            raise SeatUnavailable([])
+        for i in free:
+            bitmap.reserve(i)
+        return -len(free), [seat_label(i, flight.total_seats) for i in free]
+    return plan
+
+
+def claim_seats(flight_id, labels, partial=False):
+    """Reserve ``labels`` and return the labels actually won.
+
+    By default the claim is all-or-nothing and raises SeatUnavailable listing
+    the seats someone else holds.  With ``partial=True`` the free subset is
+    claimed and returned instead.
+    """
+    return _write(flight_id, _claim_plan(labels, partial))
+
+
+def claim_any(flight_id, count):
+    """Reserve the first ``count`` free seats; returns their labels."""
+    return _write(flight_id, _any_plan(count))
+
+
+def book_seats(user, flight_id, seats, on_booked=None):
+    """Claim ``seats`` (labels, or a count of any free seats) and write the Reservation.
+
+    Read, conditional UPDATE and INSERT share one short transaction, so a
+    failed insert never leaves seats claimed without a booking.
+    ``on_booked(reservation)`` runs in that transaction too, e.g. to queue
+    the confirmation e-mail with the booking it confirms.
+    """
+    plan = _any_plan(seats) if isinstance(seats, int) else _claim_plan(seats)
+
+    def then(flight, labels):
+        reservation = Reservation.objects.create(user=user, flight_id=flight.id, seats=labels)
+        if on_booked is not None:
+            on_booked(reservation)
+        return reservation
+
+    return _write(flight_id, plan, then)
+
+
+def release_seats(flight_id, labels):
+    """Free ``labels``; seats that were not reserved are ignored, as is a cancelled flight."""
+    def plan(flight, bitmap):
+        if flight.cancelled:
+            return 0, []
+        indexes = _normalize(labels, flight.total_seats)
+        released = [label for label, i in indexes.items() if bitmap.is_reserved(i)]
+        for label in released:
+            bitmap.release(indexes[label])
+        return len(released), released
+
+    return _write(flight_id, plan)
+
+
+def _read_many(flight_ids):
+    # Same rule as _write: a caller holding a transaction gets locked rows
+    lock = transaction.get_connection().in_atomic_block
+    queryset = Flight.objects.select_for_update() if lock else Flight.objects
+    return list(queryset.only(*INVENTORY_COLUMNS).filter(pk__in=flight_ids))
+
+
+def resize_seats(flight_id, total_seats):
+    """Change the capacity of a flight, keeping every sold seat under its label.
+
+    Writes ``total_seats``, the remapped map and its counter in one versioned
+    UPDATE (``Flight.save`` routes capacity changes here); returns the flight
+    as read, with the new inventory.  Raises SoldSeatsRemoved when a sold seat
+    would disappear.
+    """
+    lock = transaction.get_connection().in_atomic_block
+    queryset = Flight.objects.select_for_update() if lock else Flight.objects
+    for attempt in range(MAX_ATTEMPTS):
+        flight = queryset.only(*INVENTORY_COLUMNS, 'available_seats').get(pk=flight_id)
+        if flight.total_seats == total_seats:
+            return flight
+        if flight.cancelled:
+            raise FlightCancelled(flight_id)
+        before = flight.seat_bitmap
+        bitmap = resized(before, flight.total_seats, total_seats)
+        sold_out_changed = (before.free_count() == 0) != (bitmap.free_count() == 0)
+        with transaction.atomic():
+            won = Flight.objects.filter(pk=flight_id, seat_version=flight.seat_version).update(
+                total_seats=total_seats,
+                seat_map=bitmap.to_bytes(),
+                available_seats=bitmap.free_count(),
+                seat_version=F('seat_version') + 1,
+                updated_at=timezone.now(),
+            )
+            if won:
+                # Labels moved to other bits: no diff to log, readers of older versions get the full map
+                transaction.on_commit(lambda: cache.bump(cache.FLIGHT))
+                if sold_out_changed:
+                    transaction.on_commit(lambda: fares.refresh_flight(flight_id))
+                stats.record(attempt + 1, True)
+                flight.total_seats, flight.seat_map = total_seats, bitmap.to_bytes()
+                flight.available_seats, flight.seat_version = bitmap.free_count(), flight.seat_version + 1
+                return flight
+        _backoff(attempt)
+    stats.record(MAX_ATTEMPTS, False)
+    raise SeatConflict(flight_id)
+
+
+def _rewrite_many(flights, build):
+    """Rewrite the seat maps of several flights with one UPDATE; returns the ids written.
+
+    ``flights`` come from ``_read_many`` and ``build(flight, bitmap)`` changes
+    the bitmap in place.  As in ``_write``, a flight whose ``seat_version``
+    moved since it was read is left alone; the admin actions report how many
+    flights were written so they can be run again.
+    """
+    targets = {}
+    for flight in flights:
+        before, bitmap = flight.seat_bitmap, flight.seat_bitmap
+        build(flight, bitmap)
+        if bitmap.bits != before.bits:
+            targets[flight.pk] = (flight, before, bitmap)
+    if not targets:
+        return []
+
+    with transaction.atomic():
+        written = Flight.objects.filter(
+            reduce(or_, (Q(pk=pk, seat_version=flight.seat_version) for pk, (flight, _, _) in targets.items()))
+        ).update(
+            seat_map=Case(*[When(pk=pk, then=Value(bitmap.to_bytes())) for pk, (_, _, bitmap) in targets.items()],
+                          output_field=BinaryField()),
+            available_seats=Case(*[When(pk=pk, then=Value(bitmap.free_count()))
+                                   for pk, (_, _, bitmap) in targets.items()], output_field=IntegerField()),
+            seat_version=F('seat_version') + 1,
+            updated_at=timezone.now(),
+        )
+        if written != len(targets):
+            # Some flights were booked meanwhile: keep the ones that now carry our map
+            current = Flight.objects.filter(pk__in=targets).values_list('id', 'seat_version', 'seat_map')
+            targets = {pk: targets[pk] for pk, version, data in current
+                       if version == targets[pk][0].seat_version + 1 and bytes(data) == targets[pk][2].to_bytes()}
+
+        def committed():
+            for flight, before, bitmap in targets.values():
+                change = before.diff(bitmap)
+                _log_change(flight, change)
+                _publish(flight, change)
+                if (before.free_count() == 0) != (bitmap.free_count() == 0):
+                    fares.refresh_flight(flight.id)
+            cache.bump(cache.FLIGHT)
+
+        transaction.on_commit(committed)
+    stats.record(1, True)
+    return list(targets)
+
+
+def _labels_by_flight(queryset):
+    labels = defaultdict(list)
+    for flight_id, seats in queryset.values_list('flight_id', 'seats'):
+        labels[flight_id] += seats
+    return labels
+
+
+def _indexes(labels, total_seats):
+    # Stored bookings are trusted, but a malformed label must not block an admin action
+    found = set()
+    for label in labels:
+        try:
+            found.add(seat_index(label, total_seats))
+        except SeatError:
+            pass
+    return found
+
+
+def cancel_flights(flight_ids):
+    """Close ``flight_ids`` for sale and drop their reservations and holds.
+
+    The flights are flagged ``cancelled`` first: the version bump sends any
+    booking racing with us back to a fresh read, where it finds the flag, and
+    every seat is then marked taken.  Holds go before the reservations are
+    listed, so a hold being converted right now ends up in the list.  Returns
+    the dropped reservations as (id, username, email, flight, seats) tuples.
+    """
+    with transaction.atomic():
+        Flight.objects.filter(pk__in=flight_ids).update(
+            cancelled=True, seat_version=F('seat_version') + 1, updated_at=timezone.now(),
+        )
+        # _rewrite_many writes nothing for a flight already sold out; the flag must still leave the cache
+        transaction.on_commit(lambda: cache.bump(cache.FLIGHT))
+        SeatHold.objects.filter(flight_id__in=flight_ids).delete()
+        reservations = Reservation.objects.filter(flight_id__in=flight_ids)
+        flights = _read_many(flight_ids)
+        dropped = list(reservations.values_list('id', 'user__username', 'user__email', 'flight_id', 'seats'))
+
+        def sell_out(flight, bitmap):
+            for i in range(bitmap.size):
+                bitmap.reserve(i)
+
+        _rewrite_many(flights, sell_out)
+        reservations.delete()
+    return dropped
+
+
+def cancel_reservations(reservation_ids):
+    """Delete the reservations and free their seats; returns (reservations deleted, flights written)."""
+    with transaction.atomic():
+        reservations = Reservation.objects.filter(pk__in=reservation_ids)
+        freed = _labels_by_flight(reservations)
+
+        def release(flight, bitmap):
+            # Un vol annulé reste complet
+            if not flight.cancelled:
+                for i in _indexes(freed[flight.pk], flight.total_seats):
+                    bitmap.release(i)
+
+        written = _rewrite_many(_read_many(list(freed)), release)
+        deleted = reservations.delete()[0]
+    return deleted, written
+
+
+def release_orphan_seats(flight_ids):
+    """Free the seats that no reservation or unexpired hold accounts for; returns the flights written.
+
+    Seats claimed through ``reserve_seats`` (no booking row) are orphans too.
+    The maps are read before the bookings: a booking committed in between
+    moves ``seat_version`` and that flight is skipped rather than losing a seat.
+    Cancelled flights are skipped: their seats stay taken.
+    """
+    flights = [flight for flight in _read_many(flight_ids) if not flight.cancelled]
+    booked = _labels_by_flight(Reservation.objects.filter(flight_id__in=flight_ids))
+    held = _labels_by_flight(SeatHold.objects.filter(flight_id__in=flight_ids, expires_at__gt=timezone.now()))
+
+    def release(flight, bitmap):
+        keep = _indexes(booked[flight.pk] + held[flight.pk], flight.total_seats)
+        for i in bitmap.reserved_indexes():
+            if i not in keep:
+                bitmap.release(i)
+
+    return _rewrite_many(flights, release)
+
+
+def reserved_labels(flight):
+    return [seat_label(i, flight.total_seats) for i in flight.seat_bitmap.reserved_indexes()]
+
+
+def reconcile(flight_id, repair=True):
+    """Compare the stored counter with the bitmap; returns the drift (stored - actual)."""
+    flight = Flight.objects.only(*INVENTORY_COLUMNS, 'available_seats').get(pk=flight_id)
+    actual = flight.seat_bitmap.free_count()
+    drift = flight.available_seats - actual
+    if drift and repair:
+        # Only repair against the map we read; a concurrent booking keeps the counter consistent itself
+        if Flight.objects.filter(pk=flight_id, seat_version=flight.seat_version).update(available_seats=actual):
+            cache.bump(cache.FLIGHT)
+    return drift
@@ -0,0 +1,224 @@
+"""Connecting-flight search over an in-memory schedule index.
+
+The index keeps, per departure city, every flight sorted by departure time,
+which is the time-expanded graph in adjacency form: a node is (city, time)
+and the onward edges of an arrival are the departures from that city inside
+``[arrival + minimum connection, arrival + maximum layover]``, found with one
+bisect.  Only schedule columns are indexed; seat availability is checked
+against the database for the itineraries actually returned.
+
+Each process holds its own index.  Saves and deletes update it in place
+(see signals.py) and bump the shared ``schedule`` stamp; a process that sees
+a stamp it did not produce (another worker, a bulk import) rebuilds lazily.
+"""
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import islice
+from typing import NamedTuple
+
+from django.conf import settings
+
+from . import cache
+from .models import Flight
+
+MAX_STOPS = 2
+# A save touching none of these leaves the index as it is
+SCHEDULE_FIELDS = frozenset({'departure_city', 'arrival_city', 'departure_time', 'arrival_time', 'price'})
+
+
+class Leg(NamedTuple):
+    id: int
+    origin: str
+    destination: str
+    departs: float
+    arrives: float
+    price: object
+
+
+class Itinerary(NamedTuple):
+    legs: tuple
+
+    @property
+    def stops(self):
+        return len(self.legs) - 1
+
+    @property
+    def duration(self):
+        return self.legs[-1].arrives - self.legs[0].departs
+
+    @property
+    def price(self):
+        return sum(leg.price for leg in self.legs)
+
+    def rank(self):
+        return (self.duration, self.price, self.stops)
+
+
+def min_connection():
+    return timedelta(minutes=getattr(settings, 'ITINERARY_MIN_CONNECTION_MINUTES', 45)).total_seconds()
+
+
+def max_layover():
+    return timedelta(hours=getattr(settings, 'ITINERARY_MAX_LAYOVER_HOURS', 12)).total_seconds()
+
+
+def leg_for(flight):
+    return Leg(flight.id, flight.departure_key, flight.arrival_key,
+               flight.departure_time.timestamp(), flight.arrival_time.timestamp(), Decimal(str(flight.price)))
+
+
+class ScheduleIndex:
+    def __init__(self, legs=()):
+        self._lock = threading.Lock()
+        self._legs = {}
+        # Ville de départ -> [(départ, id)] trié, et le même ordre en Leg
+        self._times = defaultdict(list)
+        self._departures = defaultdict(list)
+        self._links = Counter()
+        self.stamp = None
+        for leg in legs:
+            self._insert(leg)
+
+    def __len__(self):
+        return len(self._legs)
+
+    def _insert(self, leg):
+        key = (leg.departs, leg.id)
+        times = self._times[leg.origin]
+        position = bisect_left(times, key)
+        times.insert(position, key)
+        self._departures[leg.origin].insert(position, leg)
+        self._legs[leg.id] = leg
+        self._links[leg.origin, leg.destination] += 1
+
+    def _remove(self, flight_id):
+        leg = self._legs.pop(flight_id, None)
+        if leg is None:
+            return
+        times = self._times[leg.origin]
+        position = bisect_left(times, (leg.departs, leg.id))
+        del times[position]
+        del self._departures[leg.origin][position]
+        self._links[leg.origin, leg.destination] -= 1
+        if not self._links[leg.origin, leg.destination]:
+            del self._links[leg.origin, leg.destination]
+
+    def cities(self):
+        return {city for city, times in self._times.items() if times}
+
+    def span(self):
+        """First and last departure in the index, as datetimes."""
+        stamps = [times[i][0] for times in self._times.values() if times for i in (0, -1)]
+        return tuple(datetime.fromtimestamp(stamp, dt_timezone.utc) for stamp in (min(stamps), max(stamps)))
+
+    def put(self, leg):
+        with self._lock:
+            self._remove(leg.id)
+            self._insert(leg)
+
+    def discard(self, flight_id):
+        with self._lock:
+            self._remove(flight_id)
+
+    def departures(self, city, start, end):
+        times = self._times.get(city)
+        if not times:
+            return []
+        low = bisect_left(times, (start,))
+        high = bisect_left(times, (end,), low)
+        return self._departures[city][low:high]
+
+    def reachable(self, destination, legs):
+        """``reach[k]``: cities from which ``destination`` is at most ``k`` legs away, ignoring times."""
+        reach = [{destination}]
+        for _ in range(legs):
+            previous = reach[-1]
+            reach.append(previous | {origin for origin, arrival in self._links if arrival in previous})
+        return reach
+
+    def search(self, origin, destination, start, end, max_stops=1, connection=None, layover=None):
+        """Every itinerary leaving ``origin`` in ``[start, end)``, best first.
+
+        ``start``/``end`` are datetimes; legs connect when the next departure
+        falls between the previous arrival plus ``connection`` and plus
+        ``layover`` seconds.  Cities are never revisited.
+        """
+        connection = min_connection() if connection is None else connection
+        layover = max_layover() if layover is None else layover
+        max_stops = max(0, min(max_stops, MAX_STOPS))
+        with self._lock:
+            reach = self.reachable(destination, max_stops)
+            found = []
+
+            def extend(path, visited):
+                last = path[-1]
+                if last.destination == destination:
+                    found.append(Itinerary(tuple(path)))
+                    return
+                legs_left = max_stops + 1 - len(path)
+                if not legs_left or last.destination not in reach[legs_left]:
+                    return
+                ready = last.arrives + connection
+                for leg in self.departures(last.destination, ready, last.arrives + layover):
+                    if leg.destination not in visited:
+                        extend(path + [leg], visited | {leg.destination})
+
+            for leg in self.departures(origin, start.timestamp(), end.timestamp()):
+                if leg.destination != origin:
+                    extend([leg], {origin, leg.destination})
+        found.sort(key=Itinerary.rank)
+        return found
+
+    @classmethod
+    def load(cls, queryset=None):
+        queryset = Flight.objects.all() if queryset is None else queryset
+        # Rows come in departure order, so every insert is an append
+        rows = queryset.order_by('departure_time', 'id').values_list('id', 'departure_key', 'arrival_key', 'departure_time', 'arrival_time', 'price')
+        return cls(Leg(pk, origin, destination, departs.timestamp(), arrives.timestamp(), price)
+                   for pk, origin, destination, departs, arrives, price in rows.iterator(chunk_size=5000))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    stamp, = cache.versions([cache.SCHEDULE])
+    with _index_lock:
+        if _index is None or _index.stamp != stamp:
+            # Read from the primary: rows from a lagging replica must not carry the current stamp
+            _index = ScheduleIndex.load(Flight.objects.using('default'))
+            _index.stamp = stamp
+        return _index
+
+
+def flight_changed(leg=None, flight_id=None):
+    """Bump the shared stamp, then apply one saved (``leg``) or deleted flight to this process's index.
+
+    The index is only patched when the bump moved the stamp from the one it
+    was built at: any other change in between (another worker, an import)
+    means it missed something, so it is dropped and rebuilt on next use.
+    """
+    global _index
+    stamp, = cache.bump(cache.SCHEDULE)
+    with _index_lock:
+        index = _index
+        if index is None:
+            return
+        if stamp != index.stamp + 1:
+            _index = None
+            return
+        if leg is not None:
+            index.put(leg)
+        else:
+            index.discard(flight_id)
+        index.stamp = stamp
+
+
+def best(itineraries, limit, keep=None):
+    """The first ``limit`` itineraries accepted by ``keep`` (input is already ranked)."""
+    return list(islice(filter(keep, itineraries) if keep else itineraries, limit))
@@ -0,0 +1,150 @@
+"""Database-backed background jobs.
+
+Views ``enqueue`` a row in the same transaction as the data it is about and
+return; ``manage.py run_jobs`` picks due jobs up in batches.  Claiming a job
+pushes its ``run_at`` forward by ``JOB_LEASE_SECONDS`` instead of holding a
+row lock while it runs, so a worker that dies mid-batch only delays its jobs.
+A failing job is retried with exponential backoff and marked ``failed``
+after ``JOB_MAX_ATTEMPTS``.
+
+Handlers are registered per kind with ``@handler(kind)`` and receive every
+payload of that kind in the batch, so e-mails share one SMTP connection.
+"""
+import logging
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+EMAIL = 'email'
+BACKOFF_BASE = 30
+BACKOFF_CAP = 3600
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register ``func(payloads) -> [error or None, ...]`` for one kind of job."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload, delay=0):
+    if kind not in HANDLERS:
+        raise ValueError(f"no handler for job kind {kind!r}")
+    return Job.objects.create(kind=kind, payload=payload, run_at=timezone.now() + timedelta(seconds=delay))
+
+
+def _email(subject, message, recipients, from_email=None):
+    return {
+        'subject': subject,
+        'message': message,
+        'recipients': list(recipients),
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+    }
+
+
+def send_email_later(subject, message, recipients, from_email=None):
+    return enqueue(EMAIL, _email(subject, message, recipients, from_email))
+
+
+def booking_confirmation(user, reservation):
+    """Queue the confirmation e-mail of a reservation, if the user has an address."""
+    if not user.email:
+        return None
+    seats = ', '.join(reservation.seats)
+    return send_email_later(
+        "Confirmation de réservation",
+        f"Bonjour {user.username},\n\nVotre réservation n°{reservation.id} (vol {reservation.flight_id}, "
+        f"sièges {seats}) est confirmée.",
+        [user.email],
+    )
+
+
+def cancellation_notices(dropped):
+    """Queue, in one INSERT, the e-mails of the reservations dropped by ``inventory.cancel_flights``."""
+    return Job.objects.bulk_create([
+        Job(kind=EMAIL, payload=_email(
+            "Annulation de vol",
+            f"Bonjour {username},\n\nLe vol {flight_id} a été annulé. Votre réservation n°{reservation_id} "
+            f"(sièges {', '.join(seats)}) est annulée.",
+            [email],
+        ))
+        for reservation_id, username, email, flight_id, seats in dropped if email
+    ])
+
+
+@handler(EMAIL)
+def send_emails(payloads):
+    errors = []
+    with get_connection() as connection:
+        for payload in payloads:
+            message = EmailMessage(payload['subject'], payload['message'], payload['from_email'],
+                                   payload['recipients'], connection=connection)
+            try:
+                message.send()
+                errors.append(None)
+            except Exception as e:  # SMTP and socket errors alike: retry later
+                errors.append(f"{type(e).__name__}: {e}")
+    return errors
+
+
+def backoff(attempts):
+    return min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def claim(batch_size, now=None):
+    """Lease up to ``batch_size`` due jobs to this worker."""
+    now = now or timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'JOB_LEASE_SECONDS', 300))
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.PENDING, run_at__lte=now).order_by('run_at')[:batch_size]
+        )
+        Job.objects.filter(id__in=[job.id for job in jobs]).update(run_at=now + lease, attempts=F('attempts') + 1)
+    for job in jobs:
+        job.attempts += 1
+    return jobs
+
+
+def run_batch(batch_size=100):
+    """Run one batch of due jobs; returns (succeeded, failed)."""
+    jobs = claim(batch_size)
+    by_kind = defaultdict(list)
+    for job in jobs:
+        by_kind[job.kind].append(job)
+
+    done, failed = [], 0
+    max_attempts = getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+    for kind, batch in by_kind.items():
+        func = HANDLERS.get(kind)
+        try:
+            errors = func([job.payload for job in batch]) if func else [f"no handler for {kind!r}"] * len(batch)
+        except Exception as e:
+            logger.exception("Job handler %s crashed", kind)
+            errors = [f"{type(e).__name__}: {e}"] * len(batch)
+        for job, error in zip(batch, errors):
+            if error is None:
+                done.append(job.id)
+                continue
+            failed += 1
+            if job.attempts >= max_attempts:
+                logger.error("Job %s gave up after %s attempts: %s", job.id, job.attempts, error)
+                Job.objects.filter(id=job.id).update(status=Job.FAILED, last_error=error)
+            else:
+                retry_at = timezone.now() + timedelta(seconds=backoff(job.attempts))
+                Job.objects.filter(id=job.id).update(run_at=retry_at, last_error=error)
+    Job.objects.filter(id__in=done).delete()
+    return len(done), failed
@@ -0,0 +1,144 @@
+"""In-process load generator for comparing the sync and async stacks.
+
+The sync run drives the WSGI handler from a pool of threads (one per
+simulated worker); the async run drives the ASGI handler from one event loop
+with the same number of requests in flight.  Sync requests are either GET
+paths or ``callable(client, i) -> response`` for anything else; the SQL
+count of each is read back from its ``Server-Timing`` header.
+"""
+import asyncio
+import itertools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.db import close_old_connections
+from django.test import AsyncClient, Client
+
+HOST = 'localhost'
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+@dataclass
+class LoadResult:
+    name: str
+    concurrency: int
+    elapsed: float = 0.0
+    errors: int = 0
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+
+    @property
+    def requests(self):
+        return len(self.latencies)
+
+    @property
+    def rps(self):
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    @property
+    def queries_per_request(self):
+        return sum(self.queries) / len(self.queries) if self.queries else 0.0
+
+    @property
+    def median_queries(self):
+        return sorted(self.queries)[len(self.queries) // 2] if self.queries else 0
+
+    def row(self):
+        return (
+            f"{self.name:<24} c={self.concurrency:<4} {self.requests:>6} req  {self.rps:>8.1f} req/s  "
+            f"p50 {self.percentile(50) * 1000:>7.1f}ms  p95 {self.percentile(95) * 1000:>7.1f}ms  "
+            f"p99 {self.percentile(99) * 1000:>7.1f}ms  {self.queries_per_request:>5.1f} q/req  errors {self.errors}"
+        )
+
+    def summary(self):
+        return {
+            'requests': self.requests,
+            'rps': round(self.rps, 1),
+            'p50_ms': round(self.percentile(50) * 1000, 2),
+            'p95_ms': round(self.percentile(95) * 1000, 2),
+            'p99_ms': round(self.percentile(99) * 1000, 2),
+            'queries_per_request': round(self.queries_per_request, 2),
+            'median_queries': self.median_queries,
+            'errors': self.errors,
+        }
+
+
+def query_count(response):
+    match = _QUERIES.search(response.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def run_sync(name, paths, total, concurrency):
+    result = LoadResult(name, concurrency)
+    urls = itertools.cycle(enumerate(paths))
+    local = threading.local()
+    lock = threading.Lock()
+
+    def hit(_):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client(HTTP_HOST=HOST)
+        with lock:
+            i, url = next(urls)
+        started = time.perf_counter()
+        response = client.get(url) if isinstance(url, str) else url(client, i)
+        took = time.perf_counter() - started
+        queries = query_count(response)
+        with lock:
+            result.latencies.append(took)
+            result.errors += response.status_code >= 400
+            if queries is not None:
+                result.queries.append(queries)
+
+    def worker_done(_):
+        close_old_connections()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(hit, range(total)))
+        list(pool.map(worker_done, range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+class _AsyncClient(AsyncClient):
+    # The factory always sends "host: testserver"; an extra host header is joined to it
+    # ("testserver,localhost"), which no ALLOWED_HOSTS entry matches
+    def _base_scope(self, **request):
+        scope = super()._base_scope(**request)
+        scope['headers'] = [(name, value) for name, value in scope['headers'] if name != b'host']
+        scope['headers'].append((b'host', HOST.encode()))
+        return scope
+
+
+async def _run_async(result, paths, total, concurrency):
+    client = _AsyncClient()
+    urls = itertools.cycle(paths)
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            url = next(urls)
+            started = time.perf_counter()
+            response = await client.get(url)
+            result.latencies.append(time.perf_counter() - started)
+            result.errors += response.status_code >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+
+
+def run_async(name, paths, total, concurrency):
+    result = LoadResult(name, concurrency)
+    asyncio.run(_run_async(result, paths, total, concurrency))
+    return result
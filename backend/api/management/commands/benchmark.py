@@ -0,0 +1,67 @@
+import json
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import benchmark
+
+
+class Command(BaseCommand):
+    help = "Seed the benchmark data set, load the search and booking endpoints and compare with a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=benchmark.SCENARIOS,
+                            help="Repeatable, default all")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per scenario and concurrency")
+        parser.add_argument('--concurrency', type=int, action='append', help="Repeatable, default 1 and 16")
+        parser.add_argument('--flights', type=int, default=5000)
+        parser.add_argument('--airlines', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-seed', action='store_true', help="Reuse the data of the previous run")
+        parser.add_argument('--clear', action='store_true', help="Delete the benchmark data and exit")
+        parser.add_argument('--baseline', help="JSON file of a previous run to compare with")
+        parser.add_argument('--save-baseline', action='store_true', help="Write the results to --baseline")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Allowed relative loss of req/s and p95 before failing (query counts are strict)")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.stdout.write(f"deleted {benchmark.clear()} rows")
+            return
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError("--save-baseline needs --baseline PATH")
+        if not options['no_seed']:
+            started = time.perf_counter()
+            benchmark.seed(options['flights'], options['airlines'], seed=options['seed'])
+            self.stdout.write(f"seeded {options['flights']} flights in {time.perf_counter() - started:.1f}s")
+        # Under contention every write is a "slow query" and every lost race a logged 409; keep them for -v 2
+        loggers = [logging.getLogger(name) for name in ('api.slowquery', 'django.request')]
+        for logger in loggers:
+            logger.disabled = options['verbosity'] < 2
+        try:
+            results = benchmark.run(options['scenario'] or benchmark.SCENARIOS, options['requests'],
+                                    options['concurrency'] or [1, 16], options['seed'])
+        except LookupError as e:
+            raise CommandError(str(e))
+        finally:
+            for logger in loggers:
+                logger.disabled = False
+        for result in results.values():
+            self.stdout.write(result.row())
+
+        if not options['baseline']:
+            return
+        if options['save_baseline']:
+            benchmark.save(results, options['baseline'])
+            self.stdout.write(f"baseline written to {options['baseline']}")
+            return
+        try:
+            with open(options['baseline']) as stream:
+                baseline = json.load(stream)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read baseline: {e}")
+        regressions = benchmark.compare(results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError("Regressions against the baseline:\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regression against the baseline"))
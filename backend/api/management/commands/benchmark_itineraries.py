@@ -0,0 +1,75 @@
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.itineraries import Leg, ScheduleIndex
+
+
+def synthetic_schedule(cities, per_day, days, seed=0):
+    """Hub-and-spoke schedule: a third of the flights touch one of five hubs, the rest are point to point."""
+    rng = random.Random(seed)
+    names = [f"city{i}" for i in range(cities)]
+    hubs = names[:5]
+    start = timezone.make_aware(datetime(2030, 1, 1)).timestamp()
+    legs = []
+    for pk in range(per_day * days):
+        origin = rng.choice(names)
+        destination = rng.choice(hubs) if rng.random() < 0.33 else rng.choice(names)
+        if destination == origin:
+            destination = names[(names.index(origin) + 1) % cities]
+        departs = start + rng.randrange(days * 86400)
+        legs.append(Leg(pk, origin, destination, departs, departs + rng.randrange(3600, 6 * 3600, 300),
+                        Decimal(rng.randrange(400, 4000))))
+    return ScheduleIndex(legs), names, timezone.make_aware(datetime(2030, 1, 1))
+
+
+class Command(BaseCommand):
+    help = "Time 1 and 2 stop itinerary searches against the in-memory schedule index"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--searches', type=int, default=500)
+        parser.add_argument('--synthetic', action='store_true',
+                            help="Benchmark a generated schedule instead of the Flight table")
+        parser.add_argument('--cities', type=int, default=80)
+        parser.add_argument('--per-day', type=int, default=3000)
+        parser.add_argument('--days', type=int, default=14)
+        parser.add_argument('--budget-ms', type=float, default=100.0, help="Fail if p99 exceeds this")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['synthetic']:
+            index, cities, first = synthetic_schedule(options['cities'], options['per_day'], options['days'])
+            days = options['days']
+        else:
+            index = ScheduleIndex.load()
+            cities = sorted(index.cities())
+            first, last = index.span()
+            days = max(1, (last - first).days)
+        if len(cities) < 2:
+            raise CommandError("Need flights between at least two cities (see import_flights or --synthetic)")
+        self.stdout.write(f"index: {len(index)} flights, {len(cities)} cities, built in "
+                          f"{(time.perf_counter() - started) * 1000:.0f}ms")
+
+        rng = random.Random(1)
+        failed = False
+        for stops in (1, 2):
+            timings, found = [], 0
+            for _ in range(options['searches']):
+                origin, destination = rng.sample(cities, 2)
+                day = first.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=rng.randrange(days))
+                began = time.perf_counter()
+                found += len(index.search(origin, destination, day, day + timedelta(days=1), stops))
+                timings.append((time.perf_counter() - began) * 1000)
+            timings.sort()
+            p = lambda q: timings[min(len(timings) - 1, int(len(timings) * q / 100))]
+            self.stdout.write(
+                f"max_stops={stops}  {len(timings)} searches  avg {found / len(timings):.0f} itineraries  "
+                f"p50 {p(50):.2f}ms  p95 {p(95):.2f}ms  p99 {p(99):.2f}ms  max {timings[-1]:.2f}ms"
+            )
+            failed |= p(99) > options['budget_ms']
+        if failed:
+            raise CommandError(f"p99 above {options['budget_ms']}ms")
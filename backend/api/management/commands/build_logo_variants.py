@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api.images import build_logo_variants, queue_variants
+from api.models import Airline
+
+
+class Command(BaseCommand):
+    help = "Generate the WebP/PNG logo variants of existing airlines (queued for run_jobs unless --now)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--now', action='store_true', help="Render in this process instead of queuing jobs")
+        parser.add_argument('--missing', action='store_true', help="Only airlines without variants yet")
+
+    def handle(self, *args, **options):
+        airlines = Airline.objects.exclude(logo='').order_by('id')
+        if options['missing']:
+            airlines = airlines.filter(logo_variants={})
+        ids = list(airlines.values_list('id', flat=True))
+        if options['now']:
+            errors = [e for e in build_logo_variants([{'airline': pk} for pk in ids]) if e]
+            for error in errors:
+                self.stderr.write(error)
+            self.stdout.write(f"Built variants for {len(ids) - len(errors)} airlines, {len(errors)} failed")
+        else:
+            for pk in ids:
+                queue_variants(pk)
+            self.stdout.write(f"Queued variants for {len(ids)} airlines")
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.holds import expire_holds
+
+
+class Command(BaseCommand):
+    help = "Release seats of expired holds, in batches (use --loop to keep sweeping)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true', help="Keep running, sweeping every --interval seconds")
+        parser.add_argument('--interval', type=float, default=30)
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_holds(batch_size=options['batch_size'])
+            if expired or not options['loop']:
+                self.stdout.write(f"Released {expired} expired holds")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,51 @@
+import sys
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api import exports
+from api.filters import start_of_day
+from api.routers import read_alias
+
+
+class Command(BaseCommand):
+    help = "Stream reservations or a passenger manifest as CSV or NDJSON, in constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--manifest', action='store_true', help="One row per seat instead of per reservation")
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--flight', type=int)
+        parser.add_argument('--date-from', help="First departure day, YYYY-MM-DD")
+        parser.add_argument('--date-to', help="Last departure day, YYYY-MM-DD")
+        parser.add_argument('--output', '-o', help="File to write, default stdout")
+        parser.add_argument('--chunk-size', type=int, help="Rows per query (default EXPORT_CHUNK_SIZE)")
+        parser.add_argument('--primary', action='store_true', help="Read the primary even when replicas exist")
+
+    def day(self, value, name):
+        if value is None:
+            return None
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise CommandError(f"{name} must be a date (YYYY-MM-DD)")
+        return start_of_day(day)
+
+    def handle(self, *args, **options):
+        departs_from = self.day(options['date_from'], '--date-from')
+        departs_before = self.day(options['date_to'], '--date-to')
+        if departs_before is not None:
+            departs_before += timedelta(days=1)
+        queryset = exports.reservations(options['flight'], departs_from, departs_before,
+                                        using='default' if options['primary'] else read_alias())
+        chunks = exports.export('manifest' if options['manifest'] else 'reservations', options['format'],
+                                queryset, options['chunk_size'])
+        stream = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for text in chunks:
+                stream.write(text)
+        finally:
+            if options['output']:
+                stream.close()
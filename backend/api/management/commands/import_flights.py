@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import DEFAULT_CHUNK_SIZE, FORMATS, FlightImporter, format_for, read_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import a flight schedule from a CSV, JSON-lines or JSON array file ('-' reads stdin)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or format_for(path)
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(str(e))
+        with stream:
+            result = FlightImporter(chunk_size=options['chunk_size']).run(read_rows(stream, fmt))
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} flights in {result.elapsed:.2f}s "
+            f"({result.rate:.0f} rows/s), {len(result.errors)} rejected"
+        ))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from api.loadtest import HOST, run_async, run_sync
+from api.models import Airline, Flight
+
+UNCACHED = {
+    'CACHES': {**settings.CACHES, 'loadtest': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    'API_CACHE_ALIAS': 'loadtest',
+}
+# Les clients de charge s'annoncent comme HOST, accepté même avec DEBUG=False (tests, production)
+LOAD_HOSTS = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, HOST]}
+
+
+class Command(BaseCommand):
+    help = "Compare requests/sec and latency of the sync and async catalog endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, action='append', help="Repeatable, default 16 and 64")
+        parser.add_argument('--cache', action='store_true', help="Keep the response cache on the sync endpoints")
+
+    def handle(self, *args, **options):
+        flight = Flight.objects.order_by('id').values_list('id', 'airline_id').first()
+        airline_id = Airline.objects.values_list('id', flat=True).first()
+        if flight is None or airline_id is None:
+            raise CommandError("Seed some airlines and flights first (see import_flights)")
+        paths = [
+            '/api/airlines/',
+            f'/api/airlines/{airline_id}/',
+            '/api/flights/?page_size=20',
+            f'/api/flights/?airline={flight[1]}&is_available=true&ordering=price',
+            f'/api/flights/{flight[0]}/',
+            f'/api/flights/{flight[0]}/seats/',
+        ]
+        async_paths = [path.replace('/api/', '/api/async/', 1) for path in paths]
+
+        with override_settings(**LOAD_HOSTS):
+            for concurrency in options['concurrency'] or [16, 64]:
+                if options['cache']:
+                    sync = run_sync('sync (WSGI, threads)', paths, options['requests'], concurrency)
+                else:
+                    with override_settings(**UNCACHED):
+                        sync = run_sync('sync (WSGI, threads)', paths, options['requests'], concurrency)
+                async_ = run_async('async (ASGI, event loop)', async_paths, options['requests'], concurrency)
+                self.stdout.write(sync.row())
+                self.stdout.write(async_.row())
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from api.fares import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the whole fare calendar (FareDay) from the Flight table"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Rebuilt {rebuild()} fare calendar days")
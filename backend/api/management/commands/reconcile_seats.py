@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.inventory import reconcile
+from api.models import Flight
+
+
+class Command(BaseCommand):
+    help = "Check Flight.available_seats against the seat bitmap and repair any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without fixing it")
+        parser.add_argument('--flight', type=int, action='append', dest='flights', help="Only check this flight id (repeatable)")
+
+    def handle(self, *args, **options):
+        flights = Flight.objects.order_by('id')
+        if options['flights']:
+            flights = flights.filter(id__in=options['flights'])
+        checked = drifted = 0
+        for flight_id in flights.values_list('id', flat=True).iterator():
+            checked += 1
+            drift = reconcile(flight_id, repair=not options['dry_run'])
+            if drift:
+                drifted += 1
+                self.stdout.write(f"Flight {flight_id}: counter off by {drift:+d}")
+        action = "found" if options['dry_run'] else "repaired"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} flights, {action} drift on {drifted}"))
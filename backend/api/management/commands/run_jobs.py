@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import run_batch
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (e-mails, ...) in batches (use --loop for a long-running worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help="Keep running, polling every --interval seconds when idle")
+        parser.add_argument('--interval', type=float, default=2)
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = run_batch(batch_size=options['batch_size'])
+            if done or failed or not options['loop']:
+                self.stdout.write(f"Ran {done + failed} jobs: {done} succeeded, {failed} failed")
+            if not options['loop']:
+                return
+            if not done and not failed:
+                time.sleep(options['interval'])
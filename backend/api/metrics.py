@@ -0,0 +1,216 @@
+"""Per-view latency and database instrumentation.
+
+``MetricsMiddleware`` times every request and, through an execute wrapper
+installed on each new database connection (see signals.py), counts the SQL
+it runs and how long it spent in it.  Statements that take row locks
+(``SELECT ... FOR UPDATE``) and the optimistic-write backoff in
+inventory.py count as lock wait; ``TimedSerializerMixin`` measures time in
+serializers.  Each response carries the breakdown as a ``Server-Timing``
+header, and ``/metrics`` exposes the aggregates in Prometheus text format.
+Statements slower than ``SLOW_QUERY_MS`` are logged to ``api.slowquery``
+with the view that ran them.
+
+Aggregates are kept per process: scrape every worker, or run one worker
+per container.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework import serializers
+
+slow_log = logging.getLogger('api.slowquery')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    __slots__ = ('request', 'queries', 'timings', 'depth')
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = 0
+        self.timings = defaultdict(float)
+        self.depth = 0
+
+    @property
+    def view(self):
+        match = getattr(self.request, 'resolver_match', None)
+        return match.view_name if match else 'unmatched'
+
+
+def add_time(name, seconds):
+    """Add ``seconds`` to the ``name`` timing of the current request, if any."""
+    state = _current.get()
+    if state is not None:
+        state.timings[name] += seconds
+
+
+@contextmanager
+def timed(name):
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    # Nested serializers only count once, in the outermost one
+    state.depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.depth -= 1
+        if not state.depth:
+            state.timings[name] += time.perf_counter() - start
+
+
+def record_queries(execute, sql, params, many, context):
+    """Execute wrapper: count and time every statement of the current request."""
+    state = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if state is not None:
+            elapsed = time.perf_counter() - start
+            state.queries += 1
+            state.timings['db'] += elapsed
+            if 'FOR UPDATE' in sql.upper():
+                state.timings['lock'] += elapsed
+            if elapsed * 1000 >= getattr(settings, 'SLOW_QUERY_MS', 200):
+                registry.slow(state.view)
+                slow_log.warning("%.1fms in %s: %s", elapsed * 1000, state.view, sql)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(Histogram)
+            self.queries = defaultdict(int)
+            self.seconds = defaultdict(float)
+            self.slow_queries = defaultdict(int)
+
+    def observe(self, view, method, status, elapsed, state):
+        with self._lock:
+            self.latency[view, method, str(status)].observe(elapsed)
+            self.queries[view] += state.queries
+            for name, seconds in state.timings.items():
+                self.seconds[view, name] += seconds
+
+    def slow(self, view):
+        with self._lock:
+            self.slow_queries[view] += 1
+
+    def render(self, seat_stats):
+        lines = [
+            '# HELP http_request_duration_seconds Request latency per view.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            for (view, method, status), histogram in sorted(self.latency.items()):
+                labels = f'view="{view}",method="{method}",status="{status}"'
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {histogram.total:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {histogram.count}')
+            lines += ['# HELP db_queries_total SQL statements run per view.', '# TYPE db_queries_total counter']
+            lines += [f'db_queries_total{{view="{view}"}} {n}' for view, n in sorted(self.queries.items())]
+            lines += ['# HELP view_phase_seconds_total Time per view spent in db, lock wait and serializers.',
+                      '# TYPE view_phase_seconds_total counter']
+            lines += [f'view_phase_seconds_total{{view="{view}",phase="{phase}"}} {s:.6f}'
+                      for (view, phase), s in sorted(self.seconds.items())]
+            lines += ['# HELP db_slow_queries_total Statements slower than SLOW_QUERY_MS per view.',
+                      '# TYPE db_slow_queries_total counter']
+            lines += [f'db_slow_queries_total{{view="{view}"}} {n}' for view, n in sorted(self.slow_queries.items())]
+        lines += ['# HELP seat_writes_total Optimistic seat-map writes (see api/inventory.py).',
+                  '# TYPE seat_writes_total counter']
+        lines += [f'seat_writes_total{{outcome="{name}"}} {value}' for name, value in sorted(seat_stats.items())]
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def server_timing(total, state):
+    parts = [f'app;dur={total * 1000:.1f}', f'db;dur={state.timings["db"] * 1000:.1f};desc="{state.queries} queries"']
+    parts += [f'{name};dur={state.timings[name] * 1000:.1f}' for name in ('lock', 'serializer') if name in state.timings]
+    return ', '.join(parts)
+
+
+class MetricsMiddleware:
+    # Premier de la chaîne: s'il n'était que synchrone, toute requête ASGI repasserait par un thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RequestMetrics(request)
+        token = _current.set(state)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, state, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        state = RequestMetrics(request)
+        token = _current.set(state)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, state, time.perf_counter() - start)
+
+    def _finish(self, request, response, state, elapsed):
+        registry.observe(state.view, request.method, response.status_code, elapsed, state)
+        response['Server-Timing'] = server_timing(elapsed, state)
+        return response
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Count ``.data`` in the request's serializer time; pair with ``Meta.list_serializer_class = TimedListSerializer``."""
+
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super().data
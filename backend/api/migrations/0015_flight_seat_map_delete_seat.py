@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+from api.seatmap import SeatBitmap, UnknownSeat, seat_index, seat_label
+
+
+def seats_to_bitmap(apps, schema_editor):
+    Flight = apps.get_model('api', 'Flight')
+    Seat = apps.get_model('api', 'Seat')
+    for flight in Flight.objects.only('id', 'total_seats').iterator():
+        bitmap = SeatBitmap.for_flight(flight.total_seats)
+        reserved = Seat.objects.filter(flight_id=flight.id, is_reserved=True).values_list('seat_number', flat=True)
+        for label in reserved:
+            try:
+                bitmap.reserve(seat_index(label, flight.total_seats))
+            except UnknownSeat:
+                continue
+        Flight.objects.filter(pk=flight.pk).update(seat_map=bitmap.to_bytes())
+
+
+def bitmap_to_seats(apps, schema_editor):
+    Flight = apps.get_model('api', 'Flight')
+    Seat = apps.get_model('api', 'Seat')
+    for flight in Flight.objects.only('id', 'total_seats', 'seat_map').iterator():
+        bitmap = SeatBitmap.for_flight(flight.total_seats, flight.seat_map)
+        Seat.objects.bulk_create([
+            Seat(flight_id=flight.id, seat_number=seat_label(i, flight.total_seats), is_reserved=bitmap.is_reserved(i))
+            for i in range(bitmap.size)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_reservation_created_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='seat_map',
+            field=models.BinaryField(default=bytes, editable=False),
+        ),
+        migrations.RunPython(seats_to_bitmap, bitmap_to_seats),
+        migrations.DeleteModel(
+            name='Seat',
+        ),
+    ]
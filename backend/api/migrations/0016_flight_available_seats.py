@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 18:29
+
+from django.db import migrations, models
+
+from api.seatmap import SeatBitmap
+
+
+def fill_available_seats(apps, schema_editor):
+    Flight = apps.get_model('api', 'Flight')
+    for flight in Flight.objects.only('id', 'total_seats', 'seat_map').iterator():
+        free = SeatBitmap.for_flight(flight.total_seats, flight.seat_map).free_count()
+        Flight.objects.filter(pk=flight.pk).update(available_seats=free)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_flight_seat_map_delete_seat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='available_seats',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_available_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_flight_available_seats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='seat_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 18:32
+
+from django.db import migrations, models
+
+from api.models import city_key
+
+
+def fill_city_keys(apps, schema_editor):
+    Flight = apps.get_model('api', 'Flight')
+    for flight in Flight.objects.only('id', 'departure_city', 'arrival_city').iterator():
+        Flight.objects.filter(pk=flight.pk).update(
+            departure_key=city_key(flight.departure_city),
+            arrival_key=city_key(flight.arrival_city),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_flight_seat_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='arrival_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='flight',
+            name='departure_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_city_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure_key', 'arrival_key', 'departure_time'], name='flight_route_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['airline', 'departure_time'], name='flight_airline_departure_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 18:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_flight_city_keys_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='airline',
+            index=models.Index(fields=['name', 'id'], name='airline_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['departure_time', 'id'], name='flight_departure_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['price', 'id'], name='flight_price_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 18:46
+
+from django.db import migrations, models
+
+from api.fares import aggregate
+
+
+def fill_fare_days(apps, schema_editor):
+    Flight = apps.get_model('api', 'Flight')
+    FareDay = apps.get_model('api', 'FareDay')
+    FareDay.objects.bulk_create(
+        [FareDay(departure_key=o, arrival_key=d, day=day, **values)
+         for (o, d, day), values in aggregate(Flight.objects.all()).items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_seathold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FareDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departure_key', models.CharField(max_length=100)),
+                ('arrival_key', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('lowest_price', models.DecimalField(decimal_places=2, max_digits=8, null=True)),
+                ('flights', models.IntegerField(default=0)),
+                ('available_flights', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('departure_key', 'arrival_key', 'day'), name='fareday_route_day_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_fare_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airline',
+            name='logo_variants',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+    ]
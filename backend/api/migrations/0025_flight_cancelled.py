@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0024_admin_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='cancelled',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
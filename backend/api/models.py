@@ -1,12 +1,32 @@
-from django.db import models
+import unicodedata
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .seatmap import SeatBitmap, SoldSeatsRemoved, resized
+
+
+# Clé de recherche d'une ville: sans accents, casse ni espaces superflus ("  Fès " -> "fes")
+def city_key(name):
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
 
 class Airline(models.Model):
     name = models.CharField(max_length=100)
     logo = models.ImageField(upload_to='airlines/')
+    # Variantes redimensionnées du logo (WebP/PNG), générées en tâche de fond par api/images.py
+    logo_variants = models.JSONField(default=dict, editable=False)
     description = models.TextField(null=True, blank=True)  # Description détaillée de la compagnie
     country = models.CharField(max_length=100, null=True, blank=True)  # Pays de la compagnie
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='airline_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -15,37 +35,115 @@ class Flight(models.Model):
     airline = models.ForeignKey(Airline, on_delete=models.CASCADE)
     departure_city = models.CharField(max_length=100)
     arrival_city = models.CharField(max_length=100)
+    # Versions normalisées des villes (voir city_key), indexées pour la recherche
+    departure_key = models.CharField(max_length=100, default='', editable=False)
+    arrival_key = models.CharField(max_length=100, default='', editable=False)
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
     price = models.DecimalField(max_digits=8, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     total_seats = models.IntegerField(default=100)
+    # Bitmap des sièges réservés (voir api/seatmap.py), un bit par siège
+    seat_map = models.BinaryField(default=bytes, editable=False)
+    # Compteur dénormalisé, tenu à jour par api/inventory.py à chaque réservation
+    available_seats = models.IntegerField(default=0, editable=False)
+    # Incrémenté à chaque écriture de seat_map (verrouillage optimiste)
+    seat_version = models.PositiveIntegerField(default=0, editable=False)
+    # Vol annulé (action d'administration): plus aucune réservation ni libération de sièges
+    cancelled = models.BooleanField(default=False, editable=False)
+
+    # Champs écrits uniquement par api/inventory.py
+    INVENTORY_FIELDS = ('seat_map', 'available_seats', 'seat_version', 'cancelled')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['departure_key', 'arrival_key', 'departure_time'], name='flight_route_idx'),
+            models.Index(fields=['airline', 'departure_time'], name='flight_airline_departure_idx'),
+            # Clés de pagination (departure_time, id) et (price, id)
+            models.Index(fields=['departure_time', 'id'], name='flight_departure_idx'),
+            models.Index(fields=['price', 'id'], name='flight_price_idx'),
+        ]
 
-    # Propriété dynamique pour obtenir le nombre de sièges disponibles
     @property
-    def available_seats(self):
-        return self.seats.filter(is_reserved=False).count()
+    def seat_bitmap(self):
+        return SeatBitmap.for_flight(self.total_seats, self.seat_map)
 
     def __str__(self):
         return f"{self.departure_city} to {self.arrival_city}"
 
-    # Méthode pour générer les sièges pour un vol
+    def clean(self):
+        super().clean()
+        if self.pk and 'total_seats' not in self.get_deferred_fields():
+            stored = Flight.objects.only('total_seats', 'seat_map').filter(pk=self.pk).first()
+            if stored is not None and stored.total_seats != self.total_seats:
+                try:
+                    resized(stored.seat_bitmap, stored.total_seats, self.total_seats)
+                except SoldSeatsRemoved as e:
+                    raise ValidationError({'total_seats': str(e)})
+
+    def save(self, *args, **kwargs):
+        if not {'departure_city', 'arrival_city'} & self.get_deferred_fields():
+            self.departure_key = city_key(self.departure_city)
+            self.arrival_key = city_key(self.arrival_city)
+        update_fields = kwargs.get('update_fields')
+        resize = False
+        if self._state.adding:
+            self.available_seats = self.seat_bitmap.free_count()
+        elif update_fields is None:
+            # Un save() complet ne doit pas écraser une réservation concurrente
+            skipped = (set(self.INVENTORY_FIELDS) | {'total_seats'} | self.get_deferred_fields()) - {'updated_at'}
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in skipped
+            ]
+            resize = 'total_seats' not in self.get_deferred_fields()
+        else:
+            update_fields = set(update_fields)
+            if {'departure_city', 'arrival_city'} & update_fields:
+                update_fields |= {'departure_key', 'arrival_key'}
+            # La capacité change avec la carte des sièges (voir inventory.resize_seats)
+            resize = 'total_seats' in update_fields and 'seat_map' not in update_fields
+            if resize:
+                update_fields.discard('total_seats')
+            kwargs['update_fields'] = update_fields
+        if not resize:
+            return super().save(*args, **kwargs)
+        from .inventory import resize_seats
+        with transaction.atomic():
+            stored = resize_seats(self.pk, self.total_seats)
+            for name in ('seat_map', 'available_seats', 'seat_version'):
+                setattr(self, name, getattr(stored, name))
+            super().save(*args, **kwargs)
+
+    # Réinitialise la carte des sièges: tous les sièges sont libres
     def create_seats(self):
-        rows = ['A', 'B', 'C', 'D']
-        seats_per_row = self.total_seats // len(rows)
-        for row in rows:
-            for number in range(1, seats_per_row + 1):
-                Seat.objects.create(flight=self, seat_number=f"{row}{number}")
-
+        bitmap = SeatBitmap.for_flight(self.total_seats)
+        self.seat_map = bitmap.to_bytes()
+        self.available_seats = bitmap.free_count()
+        if self.pk:
+            self.seat_version += 1
+            self.save(update_fields=['seat_map', 'available_seats', 'seat_version'])
+
+
+# Calendrier des tarifs: une ligne par trajet et jour de départ, tenue à jour par api/fares.py
+class FareDay(models.Model):
+    departure_key = models.CharField(max_length=100)
+    arrival_key = models.CharField(max_length=100)
+    day = models.DateField()
+    # Prix le plus bas parmi les vols ayant encore des sièges (null si tout est complet)
+    lowest_price = models.DecimalField(max_digits=8, decimal_places=2, null=True)
+    flights = models.IntegerField(default=0)
+    available_flights = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
-class Seat(models.Model):
-    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name="seats")
-    seat_number = models.CharField(max_length=10)  # Ex: A1, A2, B1...
-    is_reserved = models.BooleanField(default=False)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['departure_key', 'arrival_key', 'day'], name='fareday_route_day_uniq'),
+        ]
 
     def __str__(self):
-        return f"{self.seat_number} - {'Réservé' if self.is_reserved else 'Libre'}"
+        return f"{self.departure_key} -> {self.arrival_key} {self.day}: {self.lowest_price}"
 
 
 class Reservation(models.Model):
@@ -55,8 +153,26 @@ class Reservation(models.Model):
     reserved_at = models.DateTimeField(auto_now_add=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Filtre par date (date_hierarchy) de l'admin
+            models.Index(fields=['reserved_at'], name='reservation_reserved_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.flight} - {len(self.seats)} sièges"
+
+
+# Sièges bloqués pendant le paiement; libérés par expire_holds à expiration
+class SeatHold(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='seat_holds')
+    flight = models.ForeignKey(Flight, on_delete=models.CASCADE, related_name='holds')
+    seats = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
     def __str__(self):
-        return f"{self.user.username} - {self.flight} - {self.seats.count()} sièges"
+        return f"{self.user_id} - {self.flight_id} - {', '.join(self.seats)} (jusqu'à {self.expires_at:%H:%M})"
 
 
 class PasswordResetRequest(models.Model):
@@ -75,6 +191,33 @@ class ContactMessage(models.Model):
     message = models.TextField()
     date_sent = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date_sent'], name='contact_date_sent_idx'),
+        ]
+
     def __str__(self):
         return f"{self.email} - {self.subject}"
 
+
+
+# Tâche de fond (envoi d'e-mails, ...) exécutée par la commande run_jobs, voir api/jobs.py
+class Job(models.Model):
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'En attente'), (FAILED, 'Échec')]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Prochaine exécution; repoussée pendant qu'un worker traite la tâche
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_at'], name='job_due_idx')]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status}, {self.attempts} essais)"
@@ -0,0 +1,121 @@
+"""Keyset (cursor) pagination.
+
+Pages are selected with ``WHERE (a, b, id) > (last_a, last_b, last_id)``
+instead of ``OFFSET``, so page N costs the same as page 1 when the ordering
+matches an index.  The cursor is the opaque, base64-encoded key of the last
+row of the previous page; its values are written without loss (datetimes
+with their microseconds, Decimals as strings) and parsed back by the type of
+their model field, so the comparison never matches the last row again.
+"""
+import base64
+import json
+from datetime import date, time
+from decimal import Decimal
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    # Views override with ``keyset_ordering`` or ``get_keyset_ordering(request)``;
+    # the last field must be unique (normally 'id').
+    ordering = ('id',)
+
+    def get_ordering(self, request, view):
+        if hasattr(view, 'get_keyset_ordering'):
+            return tuple(view.get_keyset_ordering(request))
+        return tuple(getattr(view, 'keyset_ordering', self.ordering))
+
+    def get_page_size(self, request):
+        default = api_settings.PAGE_SIZE or 20
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, default))
+        except ValueError:
+            return default
+        return max(1, min(size, getattr(settings, 'API_MAX_PAGE_SIZE', 100)))
+
+    def encode_cursor(self, values):
+        # DjangoJSONEncoder cuts datetimes to milliseconds; the key must stay exact
+        values = [
+            value.isoformat() if isinstance(value, (date, time)) else str(value) if isinstance(value, Decimal) else value
+            for value in values
+        ]
+        raw = json.dumps(values, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, ordering, model):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+        except (ValueError, TypeError):
+            raise NotFound("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound("Invalid cursor")
+        try:
+            return [model._meta.get_field(field.lstrip('-')).to_python(value) for field, value in zip(ordering, values)]
+        except (FieldDoesNotExist, ValidationError, TypeError):
+            raise NotFound("Invalid cursor")
+
+    def after(self, ordering, values):
+        # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        clauses = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {f.lstrip('-'): v for f, v in zip(ordering[:i], values[:i])}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        return reduce(lambda a, b: a | b, clauses)
+
+    def window(self, queryset, request, view=None):
+        """The page's queryset (one extra row to detect a next page), not yet evaluated."""
+        self.request = request
+        self.ordering = self.get_ordering(request, view)
+        self.page_size_value = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            values = self.decode_cursor(cursor, self.ordering, queryset.model)
+            queryset = queryset.filter(self.after(self.ordering, values))
+        return queryset[:self.page_size_value + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.page(list(self.window(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.page([row async for row in self.window(queryset, request, view)])
+
+    def page(self, rows):
+        self.has_next = len(rows) > self.page_size_value
+        page = rows[:self.page_size_value]
+        self.last_key = [getattr(page[-1], f.lstrip('-')) for f in self.ordering] if page else None
+        return page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_key))
+
+    def get_paginated_data(self, data):
+        return {'next': self.get_next_link(), 'results': data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
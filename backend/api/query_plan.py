@@ -0,0 +1,80 @@
+"""Derive select_related / prefetch_related / only() from a serializer.
+
+Views that mix in ``SerializerQueryMixin`` get a queryset that loads exactly
+the relations and columns their serializer reads, so adding a field like
+``source='airline.name'`` cannot silently turn a list into an N+1.
+"""
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+@dataclass
+class QueryPlan:
+    select: set = field(default_factory=set)
+    prefetch: set = field(default_factory=set)
+    # None means a field reads something only() cannot describe (property, method, source='*')
+    only: set = field(default_factory=set)
+
+    def apply(self, queryset):
+        if self.select:
+            queryset = queryset.select_related(*sorted(self.select))
+        if self.prefetch:
+            queryset = queryset.prefetch_related(*sorted(self.prefetch))
+        if self.only is not None:
+            queryset = queryset.only(*sorted(self.only))
+        return queryset
+
+
+def _walk(plan, model, serializer, prefix=''):
+    for name, serializer_field in serializer.fields.items():
+        if serializer_field.write_only:
+            continue
+        if serializer_field.source == '*':
+            plan.only = None
+            continue
+        current, path = model, prefix
+        parts = serializer_field.source.split('.')
+        for i, part in enumerate(parts):
+            try:
+                model_field = current._meta.get_field(part)
+            except FieldDoesNotExist:
+                # Property or method on the model: let it load whatever it needs
+                plan.only = None
+                break
+            lookup = f"{path}__{part}" if path else part
+            last = i == len(parts) - 1
+            if model_field.many_to_many or model_field.one_to_many:
+                # Columns of prefetched rows are not restricted; only the join is planned
+                plan.prefetch.add(lookup)
+                if plan.only is not None and path:
+                    plan.only.add(f"{path}__{current._meta.pk.name}")
+                break
+            nested = isinstance(serializer_field, serializers.BaseSerializer)
+            if model_field.is_relation and (nested or not last):
+                plan.select.add(lookup)
+                if plan.only is not None:
+                    plan.only.add(lookup)
+                if not last:
+                    current, path = model_field.related_model, lookup
+                    continue
+                _walk(plan, model_field.related_model, serializer_field, lookup)
+                break
+            if plan.only is not None:
+                plan.only.add(lookup)
+    return plan
+
+
+@lru_cache(maxsize=None)
+def query_plan(serializer_class):
+    serializer = serializer_class()
+    return _walk(QueryPlan(), serializer.Meta.model, serializer)
+
+
+class SerializerQueryMixin:
+    """Apply the serializer's query plan to ``get_queryset()``."""
+
+    def get_queryset(self):
+        return query_plan(self.get_serializer_class()).apply(super().get_queryset())
@@ -0,0 +1,138 @@
+"""Primary / read-replica routing.
+
+Everything goes to ``default`` (the primary) unless a view opts in with
+``ReplicaReadMixin``: then safe-method requests read from one of
+``settings.DATABASE_REPLICAS``.  Reads inside a transaction, reads after the
+request has written anything, and every request of a client that wrote in
+the last ``DATABASE_STICKY_SECONDS`` stay on the primary, so users always
+see their own bookings.  The client is pinned by a cookie and, when
+authenticated, by a cache key (JWT clients rarely send cookies).
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'db_primary'
+_state = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    __slots__ = ('replica', 'wrote', 'pinned')
+
+    def __init__(self, pinned=False):
+        self.replica = False
+        self.wrote = False
+        self.pinned = pinned
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def sticky_seconds():
+    return getattr(settings, 'DATABASE_STICKY_SECONDS', 5)
+
+
+def read_alias():
+    """A replica, unless none is configured or a transaction is open on the primary."""
+    if not replicas() or connections['default'].in_atomic_block:
+        return 'default'
+    return random.choice(replicas())
+
+
+def _user_pin_key(user_id):
+    return f"db:pin:{user_id}"
+
+
+def reading_from_replica():
+    state = _state.get()
+    return bool(state and state.replica and not state.wrote and replicas())
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reading_from_replica():
+            return read_alias()
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary: rows from either can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class DatabaseRoutingMiddleware:
+    """Track writes per request and pin the client to the primary after one.
+
+    Sync and async capable, like Django's own middleware: under ASGI the
+    async views (api/async_views.py) are not pushed back onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _state.set(RoutingState(pinned=PIN_COOKIE in request.COOKIES))
+        try:
+            response = self.get_response(request)
+            if self._pin(response):
+                user = getattr(request, 'user', None)
+                if user is not None and user.is_authenticated:
+                    cache.set(_user_pin_key(user.pk), True, sticky_seconds())
+            return response
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        token = _state.set(RoutingState(pinned=PIN_COOKIE in request.COOKIES))
+        try:
+            response = await self.get_response(request)
+            if self._pin(response) and hasattr(request, 'auser'):
+                # request.user would hit the database synchronously here
+                user = await request.auser()
+                if user.is_authenticated:
+                    await cache.aset(_user_pin_key(user.pk), True, sticky_seconds())
+            return response
+        finally:
+            _state.reset(token)
+
+    def _pin(self, response):
+        """Set the pin cookie if the request wrote; returns whether it did."""
+        if not _state.get().wrote:
+            return False
+        response.set_cookie(PIN_COOKIE, '1', max_age=sticky_seconds(), httponly=True, samesite='Lax')
+        return True
+
+
+class ReplicaReadMixin:
+    """Serve this view's safe-method requests from a replica when the client is not pinned."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = _state.get()
+        if state is None or request.method not in SAFE_METHODS or state.pinned or not replicas():
+            return
+        # Authentication has run by now, so JWT clients are recognised too
+        if request.user.is_authenticated and cache.get(_user_pin_key(request.user.pk)):
+            return
+        state.replica = True
@@ -0,0 +1,169 @@
+"""Compact seat map: one bit per seat, rows A-D x N.
+
+Seat ``A1`` is bit 0, ``A2`` bit 1, ... then ``B1`` follows the last seat of
+row A.  A set bit means the seat is reserved.  The whole map for a flight is
+stored in ``Flight.seat_map`` so reading it is a single small column fetch.
+"""
+
+ROWS = ['A', 'B', 'C', 'D']
+
+
+class SeatError(Exception):
+    pass
+
+
+class UnknownSeat(SeatError):
+    def __init__(self, label):
+        super().__init__(f"Unknown seat {label}")
+        self.label = label
+
+
+class SeatUnavailable(SeatError):
+    def __init__(self, labels):
+        super().__init__(f"Seat(s) already reserved: {', '.join(labels)}")
+        self.labels = list(labels)
+
+
+class FlightCancelled(SeatUnavailable):
+    def __init__(self, flight_id):
+        SeatError.__init__(self, f"Flight {flight_id} is cancelled")
+        self.labels = []
+        self.flight_id = flight_id
+
+
+class SoldSeatsRemoved(SeatError):
+    def __init__(self, labels):
+        super().__init__(f"Sold seat(s) missing from the new layout: {', '.join(labels)}")
+        self.labels = list(labels)
+
+
+class SeatConflict(SeatError):
+    def __init__(self, flight_id):
+        super().__init__(f"Seat map of flight {flight_id} is busy, try again")
+        self.flight_id = flight_id
+
+
+def seats_per_row(total_seats):
+    return total_seats // len(ROWS)
+
+
+def capacity(total_seats):
+    return seats_per_row(total_seats) * len(ROWS)
+
+
+def seat_label(index, total_seats):
+    per_row = seats_per_row(total_seats)
+    if not 0 <= index < per_row * len(ROWS):
+        raise UnknownSeat(index)
+    return f"{ROWS[index // per_row]}{index % per_row + 1}"
+
+
+def seat_index(label, total_seats):
+    label = str(label).strip().upper()
+    per_row = seats_per_row(total_seats)
+    row, number = label[:1], label[1:]
+    if row not in ROWS or not number.isdigit() or not 1 <= int(number) <= per_row:
+        raise UnknownSeat(label)
+    return ROWS.index(row) * per_row + int(number) - 1
+
+
+def all_labels(total_seats):
+    return [seat_label(i, total_seats) for i in range(capacity(total_seats))]
+
+
+def resized(bitmap, total_seats, new_total):
+    """The map of the ``new_total`` layout with the same seats, by label, taken.
+
+    Rows get longer or shorter, so bit indexes move; a sold seat that has no
+    place in the new layout raises SoldSeatsRemoved.
+    """
+    new = SeatBitmap.for_flight(new_total)
+    lost = []
+    for i in bitmap.reserved_indexes():
+        label = seat_label(i, total_seats)
+        try:
+            new.reserve(seat_index(label, new_total))
+        except UnknownSeat:
+            lost.append(label)
+    if lost:
+        raise SoldSeatsRemoved(lost)
+    return new
+
+
+def reserved_ranges(bitmap, total_seats):
+    """Run-length view of a bitmap: {"A": [[1, 3], [7, 7]], ...} with seat numbers."""
+    per_row = seats_per_row(total_seats)
+    ranges = {}
+    for r, row in enumerate(ROWS):
+        runs, start = [], None
+        for number in range(1, per_row + 2):
+            reserved = number <= per_row and bitmap.is_reserved(r * per_row + number - 1)
+            if reserved and start is None:
+                start = number
+            elif not reserved and start is not None:
+                runs.append([start, number - 1])
+                start = None
+        ranges[row] = runs
+    return ranges
+
+
+class SeatBitmap:
+    __slots__ = ('size', 'bits')
+
+    def __init__(self, size, bits=None):
+        self.size = size
+        nbytes = (size + 7) // 8
+        bits = bytearray(bits or b'')
+        # Pad or truncate so a resized flight keeps a consistent map
+        if len(bits) < nbytes:
+            bits.extend(bytes(nbytes - len(bits)))
+        del bits[nbytes:]
+        if size % 8 and bits:
+            bits[-1] &= (0xFF << (8 - size % 8)) & 0xFF
+        self.bits = bits
+
+    @classmethod
+    def for_flight(cls, total_seats, data=None):
+        return cls(capacity(total_seats), bytes(data) if data else None)
+
+    def is_reserved(self, index):
+        return bool(self.bits[index >> 3] & (0x80 >> (index & 7)))
+
+    def reserve(self, index):
+        self.bits[index >> 3] |= 0x80 >> (index & 7)
+
+    def release(self, index):
+        self.bits[index >> 3] &= ~(0x80 >> (index & 7)) & 0xFF
+
+    def reserved_count(self):
+        return int.from_bytes(self.bits, 'big').bit_count()
+
+    def free_count(self):
+        return self.size - self.reserved_count()
+
+    def reserved_indexes(self):
+        return [i for i in range(self.size) if self.is_reserved(i)]
+
+    def free_indexes(self, limit=None):
+        found = []
+        for i in range(self.size):
+            if limit is not None and len(found) >= limit:
+                break
+            if not self.is_reserved(i):
+                found.append(i)
+        return found
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    def diff(self, other):
+        """Indexes reserved in ``other`` but not here, and released in ``other``."""
+        claimed, released = [], []
+        for byte, (old, new) in enumerate(zip(self.bits, other.bits)):
+            changed = old ^ new
+            while changed:
+                bit = changed.bit_length() - 1
+                changed &= ~(1 << bit)
+                index = byte * 8 + 7 - bit
+                (claimed if new >> bit & 1 else released).append(index)
+        return sorted(claimed), sorted(released)
@@ -1,35 +1,75 @@
 from rest_framework import serializers, viewsets
 from .models import Airline, Flight
-from .models import Reservation
+from .models import Reservation, SeatHold, FareDay
 from django.contrib.auth.models import User
 from .models import ContactMessage
-from .models import Seat
+from .query_plan import SerializerQueryMixin
+from .images import FORMATS, variant_url
+from .metrics import TimedListSerializer, TimedSerializerMixin
+from .seatmap import SeatError, resized
+
+class AirlineSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    logo_variants = serializers.SerializerMethodField()
 
-class AirlineSerializer(serializers.ModelSerializer):
     class Meta:
         model = Airline
-        fields = ['id', 'name', 'logo', 'description', 'country']  # Ajout du champ 'country'
+        list_serializer_class = TimedListSerializer
+        fields = ['id', 'name', 'logo', 'logo_variants', 'description', 'country']  # Ajout du champ 'country'
+
+    def get_logo_variants(self, obj):
+        # {"small": {"webp": url, "png": url, "width": .., "height": ..}, ...}; vide tant que le worker n'est pas passé
+        request = self.context.get('request')
+        return {
+            size: {**entry, **{fmt: variant_url(entry[fmt], request) for fmt in FORMATS}}
+            for size, entry in obj.logo_variants.items()
+        }
 
 
-class FlightSerializer(serializers.ModelSerializer):
+class FlightSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     airline_name = serializers.CharField(source='airline.name', read_only=True)
 
     class Meta:
         model = Flight
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'airline', 'departure_city', 'arrival_city', 'departure_time', 
-                  'arrival_time', 'price', 'created_at', 'updated_at', 'airline_name']
+                  'arrival_time', 'price', 'created_at', 'updated_at', 'airline_name',
+                  'total_seats', 'available_seats', 'cancelled']
+        read_only_fields = ['available_seats']
+
+    def validate_total_seats(self, value):
+        # Les sièges vendus doivent garder leur numéro dans la nouvelle configuration
+        flight = self.instance
+        if flight is not None and value != flight.total_seats:
+            try:
+                resized(flight.seat_bitmap, flight.total_seats, value)
+            except SeatError as e:
+                raise serializers.ValidationError(str(e))
+        return value
+
+class FareDaySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    available = serializers.SerializerMethodField()
 
-class SeatSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Seat
-        fields = ['id', 'seat_number', 'is_reserved']
-        
-class ReservationSerializer(serializers.ModelSerializer):
+        model = FareDay
+        list_serializer_class = TimedListSerializer
+        fields = ['day', 'lowest_price', 'flights', 'available_flights', 'available']
+
+    def get_available(self, obj):
+        return obj.available_flights > 0
+
+class ReservationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Reservation
+        list_serializer_class = TimedListSerializer
         fields = '__all__'
 
-class ReservationViewSet(viewsets.ModelViewSet):
+class SeatHoldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SeatHold
+        fields = ['id', 'flight', 'seats', 'created_at', 'expires_at']
+
+
+class ReservationViewSet(SerializerQueryMixin, viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
 
@@ -0,0 +1,86 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache, fares, images, itineraries, metrics
+from .authentication import forget_user_status
+from .models import Airline, Flight
+
+
+# Les écritures via save()/delete() invalident les réponses en cache
+@receiver([post_save, post_delete], sender=Airline)
+def airline_changed(sender, **kwargs):
+    cache.bump(cache.AIRLINE)
+
+
+@receiver([post_save, post_delete], sender=Flight)
+def flight_changed(sender, **kwargs):
+    cache.bump(cache.FLIGHT)
+
+
+# Index des correspondances (api/itineraries.py), mis à jour après le commit
+@receiver(post_save, sender=Flight)
+def flight_schedule_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or itineraries.SCHEDULE_FIELDS & set(update_fields):
+        leg = itineraries.leg_for(instance)
+        transaction.on_commit(lambda: itineraries.flight_changed(leg=leg))
+
+
+@receiver(post_delete, sender=Flight)
+def flight_schedule_deleted(sender, instance, **kwargs):
+    flight_id = instance.id
+    transaction.on_commit(lambda: itineraries.flight_changed(flight_id=flight_id))
+
+
+# Calendrier des tarifs (api/fares.py): on recalcule l'ancienne et la nouvelle case
+@receiver(pre_save, sender=Flight)
+def flight_fare_before(sender, instance, update_fields=None, **kwargs):
+    instance._fare_cell = None
+    if instance.pk and not instance._state.adding and (update_fields is None or fares.FARE_FIELDS & set(update_fields)):
+        old = Flight.objects.filter(pk=instance.pk).values_list('departure_key', 'arrival_key', 'departure_time').first()
+        if old:
+            instance._fare_cell = old[:2] + (fares.day_of(old[2]),)
+
+
+@receiver(post_save, sender=Flight)
+def flight_fare_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or fares.FARE_FIELDS & set(update_fields):
+        cells = {fares.cell_of(instance), getattr(instance, '_fare_cell', None)} - {None}
+        transaction.on_commit(lambda: fares.refresh(cells))
+
+
+@receiver(post_delete, sender=Flight)
+def flight_fare_deleted(sender, instance, **kwargs):
+    cells = [fares.cell_of(instance)]
+    transaction.on_commit(lambda: fares.refresh(cells))
+
+
+# Statut mis en cache par api/authentication.py (actif, staff, mot de passe)
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    user_id = instance.pk
+    forget_user_status(user_id)
+    # Une requête concurrente a pu relire l'ancienne ligne avant le commit
+    transaction.on_commit(lambda: forget_user_status(user_id))
+
+
+# Nouveau logo: variantes générées par le worker run_jobs (api/images.py)
+@receiver(pre_save, sender=Airline)
+def airline_logo_before(sender, instance, **kwargs):
+    old = Airline.objects.filter(pk=instance.pk).values_list('logo', flat=True).first() if instance.pk else None
+    instance._logo_changed = bool(instance.logo) and instance.logo.name != old
+
+
+@receiver(post_save, sender=Airline)
+def airline_logo_saved(sender, instance, **kwargs):
+    if getattr(instance, '_logo_changed', False):
+        images.queue_variants(instance.pk)
+
+
+# Chaque connexion compte et chronomètre ses requêtes SQL (api/metrics.py)
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    if metrics.record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_queries)
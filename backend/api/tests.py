@@ -1,3 +1,1280 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from functools import partial
+from smtplib import SMTPException
+from unittest import mock
+from urllib.parse import urlparse
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from . import async_views, benchmark, exports, fares, inventory, itineraries, metrics
+from .broker import LocalBroker
+from .cache import SCHEDULE, api_cache, bump, versions as cache_versions
+from .holds import create_hold, expire_holds
+from .importer import ImportRowError, read_rows
+from .inventory import MAX_ATTEMPTS, book_seats, claim_any, claim_seats, release_seats, reserved_labels, stats
+from .jobs import booking_confirmation, run_batch, send_email_later
+from .models import Airline, FareDay, Flight, Job, Reservation, SeatHold
+from .query_plan import query_plan
+from .routers import PIN_COOKIE, DatabaseRoutingMiddleware, ReplicaRouter
+from .serializers import FlightSerializer
+from .seatmap import (
+    FlightCancelled, SeatBitmap, SeatConflict, SeatUnavailable, SoldSeatsRemoved, UnknownSeat, all_labels, resized,
+    seat_index, seat_label,
+)
+
+
+def make_flight(total_seats=200, airline=None, **kwargs):
+    airline = airline or Airline.objects.create(name="Royal Air Maroc", logo="airlines/ram.png")
+    departure = timezone.now() + timedelta(days=30)
+    defaults = dict(
+        airline=airline, departure_city="Casablanca", arrival_city="Paris",
+        departure_time=departure, arrival_time=departure + timedelta(hours=3),
+        price=1500, total_seats=total_seats,
+    )
+    defaults.update(kwargs)
+    return Flight.objects.create(**defaults)
+
+
+def run_parallel(func, jobs, workers=16):
+    def call(job):
+        try:
+            return func(job)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(call, jobs))
+
+
+class SeatReservationConcurrencyTests(TransactionTestCase):
+    BOOKERS = 300
+
+    def setUp(self):
+        stats.reset()
+        self.flight = make_flight(total_seats=200)
+
+    def book(self, claim, jobs):
+        def attempt(job):
+            try:
+                return claim(job)
+            except SeatUnavailable:
+                return []
+            except SeatConflict:
+                return None
+
+        return run_parallel(attempt, jobs)
+
+    def assert_no_double_sell(self, results):
+        won = [label for result in results if result for label in result]
+        self.assertEqual(len(won), len(set(won)))
+        self.flight.refresh_from_db()
+        self.assertEqual(sorted(won), sorted(reserved_labels(self.flight)))
+        self.assertEqual(self.flight.available_seats, 200 - len(won))
+        return won
+
+    def test_parallel_bookings_never_double_sell(self):
+        results = self.book(lambda _: claim_any(self.flight.id, 1), range(self.BOOKERS))
+        won = self.assert_no_double_sell(results)
+        conflicts = sum(result is None for result in results)
+        self.assertEqual(len(won) + conflicts + results.count([]), self.BOOKERS)
+        self.assertEqual(stats.snapshot()['writes'], len(won))
+
+    def test_competing_claims_on_same_seats(self):
+        # Every pair of bookers fights over the same two seats
+        jobs = [[seat_label(i // 2, 200), seat_label(i // 2 + 1, 200)] for i in range(self.BOOKERS)]
+        results = self.book(lambda seats: claim_seats(self.flight.id, seats), jobs)
+        self.assert_no_double_sell(results)
+
+    def test_partial_claim_returns_won_seats(self):
+        claim_seats(self.flight.id, ["A1"])
+        self.assertEqual(claim_seats(self.flight.id, ["A1", "A2"], partial=True), ["A2"])
+        with self.assertRaises(SeatUnavailable):
+            claim_seats(self.flight.id, ["A2", "A3"])
+
+    def with_competitor(self, competing):
+        """Patch claim_any so that another booking commits between its read and its UPDATE."""
+        any_plan = inventory._any_plan
+
+        def patched(count):
+            plan = any_plan(count)
+
+            def racing(flight, bitmap):
+                labels = next(competing, None)
+                if labels:
+                    claim_seats(self.flight.id, labels)
+                return plan(flight, bitmap)
+            return racing
+        return mock.patch("api.inventory._any_plan", patched)
+
+    def test_lost_race_is_retried_on_a_fresh_read(self):
+        with self.with_competitor(iter([["A1"]])), mock.patch("api.inventory._backoff") as backoff:
+            self.assertEqual(claim_any(self.flight.id, 1), ["A2"])
+        # The competitor wins at once; claim_any loses one race, backs off once and wins its retry
+        self.assertEqual(stats.snapshot(), {'writes': 2, 'attempts': 3, 'conflicts': 1, 'exhausted': 0})
+        self.assertEqual(backoff.call_count, 1)
+        self.assert_no_double_sell([["A1"], ["A2"]])
+
+    def test_contention_gives_up_after_max_attempts(self):
+        competing = iter([[label] for label in ["A1", "A2", "A3", "A4", "B1", "B2", "B3", "B4", "C1"]])
+        with self.with_competitor(competing), mock.patch("api.inventory._backoff"):
+            with self.assertRaises(SeatConflict):
+                claim_any(self.flight.id, 1)
+        self.assertEqual(stats.snapshot(), {
+            'writes': MAX_ATTEMPTS, 'attempts': 2 * MAX_ATTEMPTS, 'conflicts': MAX_ATTEMPTS, 'exhausted': 1,
+        })
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 200 - MAX_ATTEMPTS)
+
+
+class QueryCountMixin:
+    """Fail when an endpoint's query count grows with the number of rows it returns."""
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def assertFlatQueryCount(self, url, grow, expected):
+        before = self.count_queries(url)
+        grow()
+        after = self.count_queries(url)
+        self.assertEqual((before, after), (expected, expected), f"{url} ran {before} then {after} queries")
+
+
+class EndpointQueryCountTests(QueryCountMixin, TestCase):
+    def setUp(self):
+        api_cache().clear()
+        self.client = APIClient()
+        self.airlines = [Airline.objects.create(name=f"Airline {i}", logo="airlines/x.png") for i in range(3)]
+        self.add_flights(2)
+
+    def add_flights(self, count):
+        for i in range(count):
+            make_flight(airline=self.airlines[i % 3], departure_city="Casablanca", arrival_city="Paris")
+
+    def test_flight_serializer_plan(self):
+        plan = query_plan(FlightSerializer)
+        self.assertEqual(plan.select, {'airline'})
+        self.assertIn('airline__name', plan.only)
+        self.assertNotIn('seat_map', plan.only)
+
+    def test_flight_list(self):
+        self.assertFlatQueryCount("/api/flights/", lambda: self.add_flights(10), 1)
+
+    def test_flight_search(self):
+        url = "/api/flights/search/?origin=casablanca&destination=paris"
+        self.assertFlatQueryCount(url, lambda: self.add_flights(10), 1)
+
+    def test_airline_list(self):
+        grow = lambda: [Airline.objects.create(name=f"More {i}", logo="airlines/x.png") for i in range(10)]
+        self.assertFlatQueryCount("/api/airlines/", grow, 1)
+
+    def test_flight_detail(self):
+        flight = Flight.objects.first()
+        self.assertFlatQueryCount(f"/api/flights/{flight.id}/", lambda: self.add_flights(10), 1)
+
+
+class FlightSearchTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        self.client = APIClient()
+        self.airline = Airline.objects.create(name="Royal Air Maroc", logo="airlines/ram.png")
+        self.day = (timezone.now() + timedelta(days=20)).replace(hour=9, minute=0, second=0, microsecond=0)
+        # Two flights share a price: the keyset must still walk every row exactly once
+        self.flights = [
+            make_flight(airline=self.airline, price=price, departure_time=self.day + timedelta(hours=i),
+                        arrival_time=self.day + timedelta(hours=i + 3), departure_city="Casablanca ")
+            for i, price in enumerate([1500, 900, 1200, 900, 2000])
+        ]
+        make_flight(airline=self.airline, departure_city="Rabat", departure_time=self.day)
+        make_flight(airline=self.airline, departure_time=self.day + timedelta(days=1))
+
+    def search(self, query):
+        return self.client.get(f"/api/flights/search/?origin=CASABLANCA&destination=paris&{query}")
+
+    def test_route_date_and_sorting(self):
+        response = self.search(f"date={self.day.date()}&sort=price")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["id"] for row in response.json()["results"]],
+                         [self.flights[i].id for i in (1, 3, 2, 0, 4)])
+        response = self.search(f"date={self.day.date()}&max_price=1000")
+        self.assertEqual(len(response.json()["results"]), 2)
+
+    def test_invalid_parameters_are_rejected(self):
+        for query in ("date=2024-02-30", "date=tomorrow", "date_to=2024-13-01", "sort=duration", "max_price=cheap"):
+            self.assertEqual(self.search(query).status_code, 400, query)
+        self.assertEqual(self.client.get("/api/flights/itineraries/?origin=casablanca&destination=paris"
+                                         "&date=2024-02-30").status_code, 400)
+
+    def test_cursor_keeps_sub_millisecond_keys(self):
+        # Même milliseconde, microsecondes différentes: une clé tronquée relirait la dernière ligne
+        base = self.day + timedelta(days=3, microseconds=123456)
+        ids = sorted(
+            make_flight(airline=self.airline, departure_city="Rabat", arrival_city="Lyon", price=Decimal("999.99"),
+                        departure_time=base + timedelta(microseconds=i * 100),
+                        arrival_time=base + timedelta(hours=3)).id
+            for i in range(5)
+        )
+        urls = [f"/api/flights/?departure_from={base.date()}&ordering={ordering}"
+                for ordering in ("departure_time", "-departure_time", "price")]
+        urls += [f"/api/flights/search/?origin=rabat&destination=lyon&sort={sort}" for sort in ("departure", "price")]
+        for start in urls:
+            for size in (1, 2):
+                seen, url = [], f"{start}&page_size={size}"
+                while url and len(seen) <= len(ids):
+                    page = self.client.get(url).json()
+                    seen += [row["id"] for row in page["results"]]
+                    url = page["next"]
+                self.assertEqual(sorted(seen), ids, (start, size))
+                self.assertEqual(len(set(seen)), len(seen), (start, size))
+
+    def test_keyset_pages_follow_next_without_gaps(self):
+        seen, url = [], f"/api/flights/?ordering=price&page_size=2&departure_from={self.day.date()}"
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            seen += [(Decimal(row["price"]), row["id"]) for row in page["results"]]
+            url = page["next"]
+        self.assertEqual(len(seen), Flight.objects.count())
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(self.client.get("/api/flights/?cursor=garbage").status_code, 404)
+        self.assertEqual(self.client.get("/api/flights/?ordering=seat_map").status_code, 400)
+
+
+class FlightFilterTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        self.client = APIClient()
+        self.airline = Airline.objects.create(name="Royal Air Maroc", logo="airlines/ram.png")
+        self.other = Airline.objects.create(name="Air Arabia", logo="airlines/aa.png")
+        day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=20)
+        self.day = day.date()
+        # Premier et dernier départ du jour, puis le lendemain à minuit
+        self.early = make_flight(airline=self.airline, price=900, departure_time=day,
+                                 arrival_time=day + timedelta(hours=3))
+        self.late = make_flight(airline=self.other, price=1500, departure_time=day + timedelta(hours=23, minutes=59),
+                                arrival_time=day + timedelta(days=1, hours=3))
+        self.next_day = make_flight(airline=self.airline, price=2000, departure_time=day + timedelta(days=1),
+                                    arrival_time=day + timedelta(days=1, hours=3))
+        Flight.objects.filter(pk=self.late.pk).update(available_seats=0)
+
+    def ids(self, query, url="/api/flights/"):
+        response = self.client.get(f"{url}?{query}")
+        self.assertEqual(response.status_code, 200, query)
+        return sorted(row["id"] for row in response.json()["results"])
+
+    def test_date_bounds_cover_whole_days(self):
+        self.assertEqual(self.ids(f"departure_from={self.day}&departure_to={self.day}"),
+                         [self.early.id, self.late.id])
+        self.assertEqual(self.ids(f"departure_from={self.day + timedelta(days=1)}"), [self.next_day.id])
+        self.assertEqual(self.ids(f"departure_to={self.day - timedelta(days=1)}"), [])
+
+    def test_airline_availability_and_price(self):
+        self.assertEqual(self.ids(f"airline={self.airline.id}"), [self.early.id, self.next_day.id])
+        self.assertEqual(self.ids("is_available=false"), [self.late.id])
+        self.assertEqual(self.ids("is_available=true&min_seats=150"), [self.early.id, self.next_day.id])
+        self.assertEqual(self.ids("min_price=1000&max_price=1500"), [self.late.id])
+        self.assertEqual(self.ids("is_available=true&max_price=1500", f"/api/airlines/{self.airline.id}/flights/"),
+                         [self.early.id])
+
+    def test_airline_filter_does_not_query_airlines(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.ids(f"airline={self.airline.id}")
+        # Pas de SELECT sur api_airline pour valider l'identifiant
+        self.assertFalse([query["sql"] for query in queries
+                          if 'FROM "api_airline"' in query["sql"] and "api_flight" not in query["sql"]])
+
+    def test_invalid_values_are_rejected(self):
+        for query in ("departure_from=2024-02-30", "departure_to=tomorrow", "min_price=cheap", "airline=ram"):
+            self.assertEqual(self.client.get(f"/api/flights/?{query}").status_code, 400, query)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        self.client = APIClient()
+        self.flight = make_flight()
+
+    def test_repeat_request_is_served_from_cache(self):
+        self.client.get("/api/flights/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/flights/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+    def test_etag_revalidation(self):
+        response = self.client.get(f"/api/flights/{self.flight.id}/")
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(self.client.get(f"/api/flights/{self.flight.id}/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_deleting_the_oldest_flight_is_not_answered_with_304(self):
+        newer = make_flight(airline=self.flight.airline)
+        self.client.get("/api/flights/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flight.delete()
+        # The newest updated_at in the list is unchanged: only the stamp tells the lists apart
+        response = self.client.get("/api/flights/", HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["id"] for row in response.json()["results"]], [newer.id])
+
+    def test_seat_change_invalidates(self):
+        etag = self.client.get("/api/flights/")["ETag"]
+        # Cache bumps and seat logs are published once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_seats(self.flight.id, ["A1"])
+        response = self.client.get("/api/flights/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["available_seats"], 199)
+
+
+class AsyncCatalogTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        self.client = APIClient()
+        self.airline = Airline.objects.create(name="Royal Air Maroc", logo="airlines/ram.png")
+        self.flights = [make_flight(airline=self.airline, price=price) for price in (1500, 900, 1200)]
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_seats(self.flights[0].id, ["A1", "B2"])
+
+    def get(self, url):
+        return async_to_sync(self.async_client.get)(url)
+
+    def test_responses_match_sync_endpoints(self):
+        flight = self.flights[0]
+        for path in ("airlines/", f"airlines/{self.airline.id}/", f"airlines/{self.airline.id}/flights/",
+                     "flights/?ordering=price&page_size=2", f"flights/?min_price=1000&airline={self.airline.id}",
+                     f"flights/{flight.id}/", f"flights/{flight.id}/seats/"):
+            response = self.get(f"/api/async/{path}")
+            self.assertEqual(response.status_code, 200, path)
+            expected = self.client.get(f"/api/{path}").json()
+            # Le lien de la page suivante pointe vers l'endpoint appelé
+            if isinstance(expected, dict) and expected.get("next"):
+                expected["next"] = expected["next"].replace("/api/", "/api/async/")
+            self.assertEqual(response.json(), expected, path)
+
+    def test_errors_are_json(self):
+        missing = Flight.objects.order_by("-id").first().id + 1
+        for path in (f"flights/{missing}/", f"airlines/{self.airline.id + 1}/"):
+            response = self.get(f"/api/async/{path}")
+            self.assertEqual(response.status_code, 404, path)
+            self.assertIn("detail", response.json())
+        response = self.get(f"/api/async/flights/{missing}/seats/")
+        self.assertEqual((response.status_code, response.json()), (404, {"error": "Flight not found"}))
+        response = self.get("/api/async/flights/?departure_from=2024-02-30")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("departure_from", response.json())
+
+    def test_views_are_coroutines(self):
+        for view in (async_views.airline_list, async_views.flight_list, async_views.flight_detail,
+                     async_views.flight_seats):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+
+
+class SeatMapTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        self.client = APIClient()
+        self.flight = make_flight(total_seats=8)
+        self.url = f"/api/flights/{self.flight.id}/seatmap/"
+
+    def test_full_map_encodings(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_seats(self.flight.id, ["A1", "A2", "C2"])
+        data = self.client.get(self.url).json()
+        self.assertEqual(data["bitmap"], "xA==")
+        ranges = self.client.get(self.url + "?encoding=ranges").json()["reserved_ranges"]
+        self.assertEqual(ranges, {"A": [[1, 2]], "B": [], "C": [[2, 2]], "D": []})
+
+    def test_deltas_since_version(self):
+        version = self.client.get(self.url).json()["version"]
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_seats(self.flight.id, ["B1", "B2"])
+            release_seats(self.flight.id, ["B1"])
+        data = self.client.get(f"{self.url}?since={version}").json()
+        self.assertEqual((data["reserved"], data["released"]), (["B2"], ["B1"]))
+        self.assertNotIn("bitmap", data)
+
+    def test_seat_list_is_one_query(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_seats(self.flight.id, ["A1", "C2"])
+        with self.assertNumQueries(1):
+            data = self.client.get(f"/api/flights/{self.flight.id}/seats/").json()
+        self.assertEqual(data, {"available_seats": 6, "reserved_seats": ["A1", "C2"]})
+
+    def test_unchanged_map_is_not_resent(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class SeatBitmapTests(SimpleTestCase):
+    def test_labels_round_trip(self):
+        labels = all_labels(10)
+        self.assertEqual(labels, ["A1", "A2", "B1", "B2", "C1", "C2", "D1", "D2"])
+        self.assertEqual([seat_index(label, 10) for label in labels], list(range(8)))
+        self.assertEqual(seat_index(" b2 ", 10), 3)
+        for label in ("E1", "A3", "A0", "A", "12"):
+            with self.assertRaises(UnknownSeat):
+                seat_index(label, 10)
+        with self.assertRaises(UnknownSeat):
+            seat_label(8, 10)
+
+    def test_reserve_release_and_counts(self):
+        bitmap = SeatBitmap.for_flight(40)
+        for index in (0, 9, 39):
+            bitmap.reserve(index)
+        bitmap.release(9)
+        self.assertEqual(bitmap.reserved_indexes(), [0, 39])
+        self.assertEqual((bitmap.reserved_count(), bitmap.free_count()), (2, 38))
+        self.assertEqual(bitmap.free_indexes(limit=3), [1, 2, 3])
+        self.assertEqual(len(bitmap.to_bytes()), 5)
+
+    def test_stored_map_is_padded_and_truncated(self):
+        self.assertEqual(SeatBitmap.for_flight(12).to_bytes(), b"\x00\x00")
+        # Les bits au-delà de la capacité sont effacés
+        bitmap = SeatBitmap.for_flight(12, b"\xff\xff\xff")
+        self.assertEqual(bitmap.to_bytes(), b"\xff\xf0")
+        self.assertEqual(bitmap.free_count(), 0)
+
+    def test_diff(self):
+        before = SeatBitmap.for_flight(16)
+        before.reserve(3)
+        before.reserve(12)
+        after = SeatBitmap(before.size, before.to_bytes())
+        after.release(3)
+        after.reserve(0)
+        after.reserve(15)
+        self.assertEqual(before.diff(after), ([0, 15], [3]))
+
+    def test_resize_keeps_seats_by_label(self):
+        bitmap = SeatBitmap.for_flight(8)
+        bitmap.reserve(seat_index("B2", 8))
+        grown = resized(bitmap, 8, 16)
+        self.assertEqual([seat_label(i, 16) for i in grown.reserved_indexes()], ["B2"])
+        with self.assertRaises(SoldSeatsRemoved):
+            resized(grown, 16, 4)
+
+
+class SeatMapMigrationTests(TransactionTestCase):
+    before = [("api", "0014_reservation_created_at")]
+    after = [("api", "0015_flight_seat_map_delete_seat")]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate, self.executor.loader.graph.leaf_nodes())
+        self.migrate(self.before)
+
+    def migrate(self, targets):
+        self.executor.loader.build_graph()
+        self.executor.migrate(targets)
+        return self.executor.loader.project_state(targets).apps
+
+    def test_seat_rows_become_bitmap(self):
+        apps = self.executor.loader.project_state(self.before).apps
+        Airline, Flight, Seat = (apps.get_model("api", name) for name in ("Airline", "Flight", "Seat"))
+        departure = timezone.now() + timedelta(days=30)
+        flight = Flight.objects.create(
+            airline=Airline.objects.create(name="Royal Air Maroc"), departure_city="Casablanca",
+            arrival_city="Paris", departure_time=departure, arrival_time=departure + timedelta(hours=3),
+            price=1500, total_seats=8,
+        )
+        # Z9 n'existe pas dans le plan de cabine: il est ignoré
+        Seat.objects.bulk_create([
+            Seat(flight=flight, seat_number=label, is_reserved=label in ("A1", "C2", "Z9"))
+            for label in all_labels(8) + ["Z9"]
+        ])
+        apps = self.migrate(self.after)
+        seat_map = apps.get_model("api", "Flight").objects.get(pk=flight.pk).seat_map
+        bitmap = SeatBitmap.for_flight(8, seat_map)
+        self.assertEqual([seat_label(i, 8) for i in bitmap.reserved_indexes()], ["A1", "C2"])
+
+        apps = self.migrate(self.before)
+        reserved = apps.get_model("api", "Seat").objects.filter(flight_id=flight.pk, is_reserved=True)
+        self.assertEqual(sorted(reserved.values_list("seat_number", flat=True)), ["A1", "C2"])
+        self.assertEqual(apps.get_model("api", "Seat").objects.filter(flight_id=flight.pk).count(), 8)
+
+
+class FlightCapacityTests(TestCase):
+    def setUp(self):
+        self.flight = make_flight(total_seats=40)
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_seats(self.flight.id, ["A1", "B10"])
+
+    def test_resize_keeps_sold_seats_and_counter(self):
+        flight = Flight.objects.get(pk=self.flight.pk)
+        version = flight.seat_version
+        serializer = FlightSerializer(flight, data={"total_seats": 80}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+        flight.refresh_from_db()
+        self.assertEqual(flight.total_seats, 80)
+        self.assertEqual(reserved_labels(flight), ["A1", "B10"])
+        self.assertEqual(flight.available_seats, 78)
+        self.assertEqual(flight.available_seats, flight.seat_bitmap.free_count())
+        self.assertEqual(flight.seat_version, version + 1)
+
+    def test_full_save_resizes_too(self):
+        flight = Flight.objects.get(pk=self.flight.pk)
+        flight.total_seats = 44
+        flight.price = 900
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.save()
+        flight = Flight.objects.get(pk=self.flight.pk)
+        self.assertEqual((flight.total_seats, flight.price, flight.available_seats), (44, 900, 42))
+        self.assertEqual(reserved_labels(flight), ["A1", "B10"])
+
+    def test_shrinking_below_a_sold_seat_is_rejected(self):
+        flight = Flight.objects.get(pk=self.flight.pk)
+        serializer = FlightSerializer(flight, data={"total_seats": 20}, partial=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("B10", str(serializer.errors["total_seats"]))
+        flight.total_seats = 20
+        with self.assertRaises(ValidationError):
+            flight.full_clean()
+        with self.assertRaises(SoldSeatsRemoved):
+            flight.save()
+        flight.refresh_from_db()
+        self.assertEqual((flight.total_seats, flight.available_seats), (40, 38))
+
+    def test_reconcile_reports_then_repairs_drift(self):
+        Flight.objects.filter(pk=self.flight.pk).update(available_seats=35)
+        out = io.StringIO()
+        call_command("reconcile_seats", "--dry-run", "--flight", str(self.flight.pk), stdout=out)
+        self.assertIn(f"Flight {self.flight.pk}: counter off by -3", out.getvalue())
+        self.assertIn("found drift on 1", out.getvalue())
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).available_seats, 35)
+        call_command("reconcile_seats", "--flight", str(self.flight.pk), stdout=io.StringIO())
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).available_seats, 38)
+        out = io.StringIO()
+        call_command("reconcile_seats", stdout=out)
+        self.assertIn("repaired drift on 0", out.getvalue())
+
+
+class SeatBrokerTests(TestCase):
+    def test_burst_is_coalesced_per_subscriber(self):
+        async def scenario():
+            broker = LocalBroker()
+            subscription = broker.subscribe(1)
+            broker.publish(1, 2, ["A1", "A2"], [])
+            broker.publish(1, 4, [], ["A1"])
+            broker.publish(1, 3, ["A1"], [])  # late arrival of an older commit
+            broker.publish(2, 9, ["B1"], [])
+            batch = await subscription.next(timeout=1, window=0)
+            subscription.close()
+            return batch, broker.subscriber_count()
+
+        batch, remaining = asyncio.run(scenario())
+        self.assertEqual(batch, {'version': 4, 'reserved': ['A2'], 'released': ['A1']})
+        self.assertEqual(remaining, 0)
+
+
+class SeatHoldTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user("amine", password="x")
+        self.client.force_authenticate(self.user)
+        self.flight = make_flight()
+
+    def hold(self, seats, **extra):
+        return self.client.post("/api/holds/", {"flight": self.flight.id, "seats": seats, **extra}, format="json")
+
+    def test_hold_blocks_seats_and_payment_books_them(self):
+        hold = self.hold(["A1", "A2"]).json()
+        self.assertEqual(self.hold(["A2"]).status_code, 400)
+        response = self.client.post("/api/payment/", {"hold": hold["id"]}, format="json")
+        self.assertEqual(response.json()["reservation"]["seats"], ["A1", "A2"])
+        self.assertFalse(SeatHold.objects.exists())
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 198)
+
+    def test_sweeper_releases_expired_holds_in_batches(self):
+        for seat in ["A1", "A2", "A3"]:
+            self.hold([seat])
+        SeatHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(expire_holds(batch_size=2), 3)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 200)
+
+    def test_expired_hold_cannot_be_paid(self):
+        hold = self.hold(["B1"]).json()
+        SeatHold.objects.update(expires_at=timezone.now())
+        self.assertEqual(self.client.post("/api/payment/", {"hold": hold["id"]}, format="json").status_code, 410)
+        self.assertFalse(Reservation.objects.exists())
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 200)
+
+
+class BookingTests(QueryCountMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("amine", password="x"))
+        self.flight = make_flight()
+
+    def book(self, seats):
+        return self.client.post("/api/reservations/", {"flight": self.flight.id, "seats": seats}, format="json")
+
+    def test_single_call_books_seats(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.book(["A1", "a2"])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["seats"], ["A1", "A2"])
+        # SELECT seat map, conditional UPDATE, INSERT reservation (+ savepoint bookkeeping)
+        statements = [q["sql"].split()[0] for q in queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(statements, ["SELECT", "UPDATE", "INSERT"])
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 198)
+
+    def test_taken_seats_write_nothing(self):
+        self.book(["A1"])
+        response = self.book(["A1", "A3"])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_count_books_first_free_seats(self):
+        self.book(["A1"])
+        self.assertEqual(self.book(2).json()["seats"], ["A2", "A3"])
+
+    def test_confirmation_is_queued_in_the_booking_transaction(self):
+        self.client.force_authenticate(User.objects.create_user("sara", email="sara@example.com", password="x"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.book(["B1"])
+        self.assertEqual(response.status_code, 201)
+        statements = [q["sql"].split()[0] for q in queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(statements, ["SELECT", "UPDATE", "INSERT", "INSERT"])
+        confirmation = Job.objects.latest("id").payload
+        self.assertEqual((confirmation["subject"], confirmation["recipients"]),
+                         ("Confirmation de réservation", ["sara@example.com"]))
+
+        # A confirmation that cannot be queued takes the booking down with it
+        with mock.patch("api.jobs.enqueue", side_effect=DatabaseError("job table locked")):
+            with self.assertRaises(DatabaseError):
+                book_seats(User.objects.get(username="sara"), self.flight.id, ["B2"],
+                           on_booked=partial(booking_confirmation, User.objects.get(username="sara")))
+        self.assertEqual(reserved_labels(Flight.objects.get(pk=self.flight.pk)), ["B1"])
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+class ItinerarySearchTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        itineraries._index = None
+        self.airline = Airline.objects.create(name="Royal Air Maroc", logo="airlines/ram.png")
+        self.day = (timezone.now() + timedelta(days=30)).replace(hour=6, minute=0, second=0, microsecond=0)
+        self.direct = self.leg("Casablanca", "London", 0, 6, price=3000)
+        self.first = self.leg("Casablanca", "Paris", 0, 3, price=1000)
+        self.connection = self.leg("Paris", "London", 4, 5.5, price=800)
+        self.too_tight = self.leg("Paris", "London", 3.25, 4.5, price=500)
+
+    def leg(self, origin, destination, departs, arrives, **kwargs):
+        return make_flight(airline=self.airline, departure_city=origin, arrival_city=destination,
+                           departure_time=self.day + timedelta(hours=departs),
+                           arrival_time=self.day + timedelta(hours=arrives), **kwargs)
+
+    def search(self, **params):
+        params = {"origin": "casablanca", "destination": "LONDON", "date": self.day.date().isoformat(), **params}
+        return APIClient().get("/api/flights/itineraries/", params).json()["results"]
+
+    def test_connections_respect_minimum_connection_and_rank_by_duration(self):
+        results = self.search()
+        self.assertEqual([[f["id"] for f in r["flights"]] for r in results],
+                         [[self.first.id, self.connection.id], [self.direct.id]])
+        self.assertEqual((results[0]["stops"], results[0]["duration_minutes"], results[0]["total_price"]),
+                         (1, 330, "1800.00"))
+        self.assertEqual(len(self.search(max_stops=0)), 1)
+
+    def test_index_follows_saves_and_seats(self):
+        self.search()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.connection.delete()
+            self.too_tight.departure_time = self.day + timedelta(hours=4)
+            self.too_tight.save()
+        self.assertEqual([r["flights"][1]["id"] for r in self.search() if r["stops"]], [self.too_tight.id])
+        claim_any(self.too_tight.id, 199)
+        self.assertEqual([r["stops"] for r in self.search(seats=2)], [0])
+
+    def test_index_is_dropped_when_another_worker_bumped_the_stamp(self):
+        self.search()
+        index = itineraries._index
+        itineraries.flight_changed(flight_id=self.direct.id)
+        self.assertIs(itineraries._index, index)
+        self.assertEqual(index.stamp, cache_versions([SCHEDULE])[0])
+        self.assertEqual([r["stops"] for r in self.search()], [1])
+
+        bump(SCHEDULE)  # A save in another process, not applied here
+        itineraries.flight_changed(flight_id=self.first.id)
+        self.assertIsNone(itineraries._index)
+
+class FareCalendarTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        self.airline = Airline.objects.create(name="Royal Air Maroc", logo="airlines/ram.png")
+        self.day = (timezone.now() + timedelta(days=40)).replace(day=10, hour=8, minute=0, second=0, microsecond=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cheap = make_flight(total_seats=4, airline=self.airline, price=900, departure_time=self.day,
+                                     arrival_time=self.day + timedelta(hours=3))
+            self.dear = make_flight(airline=self.airline, price=1500, departure_time=self.day + timedelta(hours=5),
+                                    arrival_time=self.day + timedelta(hours=8))
+
+    def calendar(self):
+        url = f"/api/flights/calendar/?origin=Casablanca&destination=paris&month={self.day:%Y-%m}"
+        return {row["day"]: row for row in APIClient().get(url).json()}
+
+    def test_calendar_is_read_from_the_aggregate_table(self):
+        self.calendar()
+        api_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            day = self.calendar()[self.day.date().isoformat()]
+        self.assertEqual(len(queries), 1)
+        self.assertEqual((day["lowest_price"], day["flights"], day["available"]), ("900.00", 2, True))
+
+    def test_cells_follow_reprices_moves_and_sell_outs(self):
+        key = self.day.date().isoformat()
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_any(self.cheap.id, 4)
+        self.assertEqual((self.calendar()[key]["lowest_price"], self.calendar()[key]["available_flights"]), ("1500.00", 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            claim_any(self.dear.id, 1)
+        self.assertEqual(self.calendar()[key]["lowest_price"], "1500.00")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dear.departure_time += timedelta(days=1)
+            self.dear.arrival_time += timedelta(days=1)
+            self.dear.price = 1200
+            self.dear.save()
+        calendar = self.calendar()
+        self.assertEqual((calendar[key]["lowest_price"], calendar[key]["available"]), (None, False))
+        self.assertEqual(calendar[(self.day + timedelta(days=1)).date().isoformat()]["lowest_price"], "1200.00")
+
+    def test_invalid_month_is_a_400(self):
+        for month in ("2024-13", "2024-00", "march"):
+            url = f"/api/flights/calendar/?origin=casablanca&destination=paris&month={month}"
+            self.assertEqual(APIClient().get(url).status_code, 400, month)
+
+    def test_upsert_has_no_conflict_target_on_mysql(self):
+        calls = []
+
+        def bulk_create(objs, **options):
+            # The option check that raises NotSupportedError when MySQL is given unique_fields
+            fields = [FareDay._meta.get_field(name) for name in options["update_fields"]]
+            FareDay.objects.all()._check_bulk_create_options(False, True, fields, options.get("unique_fields"))
+            calls.append(options)
+            return objs
+
+        with mock.patch.object(connection.features, "supports_update_conflicts_with_target", False), \
+                mock.patch.object(FareDay.objects, "bulk_create", side_effect=bulk_create):
+            fares.refresh([fares.cell_of(self.cheap)])
+        self.assertEqual(len(calls), 1)
+        self.assertNotIn("unique_fields", calls[0])
+
+
+# 'mirror' shares the test database (TEST MIRROR in settings.py), so replica reads see committed rows
+@override_settings(DATABASE_REPLICAS=['mirror'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # No wrapping transaction here: reads inside one always stay on the primary
+    databases = '__all__'
+
+    def setUp(self):
+        api_cache().clear()
+        self.flight = make_flight()
+        self.client = APIClient()
+        self.replica = connections['mirror']
+
+    def test_catalog_reads_use_replica_until_client_writes(self):
+        with CaptureQueriesContext(self.replica) as replica:
+            self.assertEqual(self.client.get("/api/flights/").status_code, 200)
+        self.assertEqual(len(replica), 1)
+
+        user = User.objects.create_user("amine", password="x")
+        self.client.force_authenticate(user)
+        self.client.post("/api/reservations/", {"flight": self.flight.id, "seats": ["A1"]}, format="json")
+        with CaptureQueriesContext(self.replica) as replica:
+            seats = self.client.get(f"/api/flights/{self.flight.id}/seats/").json()
+        self.assertEqual(len(replica), 0)
+        self.assertEqual(seats["reserved_seats"], ["A1"])
+
+    def test_schedule_index_is_loaded_from_the_primary(self):
+        itineraries._index = None
+        load = itineraries.ScheduleIndex.load
+        with mock.patch.object(itineraries.ScheduleIndex, "load", side_effect=load) as loaded, \
+                CaptureQueriesContext(self.replica) as replica:
+            response = self.client.get("/api/flights/itineraries/", {
+                "origin": "Casablanca", "destination": "Paris", "date": self.flight.departure_time.date().isoformat(),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loaded.call_args.args[0].db, "default")
+        self.assertEqual(len(response.json()["results"]), 1)
+        self.assertTrue(replica)  # Seat availability was still read from the replica
+
+class RoutingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User(pk=7, username="amine")
+
+    def write(self, request):
+        ReplicaRouter().db_for_write(Flight)
+        return HttpResponse()
+
+    def test_sync_chain_pins_after_a_write(self):
+        middleware = DatabaseRoutingMiddleware(self.write)
+        self.assertFalse(iscoroutinefunction(middleware))
+        request = RequestFactory().post("/")
+        request.user = self.user
+        self.assertIn(PIN_COOKIE, middleware(request).cookies)
+        self.assertTrue(cache.get("db:pin:7"))
+
+    def test_async_chain_stays_async(self):
+        async def write(request):
+            return self.write(request)
+
+        async def auser():
+            return self.user
+
+        middleware = DatabaseRoutingMiddleware(write)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().post("/")
+        request.auser = auser
+        response = asyncio.run(middleware(request))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(cache.get("db:pin:7"))
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("amine", email="amine@example.com", password="Secret-pass-1")
+        self.client = APIClient()
+        access = self.client.post("/login/", {"username": "amine", "password": "Secret-pass-1"}).json()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_authenticated_calls_do_not_query_auth_user(self):
+        flight = make_flight()
+        self.client.get("/api/user/")
+        with CaptureQueriesContext(connection) as queries:
+            me = self.client.get("/api/user/").json()
+            booked = self.client.post("/api/reservations/", {"flight": flight.id, "seats": 1}, format="json")
+        self.assertEqual(me["username"], "amine")
+        self.assertEqual(booked.status_code, 201)
+        self.assertFalse([q for q in queries if "auth_user" in q["sql"]])
+        self.assertEqual(Reservation.objects.get().user, self.user)
+
+    def test_password_change_and_deactivation_revoke_tokens(self):
+        self.assertEqual(self.client.get("/api/user/").status_code, 200)
+        self.user.set_password("Another-pass-2")
+        self.user.save()
+        self.assertEqual(self.client.get("/api/user/").status_code, 401)
+
+        self.client.credentials()
+        access = self.client.post("/login/", {"username": "amine", "password": "Another-pass-2"}).json()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get("/api/user/").status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get("/api/user/")
+        self.assertEqual((response.status_code, response.json()["code"]), (401, "user_inactive"))
+
+    def test_status_read_before_commit_is_dropped_on_commit(self):
+        self.assertEqual(self.client.get("/api/user/").status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save(update_fields=["is_active"])
+            # Another request caches the row as it was before the update
+            cache.set(f"auth:user:{self.user.pk}", (True, False, self.user.get_session_auth_hash()))
+        self.assertEqual(self.client.get("/api/user/").status_code, 401)
+
+
+class BrokenSMTPBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException("connection unexpectedly closed")
+
+
+class JobQueueTests(TestCase):
+    def test_reset_password_returns_before_mail_is_sent(self):
+        response = APIClient().post("/api/reset-password/", {"email": "amine@example.com", "username": "amine",
+                                                             "message": "locked out"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(run_batch(), (1, 0))
+        self.assertEqual(mail.outbox[0].subject, "Reset request from amine")
+        self.assertFalse(Job.objects.exists())
+
+    def test_booking_confirmation_is_queued(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("amine", email="amine@example.com", password="x"))
+        client.post("/api/reservations/", {"flight": make_flight().id, "seats": ["B2"]}, format="json")
+        run_batch()
+        self.assertIn("B2", mail.outbox[0].body)
+
+    @override_settings(EMAIL_BACKEND="api.tests.BrokenSMTPBackend", JOB_MAX_ATTEMPTS=2)
+    def test_failures_back_off_then_give_up(self):
+        job = send_email_later("Hello", "body", ["amine@example.com"])
+        self.assertEqual(run_batch(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=20))
+        self.assertEqual(run_batch(), (0, 0))
+
+        Job.objects.update(run_at=timezone.now())
+        run_batch()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn("connection unexpectedly closed", job.last_error)
+
+
+class ThrottlingTests(TestCase):
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+
+    @override_settings(THROTTLE_BUCKETS={'login': '2/min'})
+    def test_excess_logins_are_rejected_before_any_work(self):
+        for _ in range(2):
+            self.assertEqual(self.client.post("/login/", {"username": "x", "password": "y"}).status_code, 401)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/login/", {"username": "x", "password": "y"})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 29)
+        self.assertEqual(len(queries), 0)
+
+    @override_settings(THROTTLE_BUCKETS={'reserve-flight': '1/min'})
+    def test_flight_buckets_are_independent(self):
+        busy, quiet = make_flight(), make_flight()
+        self.assertEqual(self.client.post(f"/api/flights/{busy.id}/reserve/", {"seats": 1}, format="json").status_code, 200)
+        self.assertEqual(self.client.post(f"/api/flights/{busy.id}/reserve/", {"seats": 1}, format="json").status_code, 429)
+        self.assertEqual(self.client.post(f"/api/flights/{quiet.id}/reserve/", {"seats": 1}, format="json").status_code, 200)
+
+
+class LogoVariantTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        buffer = io.BytesIO()
+        Image.new("RGBA", (1200, 600), (200, 30, 30, 255)).save(buffer, "PNG")
+        self.airline = Airline.objects.create(
+            name="Royal Air Maroc", logo=SimpleUploadedFile("ram.png", buffer.getvalue(), "image/png"))
+
+    def test_variants_are_built_off_the_request_path(self):
+        client = APIClient()
+        self.assertEqual(client.get(f"/api/airlines/{self.airline.id}/").json()["logo_variants"], {})
+        self.assertEqual(run_batch(), (1, 0))
+
+        small = client.get(f"/api/airlines/{self.airline.id}/").json()["logo_variants"]["small"]
+        self.assertEqual((small["width"], small["height"]), (256, 128))
+        self.assertRegex(small["webp"], r"/media/airlines/variants/[0-9a-f]{16}\.small\.webp$")
+
+        path = urlparse(small["webp"]).path
+        response = client.get(path)
+        self.assertEqual((response.status_code, response["Content-Type"]), (200, "image/webp"))
+        self.assertIn("immutable", response["Cache-Control"])
+        body = b"".join(response.streaming_content)
+        partial = client.get(path, HTTP_RANGE="bytes=0-9")
+        self.assertEqual((partial.status_code, partial.content), (206, body[:10]))
+        self.assertEqual(partial["Content-Range"], f"bytes 0-9/{len(body)}")
+        self.assertEqual(client.get(path, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        api_cache().clear()
+        cache.clear()
+        metrics.registry.reset()
+        self.flight = make_flight()
+
+    def test_server_timing_and_prometheus_export(self):
+        response = self.client.get("/api/flights/")
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", serializer;dur=')
+        self.client.post(f"/api/flights/{self.flight.id}/reserve/", {"seats": 2}, content_type="application/json")
+
+        exported = self.client.get("/metrics").content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="flight-list",method="GET",status="200"} 1', exported)
+        self.assertIn('db_queries_total{view="api.views.reserve_seats"}', exported)
+        self.assertIn('seat_writes_total{outcome="writes"}', exported)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_are_logged_with_their_view(self):
+        with self.assertLogs("api.slowquery", level="WARNING") as logs:
+            self.client.get(f"/api/flights/{self.flight.id}/seatmap/")
+        self.assertIn("flight-seatmap", logs.output[0])
+        self.assertIn("SELECT", logs.output[0])
+
+    def test_asgi_handler_runs_an_async_chain(self):
+        # With DEBUG on, Django logs every middleware it has to adapt between sync and async
+        handler = ASGIHandler()
+        with override_settings(DEBUG=True), self.assertNoLogs("django.request", level="DEBUG"):
+            handler.load_middleware(is_async=True)
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+
+        async def view(request):
+            return HttpResponse()
+
+        middleware = metrics.MetricsMiddleware(view)
+        response = asyncio.run(middleware(RequestFactory().get("/")))
+        self.assertTrue(response["Server-Timing"].startswith("app;dur="))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.airline = Airline.objects.create(name="Royal Air Maroc", logo="airlines/ram.png")
+        self.row = {"airline": "royal air maroc", "departure_city": "Casablanca", "arrival_city": "Paris",
+                    "departure_time": "2030-03-01T08:00:00Z", "arrival_time": "2030-03-01T11:00:00Z",
+                    "price": "1500", "total_seats": 40}
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("ops", password="x", is_staff=True))
+
+    def write(self, suffix, text):
+        stream = tempfile.NamedTemporaryFile("w", suffix=suffix, encoding="utf-8", delete=False)
+        with stream:
+            stream.write(text)
+        self.addCleanup(os.remove, stream.name)
+        return stream.name
+
+    def test_json_array_file_is_read_as_an_array(self):
+        rows = [self.row, {**self.row, "price": "free"}, {**self.row, "arrival_city": "Lyon", "total_seats": 8}]
+        path = self.write(".json", json.dumps(rows, indent=2))
+        out, err = io.StringIO(), io.StringIO()
+        call_command("import_flights", path, stdout=out, stderr=err)
+        self.assertIn("Imported 2 flights", out.getvalue())
+        self.assertEqual(err.getvalue().strip(), "line 2: invalid price or total_seats")
+        lyon = Flight.objects.get(arrival_city="Lyon")
+        self.assertEqual((lyon.arrival_key, lyon.available_seats), ("lyon", 8))
+
+    def test_rows_outside_the_column_limits_are_skipped(self):
+        rows = [{**self.row, "price": "123456789012"}, {**self.row, "price": "10.005"},
+                {**self.row, "departure_city": "C" * 300}, self.row]
+        response = self.client.post("/api/flights/import/", rows, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["created"], 1)
+        errors = response.json()["errors"]
+        self.assertEqual([error["line"] for error in errors], [1, 2, 3])
+        self.assertTrue(errors[0]["error"].startswith("invalid price: "))
+        self.assertTrue(errors[2]["error"].startswith("invalid departure_city: "))
+        self.assertEqual(Flight.objects.get().price, Decimal("1500"))
+
+    def test_read_rows_streams_json_arrays_across_reads(self):
+        with mock.patch("api.importer.JSON_READ_SIZE", 7):
+            rows = list(read_rows(io.StringIO(json.dumps([self.row, {"price": 12345}])), "json"))
+            self.assertEqual(rows, [self.row, {"price": 12345}])
+            broken = list(read_rows(io.StringIO('[{"a": 1} {"b": 2}]'), "json"))
+        self.assertEqual(broken[0], {"a": 1})
+        self.assertIsInstance(broken[1], ImportRowError)
+        self.assertEqual(list(read_rows(io.StringIO("[]"), "json")), [])
+
+    def test_jsonl_and_csv_files(self):
+        path = self.write(".jsonl", "\n".join(json.dumps(row) for row in [self.row, self.row]) + "\n")
+        call_command("import_flights", path, stdout=io.StringIO(), stderr=io.StringIO())
+        header = ",".join(self.row)
+        path = self.write(".csv", f"{header}\n" + ",".join(str(value) for value in self.row.values()) + "\n")
+        call_command("import_flights", path, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Flight.objects.filter(airline=self.airline).count(), 3)
+
+    def test_upload_format_follows_the_extension(self):
+        upload = SimpleUploadedFile("schedule.json", json.dumps([self.row]).encode())
+        response = self.client.post("/api/flights/import/", {"file": upload}, format="multipart")
+        self.assertEqual((response.status_code, response.json()["created"]), (201, 1))
+        upload = SimpleUploadedFile("schedule.json", json.dumps(self.row).encode())
+        response = self.client.post("/api/flights/import/", {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"], [{"line": 1, "error": "invalid JSON: expected an array of objects"}])
+        response = self.client.post("/api/flights/import/", [self.row], format="json")
+        self.assertEqual(response.json()["created"], 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.flight = make_flight(total_seats=40)
+        self.other = make_flight(total_seats=40, airline=self.flight.airline,
+                                 departure_time=self.flight.departure_time + timedelta(days=3))
+        self.users = [User.objects.create_user(f"pax{i}", email=f"pax{i}@example.com", password="x") for i in range(3)]
+        for i, seats in enumerate([["B2", "A1"], ["A3"], ["C1", "A2"]]):
+            Reservation.objects.create(user=self.users[i], flight=self.flight, seats=seats)
+        Reservation.objects.create(user=self.users[0], flight=self.other, seats=["A1"])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("ops", password="x", is_staff=True))
+
+    def body(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_manifest_is_in_seat_order_across_chunks(self):
+        with override_settings(EXPORT_CHUNK_SIZE=2), self.assertNumQueries(2):
+            response = self.client.get(f"/api/exports/manifest.csv?flight={self.flight.id}")
+            lines = self.body(response).splitlines()
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(lines[0].split(",")[4], "seat")
+        self.assertEqual([line.split(",")[4] for line in lines[1:]], ["A1", "A2", "A3", "B2", "C1"])
+
+    def test_reservations_ndjson_date_range_and_admin_only(self):
+        day = self.other.departure_time.date()
+        response = self.client.get(f"/api/exports/reservations.ndjson?date_from={day}&date_to={day}")
+        rows = [json.loads(line) for line in self.body(response).splitlines()]
+        self.assertEqual([(row["flight"], row["seats"]) for row in rows], [(self.other.id, ["A1"])])
+        self.assertEqual(self.client.get("/api/exports/reservations.xml").status_code, 404)
+
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.get("/api/exports/reservations.csv").status_code, 403)
+
+    def test_command_writes_every_reservation(self):
+        with tempfile.NamedTemporaryFile("r", suffix=".csv") as out:
+            call_command("export_reservations", "--output", out.name, "--chunk-size", "1")
+            lines = out.read().splitlines()
+        self.assertEqual(lines[0], ",".join(exports.RESERVATION_COLUMNS))
+        self.assertEqual(len(lines), 5)
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("root", "root@example.com", "x")
+        self.client.force_login(self.admin)
+        self.flight = make_flight(total_seats=40)
+        self.pax = User.objects.create_user("pax", email="pax@example.com", password="x")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking = book_seats(self.pax, self.flight.id, ["A1", "A2"])
+            claim_seats(self.flight.id, ["B1"])  # Claimed through reserve_seats: no booking row
+
+    def test_changelists_do_not_query_per_row(self):
+        for i in range(5):
+            Reservation.objects.create(user=self.pax, flight=make_flight(airline=self.flight.airline), seats=["C1"])
+        for url in ("/admin/api/reservation/", "/admin/api/flight/", "/admin/api/flight/?q=Casablanca > Paris"):
+            with CaptureQueriesContext(connection) as few:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            for i in range(5):
+                Reservation.objects.create(user=self.pax, flight=make_flight(airline=self.flight.airline), seats=["C1"])
+            with CaptureQueriesContext(connection) as more:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(len(few), len(more), url)
+
+    def test_cancel_flights_sells_out_and_queues_notices(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/admin/api/flight/", {
+                "action": "cancel_flights", "_selected_action": [self.flight.id],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 0)
+        self.assertEqual(self.flight.seat_bitmap.free_count(), 0)
+        self.assertFalse(Reservation.objects.filter(flight=self.flight).exists())
+        job = Job.objects.get(kind="email")
+        self.assertEqual(job.payload["recipients"], ["pax@example.com"])
+        with self.assertRaises(SeatUnavailable):
+            claim_any(self.flight.id, 1)
+
+    def test_cancelling_a_sold_out_flight_clears_cached_responses(self):
+        api_cache().clear()
+        full = make_flight(total_seats=4, airline=self.flight.airline)
+        with self.captureOnCommitCallbacks(execute=True):
+            book_seats(self.pax, full.id, ["A1", "B1", "C1", "D1"])
+        urls = (f"/api/flights/{full.id}/", f"/api/airlines/{full.airline_id}/flights/")
+        api = APIClient()
+        self.assertFalse(api.get(urls[0]).json()["cancelled"])
+        self.assertEqual(api.get(urls[1]).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/admin/api/flight/", {"action": "cancel_flights", "_selected_action": [full.id]})
+        self.assertTrue(api.get(urls[0]).json()["cancelled"])
+        rows = {row["id"]: row for row in api.get(urls[1]).json()["results"]}
+        self.assertTrue(rows[full.id]["cancelled"])
+
+    def test_deleting_reservations_and_orphans_frees_seats(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/admin/api/flight/", {
+                "action": "release_orphan_seats", "_selected_action": [self.flight.id],
+            })
+        self.flight.refresh_from_db()
+        self.assertEqual(reserved_labels(self.flight), ["A1", "A2"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/admin/api/reservation/", {
+                "action": "delete_selected", "_selected_action": [self.booking.id], "post": "yes",
+            })
+        self.flight.refresh_from_db()
+        self.assertEqual((reserved_labels(self.flight), self.flight.available_seats), ([], 40))
+        self.assertEqual(str(Reservation(user=self.pax, flight=self.flight, seats=["A1"])),
+                         "pax - Casablanca to Paris - 1 sièges")
+
+    def test_cancelled_flight_stays_closed_after_releasing_orphans(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            hold = create_hold(self.pax, self.flight.id, ["C1"])
+            self.client.post("/admin/api/flight/", {
+                "action": "cancel_flights", "_selected_action": [self.flight.id],
+            })
+            response = self.client.post("/admin/api/flight/", {
+                "action": "release_orphan_seats", "_selected_action": [self.flight.id],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.flight.refresh_from_db()
+        self.assertTrue(self.flight.cancelled)
+        self.assertEqual((self.flight.available_seats, self.flight.seat_bitmap.free_count()), (0, 0))
+        self.assertFalse(SeatHold.objects.filter(pk=hold.pk).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_seats(self.flight.id, ["A1"])
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.available_seats, 0)
+        with self.assertRaises(FlightCancelled):
+            book_seats(self.pax, self.flight.id, 1)
+        api = APIClient()
+        api.force_authenticate(self.pax)
+        response = api.post("/api/reservations/", {"flight": self.flight.id, "seats": 1}, format="json")
+        self.assertEqual((response.status_code, response.json()["error"]),
+                         (400, f"Flight {self.flight.id} is cancelled"))
+
+
+class BenchmarkTests(TransactionTestCase):
+    databases = '__all__'
+
+    def test_seeded_run_reports_queries_and_flags_regressions(self):
+        hot = benchmark.seed(flights=40, airlines=2, users=3)
+        self.assertEqual(Flight.objects.filter(airline__name__startswith="Bench").count(), 41)
+        results = benchmark.run(benchmark.SCENARIOS, requests=6, concurrencies=[2])
+
+        self.assertEqual(set(results), {f"{name}@2" for name in benchmark.SCENARIOS})
+        for result in results.values():
+            self.assertEqual((result.requests, result.errors), (6, 0))
+            self.assertGreater(result.median_queries, 0)
+        hot.refresh_from_db()
+        self.assertEqual(hot.available_seats, benchmark.HOT_SEATS - 6)
+        self.assertEqual(Reservation.objects.filter(user__username__startswith="bench-").count(), 6)
+
+        baseline = {key: result.summary() for key, result in results.items()}
+        self.assertEqual(benchmark.compare(results, baseline), [])
+        baseline["seatmap@2"]["median_queries"] -= 1
+        self.assertEqual(len(benchmark.compare(results, baseline)), 1)
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    databases = '__all__'
+
+    def test_requests_pass_host_validation(self):
+        make_flight(total_seats=8)
+        out = io.StringIO()
+        with override_settings(ALLOWED_HOSTS=[]):
+            call_command("loadtest_catalog", requests=6, concurrency=[2], stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        for line in lines:
+            self.assertTrue(line.endswith("errors 0"), line)
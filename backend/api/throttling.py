@@ -0,0 +1,103 @@
+"""Token-bucket throttling for the booking and account endpoints.
+
+Each bucket is named in ``settings.THROTTLE_BUCKETS`` as ``"N/period"`` (a
+bucket of N tokens refilled over the period) or ``"N/period:burst"``.  Views
+pick buckets declaratively with ``throttle_classes = [bucket('login', 'ip')]``;
+DRF checks them before the handler runs, so a rejected request costs no
+database query and no password hash.  The key is the client IP, the
+authenticated user, the submitted username or the flight being booked.
+
+Buckets are stored as GCRA state (one "theoretical arrival time" per key)
+in the cache alias ``THROTTLE_CACHE_ALIAS``, a Redis cache shared by every
+worker: with a per-process cache each worker would grant the full limit on
+its own.  The default store does a read-modify-write without
+compare-and-set, so concurrent processes can overshoot a limit by a request
+or two; ``THROTTLE_STORE`` can point to an atomic store (e.g. a Redis
+script) exposing the same ``take`` method.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'min': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_bucket(spec):
+    """``"10/min"`` or ``"10/min:20"`` -> (tokens per second, burst)."""
+    rate, _, burst = spec.partition(':')
+    count, _, period = rate.partition('/')
+    count = int(count)
+    return count / PERIODS[period], int(burst) if burst else count
+
+
+class CacheBucketStore:
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        """Take one token; returns 0 when allowed, else the seconds until one is available."""
+        interval = 1 / rate
+        with self._lock:
+            arrival = max(self.cache.get(key, now), now) + interval
+            allowed_at = arrival - burst * interval
+            if allowed_at > now:
+                return allowed_at - now
+            self.cache.set(key, arrival, math.ceil(arrival - now) + 1)
+            return 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = import_string(getattr(settings, 'THROTTLE_STORE', 'api.throttling.CacheBucketStore'))()
+        return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+    key_by = 'ip'
+
+    def get_key(self, request, view):
+        if self.key_by == 'user':
+            if request.user and request.user.is_authenticated:
+                return f"user:{request.user.pk}"
+            return f"ip:{self.get_ident(request)}"
+        if self.key_by == 'username':
+            username = request.data.get('username') if hasattr(request.data, 'get') else None
+            return f"username:{str(username).strip().lower()}" if username else None
+        if self.key_by == 'flight':
+            flight_id = view.kwargs.get('flight_id')
+            if flight_id is None and hasattr(request.data, 'get'):
+                flight_id = request.data.get('flight')
+            return f"flight:{flight_id}" if flight_id is not None else None
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        self.delay = 0
+        spec = getattr(settings, 'THROTTLE_BUCKETS', {}).get(self.scope)
+        key = self.get_key(request, view)
+        if not spec or key is None:
+            return True
+        rate, burst = parse_bucket(spec)
+        self.delay = get_store().take(f"throttle:{self.scope}:{key}", rate, burst, time.time())
+        return not self.delay
+
+    def wait(self):
+        return self.delay or None
+
+
+def bucket(scope, key_by='ip'):
+    """Throttle class for one bucket of ``THROTTLE_BUCKETS``, keyed by ip, user, username or flight."""
+    return type(f"{scope.title().replace('-', '')}{key_by.title()}Throttle", (TokenBucketThrottle,),
+                {'scope': scope, 'key_by': key_by})
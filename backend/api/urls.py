@@ -4,8 +4,12 @@ from .views import (
     AirlineList, FlightList, FlightDetail, FlightViewSet,
     RegisterView, login_view, simple_reset_password,
     create_reservation, ContactMessageView, FlightSeatView, reserve_seats,
-    AirlineDetailView, process_payment, home
+    AirlineDetailView, process_payment, home, import_flights, FlightSearchView,
+    AirlineFlightList, FlightSeatMapView, seat_events, hold_seats, release_hold,
+    ItinerarySearchView, FareCalendarView, database_health, get_user_data, logo_variant,
+    metrics_view, export_reservations
 )
+from . import async_views
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -15,20 +19,44 @@ router.register(r'flights', FlightViewSet, basename='flight')
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', login_view, name='login'),
+    path('api/user/', get_user_data, name='current-user'),
 
     path('api/airlines/', AirlineList.as_view(), name='airline-list'),
     path('api/airlines/<int:id>/', AirlineDetailView.as_view(), name='airline-detail'),
+    path('api/airlines/<int:id>/flights/', AirlineFlightList.as_view(), name='airline-flights'),
 
     path('api/flights/', FlightList.as_view(), name='flight-list'),
+    path('api/flights/search/', FlightSearchView.as_view(), name='flight-search'),
+    path('api/flights/itineraries/', ItinerarySearchView.as_view(), name='flight-itineraries'),
+    path('api/flights/calendar/', FareCalendarView.as_view(), name='flight-fare-calendar'),
+    path('api/flights/import/', import_flights, name='flight-import'),
     path('api/flights/<int:pk>/', FlightDetail.as_view(), name='flight-detail'),
     path('api/flights/<int:flight_id>/seats/', FlightSeatView.as_view()),
+    path('api/flights/<int:flight_id>/seatmap/', FlightSeatMapView.as_view(), name='flight-seatmap'),
+    path('api/flights/<int:flight_id>/events/', seat_events, name='flight-seat-events'),
     path('api/flights/<int:flight_id>/reserve/', reserve_seats),
 
+    # Variantes async du catalogue (servies par backend/asgi.py)
+    path('api/async/airlines/', async_views.airline_list, name='async-airline-list'),
+    path('api/async/airlines/<int:id>/', async_views.airline_detail, name='async-airline-detail'),
+    path('api/async/airlines/<int:id>/flights/', async_views.airline_flights, name='async-airline-flights'),
+    path('api/async/flights/', async_views.flight_list, name='async-flight-list'),
+    path('api/async/flights/<int:pk>/', async_views.flight_detail, name='async-flight-detail'),
+    path('api/async/flights/<int:flight_id>/seats/', async_views.flight_seats, name='async-flight-seats'),
+
     path('api/reservations/', create_reservation, name="create_reservation"),
+    path('api/exports/<str:kind>.<str:fmt>', export_reservations, name='export-reservations'),
     path('api/reset-password/', simple_reset_password, name='simple-reset-password'),
     path('api/contact/', ContactMessageView.as_view(), name='contact'),
+    path('api/holds/', hold_seats, name='hold-seats'),
+    path('api/holds/<int:hold_id>/', release_hold, name='release-hold'),
     path('api/payment/', process_payment, name='process_payment'),
 
+    path('api/health/', database_health, name='database-health'),
+    path('metrics', metrics_view, name='metrics'),
+    # Servi aussi hors DEBUG, avant static()
+    path('media/airlines/variants/<str:name>', logo_variant, name='logo-variant'),
+
     path('', home, name='home'),
 ]
 
@@ -1,22 +1,46 @@
-from rest_framework import generics, filters, status, viewsets
+from rest_framework import generics, filters, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework.decorators import api_view, permission_classes, action
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.decorators import api_view, permission_classes, throttle_classes, action
+from rest_framework.exceptions import ValidationError as DRFValidationError
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from django.core.mail import send_mail
 from django.conf import settings
-from django.db import transaction
 from django.shortcuts import render
+from django.db import DatabaseError, connections, transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from django.utils.http import parse_etags
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+import base64
+from decimal import Decimal, InvalidOperation
+from functools import partial
 import logging
 
-from .models import Airline, Flight, Reservation, PasswordResetRequest, ContactMessage
-from .serializers import AirlineSerializer, FlightSerializer, ReservationSerializer, UserSerializer, ContactMessageSerializer
+from .models import Airline, Flight, Reservation, PasswordResetRequest, ContactMessage, SeatHold, FareDay, city_key
+from .serializers import AirlineSerializer, FlightSerializer, ReservationSerializer, UserSerializer, ContactMessageSerializer, SeatHoldSerializer, FareDaySerializer
+from .importer import DEFAULT_CHUNK_SIZE, FORMATS, FlightImporter, format_for, read_rows, text_stream
+from .filters import FlightFilter, start_of_day
+from .broker import event_stream
+from .cache import AIRLINE, FARES, CachedResponseMixin
+from .query_plan import SerializerQueryMixin, query_plan
+from .routers import ReplicaReadMixin, read_alias
+from .authentication import tokens_for
+from .jobs import booking_confirmation, send_email_later
+from .throttling import bucket
+from .images import variant_response
+from . import exports, metrics
+from .exports import FORMATS as EXPORT_FORMATS
+from .itineraries import MAX_STOPS, best, get_index
+from .holds import HoldExpired, cancel_hold, convert_hold, create_hold
+from .inventory import book_seats, changes_since, claim_any, claim_seats, reserved_labels, stats as inventory_stats
+from .seatmap import ROWS, FlightCancelled, SeatConflict, SeatError, SeatUnavailable, reserved_ranges, seats_per_row
 
 logger = logging.getLogger(__name__)
 
@@ -25,93 +49,317 @@ def home(request):
     return render(request, 'home.html')
 
 # List all airlines
-class AirlineList(generics.ListAPIView):
+class AirlineList(ReplicaReadMixin, CachedResponseMixin, generics.ListAPIView):
     queryset = Airline.objects.all()
     serializer_class = AirlineSerializer
+    keyset_ordering = ('name', 'id')
+    cache_namespaces = (AIRLINE,)
 
 # Airline detail view
-class AirlineDetailView(APIView):
-    def get(self, request, id):
-        try:
-            airline = Airline.objects.get(id=id)
-            serializer = AirlineSerializer(airline)
-            return Response(serializer.data)
-        except Airline.DoesNotExist:
-            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+class AirlineDetailView(ReplicaReadMixin, CachedResponseMixin, generics.RetrieveAPIView):
+    queryset = Airline.objects.all()
+    serializer_class = AirlineSerializer
+    lookup_field = 'id'
+    cache_namespaces = (AIRLINE,)
 
 # List and filter flights
-class FlightList(generics.ListAPIView):
+class FlightList(ReplicaReadMixin, CachedResponseMixin, SerializerQueryMixin, generics.ListAPIView):
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['airline', 'departure_time']
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filterset_class = FlightFilter
     search_fields = ['departure_city', 'arrival_city']
-    ordering_fields = ['price']
+    # ?ordering= picks the keyset used by the paginator
+    ordering_fields = ['departure_time', 'price', 'available_seats']
+
+    def get_keyset_ordering(self, request):
+        return flight_keyset(request, self.ordering_fields)
+
+# Flights of one airline, with the same filters as FlightList
+class AirlineFlightList(FlightList):
+    def get_queryset(self):
+        return super().get_queryset().filter(airline_id=self.kwargs['id'])
+
+# Route search: origin/destination on the normalized city keys, backed by flight_route_idx
+class FlightSearchView(ReplicaReadMixin, CachedResponseMixin, SerializerQueryMixin, generics.ListAPIView):
+    queryset = Flight.objects.all()
+    serializer_class = FlightSerializer
+    SORTS = {
+        'departure': ('departure_time', 'id'),
+        'price': ('price', 'id'),
+    }
+
+    def get_keyset_ordering(self, request):
+        return self.SORTS[request.query_params.get('sort', 'departure')]
+
+    def get_queryset(self):
+        params = self.request.query_params
+        origin, destination = city_key(params.get('origin')), city_key(params.get('destination'))
+        if not origin or not destination:
+            raise DRFValidationError({"error": "origin and destination are required"})
+        if params.get('sort', 'departure') not in self.SORTS:
+            raise DRFValidationError({"error": f"sort must be one of {', '.join(self.SORTS)}"})
+        queryset = super().get_queryset().filter(departure_key=origin, arrival_key=destination)
+
+        date_from, date_to = params.get('date_from', params.get('date')), params.get('date_to', params.get('date'))
+        if date_from:
+            queryset = queryset.filter(departure_time__gte=day_start(date_from, 'date_from'))
+        if date_to:
+            queryset = queryset.filter(departure_time__lt=day_start(date_to, 'date_to') + timedelta(days=1))
+        try:
+            if params.get('max_price'):
+                queryset = queryset.filter(price__lte=Decimal(params['max_price']))
+            if params.get('min_seats'):
+                queryset = queryset.filter(available_seats__gte=int(params['min_seats']))
+        except (InvalidOperation, ValueError):
+            raise DRFValidationError({"error": "max_price and min_seats must be numbers"})
+        return queryset
+
+
+def flight_keyset(request, allowed, default='departure_time'):
+    ordering = request.query_params.get('ordering', default)
+    field = ordering.lstrip('-')
+    if field not in allowed:
+        raise DRFValidationError({"error": f"ordering must be one of {', '.join(allowed)}"})
+    desc = '-' if ordering.startswith('-') else ''
+    return (ordering, f'{desc}id')
+
+
+def day_start(value, name):
+    try:
+        day = parse_date(value) if value else None
+    except ValueError:  # Well formed but not a real day, e.g. 2024-02-30
+        day = None
+    if day is None:
+        raise DRFValidationError({"error": f"{name} must be a date (YYYY-MM-DD)"})
+    return start_of_day(day)
+
+# Fare calendar: cheapest fare per day of a month, read from FareDay (see api/fares.py)
+class FareCalendarView(ReplicaReadMixin, CachedResponseMixin, generics.ListAPIView):
+    serializer_class = FareDaySerializer
+    pagination_class = None
+    cache_namespaces = (FARES,)
+
+    def get_queryset(self):
+        params = self.request.query_params
+        origin, destination = city_key(params.get('origin')), city_key(params.get('destination'))
+        if not origin or not destination:
+            raise DRFValidationError({"error": "origin and destination are required"})
+        try:
+            first = parse_date(f"{params.get('month', '')}-01")
+        except ValueError:  # e.g. 2024-13
+            first = None
+        if first is None:
+            raise DRFValidationError({"error": "month must be YYYY-MM"})
+        following = (first + timedelta(days=32)).replace(day=1)
+        return FareDay.objects.filter(
+            departure_key=origin, arrival_key=destination, day__gte=first, day__lt=following,
+        ).order_by('day')
+
+# Connecting itineraries (in-memory schedule index, see api/itineraries.py)
+class ItinerarySearchView(ReplicaReadMixin, APIView):
+    def get(self, request):
+        params = request.query_params
+        origin, destination = city_key(params.get('origin')), city_key(params.get('destination'))
+        if not origin or not destination or origin == destination:
+            raise DRFValidationError({"error": "origin and destination are required and must differ"})
+        start = day_start(params.get('date'), 'date')
+        try:
+            max_stops = int(params.get('max_stops', 1))
+            seats = int(params.get('seats', 1))
+            limit = int(params.get('limit', 20))
+        except ValueError:
+            raise DRFValidationError({"error": "max_stops, seats and limit must be numbers"})
+        if not 0 <= max_stops <= MAX_STOPS:
+            raise DRFValidationError({"error": f"max_stops must be between 0 and {MAX_STOPS}"})
+        limit = max(1, min(limit, getattr(settings, 'API_MAX_PAGE_SIZE', 100)))
+
+        ranked = get_index().search(origin, destination, start, start + timedelta(days=1), max_stops)
+        flights, results = {}, []
+
+        def bookable(itinerary):
+            return all(leg.id in flights and flights[leg.id].available_seats >= seats for leg in itinerary.legs)
+
+        # Seats are not in the index: load the legs of the best candidates a chunk at a time
+        for offset in range(0, len(ranked), limit * 4):
+            chunk = ranked[offset:offset + limit * 4]
+            missing = {leg.id for itinerary in chunk for leg in itinerary.legs} - flights.keys()
+            queryset = query_plan(FlightSerializer).apply(Flight.objects.filter(id__in=missing))
+            flights.update((flight.id, flight) for flight in queryset)
+            results += best(chunk, limit - len(results), bookable)
+            if len(results) >= limit:
+                break
+        return Response({"results": [
+            {
+                "stops": itinerary.stops,
+                "duration_minutes": int(itinerary.duration // 60),
+                "total_price": str(itinerary.price),
+                "flights": FlightSerializer([flights[leg.id] for leg in itinerary.legs], many=True).data,
+            }
+            for itinerary in results
+        ]})
 
 # Flight detail
-class FlightDetail(generics.RetrieveAPIView):
+class FlightDetail(ReplicaReadMixin, CachedResponseMixin, SerializerQueryMixin, generics.RetrieveAPIView):
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
 
 # Flight seats view
-class FlightSeatView(APIView):
+class FlightSeatView(ReplicaReadMixin, APIView):
     def get(self, request, flight_id):
         try:
-            flight = Flight.objects.get(id=flight_id)
-            reserved = flight.reserved_seat_ids.keys()
-            available = flight.total_seats - len(reserved)
-            return Response({"available_seats": available, "reserved_seats": list(reserved)})
+            flight = Flight.objects.only('id', 'total_seats', 'seat_map', 'available_seats').get(id=flight_id)
+            return Response({"available_seats": flight.available_seats, "reserved_seats": reserved_labels(flight)})
         except Flight.DoesNotExist:
             return Response({"error": "Flight not found"}, status=404)
 
     def patch(self, request, flight_id):
+        requested = request.data.get("reserved_seats", [])
+        if not isinstance(requested, list):
+            return Response({"error": "reserved_seats must be a list"}, status=400)
         try:
-            flight = Flight.objects.get(id=flight_id)
-            requested = request.data.get("reserved_seats", [])
-            for seat in requested:
-                if seat in flight.reserved_seat_ids:
-                    return Response({"error": f"Seat {seat} already reserved"}, status=400)
-            if len(requested) > (flight.total_seats - len(flight.reserved_seat_ids)):
-                return Response({"error": "Not enough seats"}, status=400)
-            flight.reserved_seat_ids.update({seat: True for seat in requested})
-            flight.save()
-            return Response({"message": "Seats reserved", "reserved_seats": list(flight.reserved_seat_ids.keys())})
+            claimed = claim_seats(flight_id, requested)
         except Flight.DoesNotExist:
             return Response({"error": "Flight not found"}, status=404)
+        except SeatConflict as e:
+            return Response({"error": str(e)}, status=409)
+        except SeatError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({"message": "Seats reserved", "reserved_seats": claimed})
+
+# Compact seat map: base64 bitmap or per-row ranges, or only the changes since a version
+class FlightSeatMapView(ReplicaReadMixin, APIView):
+    def get(self, request, flight_id):
+        try:
+            flight = Flight.objects.only('id', 'total_seats', 'seat_map', 'seat_version', 'available_seats').get(id=flight_id)
+        except Flight.DoesNotExist:
+            return Response({"error": "Flight not found"}, status=404)
+        etag = f'"seats-{flight.id}-{flight.seat_version}"'
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=304)
+            response['ETag'] = etag
+            return response
+
+        data = {"version": flight.seat_version, "available_seats": flight.available_seats}
+        since = request.query_params.get('since')
+        changes = changes_since(flight, int(since)) if since and since.isdigit() else None
+        if changes is not None:
+            data.update({"since": int(since), "reserved": changes[0], "released": changes[1]})
+        else:
+            bitmap = flight.seat_bitmap
+            data.update({"rows": ROWS, "seats_per_row": seats_per_row(flight.total_seats)})
+            if request.query_params.get('encoding') == 'ranges':
+                data["reserved_ranges"] = reserved_ranges(bitmap, flight.total_seats)
+            else:
+                data["bitmap"] = base64.b64encode(bitmap.to_bytes()).decode()
+        response = Response(data)
+        response['ETag'] = etag
+        return response
+
+# Seat changes pushed as Server-Sent Events; needs the ASGI entry point (backend/asgi.py)
+async def seat_events(request, flight_id):
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Seat events are only served under ASGI"}, status=501)
+    if not await Flight.objects.filter(id=flight_id).aexists():
+        return JsonResponse({"error": "Flight not found"}, status=404)
+    response = StreamingHttpResponse(event_stream(flight_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 # Reserve seats dynamically
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([bucket('reserve', 'ip'), bucket('reserve-flight', 'flight')])
 def reserve_seats(request, flight_id):
     seats_to_reserve = request.data.get('seats', 1)
     if not isinstance(seats_to_reserve, int) or seats_to_reserve <= 0:
         return Response({"error": "Invalid seat count"}, status=400)
-    with transaction.atomic():
-        try:
-            flight = Flight.objects.select_for_update().get(id=flight_id)
-        except Flight.DoesNotExist:
-            return Response({"error": "Flight not found"}, status=404)
-        available = flight.total_seats - len(flight.reserved_seat_ids)
-        if seats_to_reserve > available:
-            return Response({"error": "Not enough seats"}, status=400)
-        new_seats = [f"Seat{len(flight.reserved_seat_ids) + i + 1}" for i in range(seats_to_reserve)]
-        flight.reserved_seat_ids.update({seat: True for seat in new_seats})
-        flight.save()
+    try:
+        new_seats = claim_any(flight_id, seats_to_reserve)
+    except Flight.DoesNotExist:
+        return Response({"error": "Flight not found"}, status=404)
+    except FlightCancelled as e:
+        return Response({"error": str(e)}, status=400)
+    except SeatUnavailable:
+        return Response({"error": "Not enough seats"}, status=400)
+    except SeatConflict as e:
+        return Response({"error": str(e)}, status=409)
     return Response({"message": "Reservation successful", "reserved_seats": new_seats})
 
-# Create reservation
+# Bulk import of a flight schedule (JSON list or uploaded CSV / JSON-lines / JSON array file)
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def import_flights(request):
+    try:
+        importer = FlightImporter(chunk_size=request.query_params.get('chunk_size', DEFAULT_CHUNK_SIZE))
+    except ValueError:
+        return Response({"error": "Invalid chunk_size"}, status=400)
+    upload = request.FILES.get('file')
+    if upload is not None:
+        fmt = request.data.get('format') or format_for(upload.name)
+        if fmt not in FORMATS:
+            return Response({"error": f"Unknown format {fmt}"}, status=400)
+        rows = read_rows(text_stream(upload), fmt)
+    elif isinstance(request.data, list):
+        rows = request.data
+    else:
+        return Response({"error": "Send a list of flights or a 'file' upload"}, status=400)
+    try:
+        result = importer.run(rows)
+    except (ValueError, UnicodeDecodeError) as e:
+        return Response({"error": str(e)}, status=400)
+    return Response(result.as_dict(), status=201 if result.created else 400)
+
+# Streaming exports of reservations and passenger manifests (CSV or NDJSON), see api/exports.py
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_reservations(request, kind, fmt):
+    if kind not in exports.KINDS or fmt not in EXPORT_FORMATS:
+        return Response({"error": f"Unknown export {kind}.{fmt}"}, status=404)
+    params = request.query_params
+    try:
+        flight = int(params['flight']) if params.get('flight') else None
+    except ValueError:
+        return Response({"error": "Invalid flight"}, status=400)
+    departs_from = day_start(params['date_from'], 'date_from') if params.get('date_from') else None
+    departs_before = day_start(params['date_to'], 'date_to') + timedelta(days=1) if params.get('date_to') else None
+    # The rows are read while the response streams, after the routing middleware has returned
+    queryset = exports.reservations(flight, departs_from, departs_before, using=read_alias())
+    response = StreamingHttpResponse(exports.export(kind, fmt, queryset), content_type=EXPORT_FORMATS[fmt][0])
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Create reservation: claims the seats and writes the booking in one transaction
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([bucket('booking', 'user'), bucket('booking-flight', 'flight')])
 def create_reservation(request):
-    serializer = ReservationSerializer(data=request.data)
-    if serializer.is_valid():
-        serializer.save()  # <-- Ceci doit créer l’objet en base
-        return Response(serializer.data, status=201)
-    return Response(serializer.errors, status=400)
+    flight_id, seats = request.data.get('flight'), request.data.get('seats')
+    valid_seats = (isinstance(seats, list) and seats and all(isinstance(seat, str) for seat in seats)) or (
+        isinstance(seats, int) and not isinstance(seats, bool) and seats > 0)
+    if not isinstance(flight_id, int) or not valid_seats:
+        return Response({"error": "flight and seats (labels or a count) are required"}, status=400)
+    try:
+        # L'e-mail de confirmation est mis en file dans la transaction de la réservation
+        reservation = book_seats(request.user, flight_id, seats, on_booked=partial(booking_confirmation, request.user))
+    except Flight.DoesNotExist:
+        return Response({"error": "Flight not found"}, status=404)
+    except FlightCancelled as e:
+        return Response({"error": str(e)}, status=400)
+    except SeatUnavailable as e:
+        return Response({"error": str(e) if e.labels else "Not enough seats"}, status=400)
+    except SeatConflict as e:
+        return Response({"error": str(e)}, status=409)
+    except SeatError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response(ReservationSerializer(reservation).data, status=201)
 
 # User registration
 class RegisterView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [bucket('register', 'ip')]
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
@@ -123,56 +371,53 @@ class RegisterView(APIView):
         except ValidationError as e:
             return Response({'error': e.messages}, status=400)
         user = User.objects.create_user(username=username, password=password, email=email)
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for(user)
         user_data = UserSerializer(user).data
         return Response({'user': user_data, 'refresh': str(refresh), 'access': str(refresh.access_token)}, status=201)
 
 # Login with JWT
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([bucket('login', 'ip'), bucket('login-user', 'username')])
 def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
     user = authenticate(username=username, password=password)
     if user:
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for(user)
         user_data = UserSerializer(user).data
         return Response({'user': user_data, 'refresh': str(refresh), 'access': str(refresh.access_token)})
     return Response({'error': 'Invalid credentials'}, status=401)
 
-# Password reset via email
+# Password reset via email (sent by the run_jobs worker)
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([bucket('password-reset', 'ip')])
 def reset_password(request):
     email = request.data.get('email')
     if email:
-        try:
-            send_mail("Password Reset", "Password reset request.", settings.DEFAULT_FROM_EMAIL, [email])
-            return Response({"message": f"Password reset email sent to {email}"})
-        except Exception as e:
-            logger.error(f"Email error: {str(e)}")
-            return Response({"error": str(e)}, status=500)
+        send_email_later("Password Reset", "Password reset request.", [email])
+        return Response({"message": f"Password reset email queued for {email}"})
     return Response({"error": "Email required"}, status=400)
 
-# Store reset request
+# Store reset request and notify the admin in the background
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([bucket('password-reset', 'ip')])
 def simple_reset_password(request):
     email = request.data.get('email')
     username = request.data.get('username', '')
     message = request.data.get('message', '')
     if not email:
         return Response({'error': 'Email required'}, status=400)
-    try:
+    with transaction.atomic():
         PasswordResetRequest.objects.create(email=email, username=username, message=message)
-        send_mail(f"Reset request from {username}", message, settings.DEFAULT_FROM_EMAIL, [settings.DEFAULT_FROM_EMAIL])
-        return Response({'success': 'Request recorded. Admin will contact you.'})
-    except Exception as e:
-        logger.error(f"Reset request error: {str(e)}")
-        return Response({'error': str(e)}, status=500)
+        send_email_later(f"Reset request from {username}", message, [settings.DEFAULT_FROM_EMAIL])
+    return Response({'success': 'Request recorded. Admin will contact you.'})
 
 # Contact message
 class ContactMessageView(APIView):
+    throttle_classes = [bucket('contact', 'ip')]
     def post(self, request):
         serializer = ContactMessageSerializer(data=request.data)
         if serializer.is_valid():
@@ -181,26 +426,105 @@ class ContactMessageView(APIView):
         return Response(serializer.errors, status=400)
 
 # ViewSet for Flight
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightViewSet(SerializerQueryMixin, viewsets.ModelViewSet):
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
     http_method_names = ['get', 'post', 'put', 'patch']
+    keyset_ordering = ('departure_time', 'id')
+
+    def perform_update(self, serializer):
+        # Un siège vendu entre la validation et l'écriture
+        try:
+            serializer.save()
+        except SeatError as e:
+            raise DRFValidationError({"error": str(e)})
 
     @action(methods=['patch'], detail=True)
     def update_seats(self, request, pk=None):
         flight = self.get_object()
         seats = request.data.get('seats')
-        if seats is not None:
-            flight.seats = seats
-            flight.save()
-            return Response({'status': 'Seats updated'})
-        return Response({'error': 'Missing seats data'}, status=400)
+        if not isinstance(seats, list):
+            return Response({'error': 'Missing seats data'}, status=400)
+        try:
+            claim_seats(flight.id, seats)
+        except SeatConflict as e:
+            return Response({'error': str(e)}, status=409)
+        except SeatError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({'status': 'Seats updated'})
+
+# Hold seats for the duration of checkout
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([bucket('booking', 'user'), bucket('booking-flight', 'flight')])
+def hold_seats(request):
+    flight_id, seats = request.data.get('flight'), request.data.get('seats')
+    if not isinstance(flight_id, int) or not isinstance(seats, list) or not seats:
+        return Response({"error": "flight and a list of seats are required"}, status=400)
+    try:
+        hold = create_hold(request.user, flight_id, seats, request.data.get('minutes'))
+    except Flight.DoesNotExist:
+        return Response({"error": "Flight not found"}, status=404)
+    except SeatConflict as e:
+        return Response({"error": str(e)}, status=409)
+    except SeatError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response(SeatHoldSerializer(hold).data, status=201)
+
+# Give held seats back before the hold expires
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated])
+def release_hold(request, hold_id):
+    try:
+        cancel_hold(request.user, hold_id)
+    except SeatHold.DoesNotExist:
+        return Response({"error": "Hold not found"}, status=404)
+    return Response(status=204)
 
-# Dummy payment
+# Dummy payment; with a hold id it turns the hold into a reservation
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def process_payment(request):
-    return Response({"message": "Payment successful!"})
+    hold_id = request.data.get('hold')
+    if hold_id is None:
+        return Response({"message": "Payment successful!"})
+    try:
+        reservation = convert_hold(request.user, hold_id, on_booked=partial(booking_confirmation, request.user))
+    except (SeatHold.DoesNotExist, ValueError):
+        return Response({"error": "Hold not found"}, status=404)
+    except HoldExpired:
+        return Response({"error": "Hold expired, please select your seats again"}, status=410)
+    except FlightCancelled as e:
+        return Response({"error": str(e)}, status=410)
+    return Response({"message": "Payment successful!", "reservation": ReservationSerializer(reservation).data})
+
+# Logo variants: content-hashed names, so they can be cached for a year
+@require_safe
+def logo_variant(request, name):
+    return variant_response(request, name)
+
+# Prometheus scrape endpoint (this worker's aggregates)
+@require_safe
+def metrics_view(request):
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1']):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.registry.render(inventory_stats.snapshot()), content_type='text/plain; version=0.0.4')
+
+# Database health: primary and every replica answer a trivial query
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def database_health(request):
+    databases = {}
+    for alias in connections:
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            databases[alias] = "ok"
+        except DatabaseError as e:
+            logger.warning("Database %s unavailable: %s", alias, e)
+            databases[alias] = "unavailable"
+    healthy = all(state == "ok" for state in databases.values())
+    return Response({"databases": databases}, status=200 if healthy else 503)
 
 # Get current user
 @api_view(['GET'])
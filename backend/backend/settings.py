@@ -46,12 +46,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # En premier: mesure toute la requête (voir api/metrics.py)
+    'api.metrics.MetricsMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.routers.DatabaseRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,10 +91,25 @@ DATABASES = {
         'PASSWORD': '',
         'HOST': '127.0.0.1',
         'PORT':'3306',
+        # Connexions persistantes, vérifiées avant réutilisation
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
     }
 
 }
 
+# Réplicas en lecture, ex. DB_REPLICA_HOSTS="10.0.0.2,10.0.0.3" (voir api/routers.py)
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Toujours défini, jamais routé hors des tests: miroir du primaire pour les tests du routage
+DATABASES['mirror'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+# Après une écriture, le client lit sur le primaire pendant ce délai (retard de réplication)
+DATABASE_STICKY_SECONDS = 5
+# Durée de cache des réponses construites depuis une réplique
+REPLICA_CACHE_TIMEOUT = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -138,9 +156,86 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # JWT sans requête auth_user par appel (voir api/authentication.py)
+        'api.authentication.ClaimsJWTAuthentication',
+    ),
+    # Pagination par curseur (voir api/pagination.py)
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
+# Caches partagés par tous les workers (paquet redis requis), ex. REDIS_URL="redis://10.0.0.5:6379".
+# 'default': révocation des jetons, épinglage au primaire;
+# 'api': réponses du catalogue et leurs tampons de version (voir api/cache.py);
+# 'throttle': seaux de limitation de débit (api/throttling.py). Une base Redis chacun
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/0',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/1',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': f'{REDIS_URL}/2',
+    },
 }
+API_CACHE_ALIAS = 'api'
+API_CACHE_TIMEOUT = 300
+
+# Diffusion des changements de sièges (voir api/broker.py)
+SEAT_BROKER = 'api.broker.LocalBroker'
+
+# Durée par défaut / maximale d'un blocage de sièges pendant le paiement (minutes)
+SEAT_HOLD_MINUTES = 10
+SEAT_HOLD_MAX_MINUTES = 30
+
+# Durée de cache du statut utilisateur (actif, staff, mot de passe) pour l'authentification JWT
+AUTH_USER_CACHE_SECONDS = 60
+
+# Tâches de fond (api/jobs.py, commande run_jobs): essais maximum et bail d'un worker (secondes).
+# Les e-mails partent via EMAIL_BACKEND (SMTP par défaut, locmem pendant les tests)
+JOB_MAX_ATTEMPTS = 5
+JOB_LEASE_SECONDS = 300
+
+# Limitation de débit par seau à jetons (api/throttling.py): "N/période" ou "N/période:rafale"
+# Cache partagé par tous les workers: un cache local multiplierait chaque limite par le nombre de processus
+THROTTLE_CACHE_ALIAS = 'throttle'
+THROTTLE_BUCKETS = {
+    'login': '20/min',
+    'login-user': '5/min:10',
+    'register': '10/hour',
+    'password-reset': '5/hour',
+    'contact': '10/hour',
+    'reserve': '30/min',
+    'reserve-flight': '20/s:50',
+    'booking': '30/min',
+    'booking-flight': '20/s:50',
+}
+
+# Exports CSV / NDJSON (api/exports.py): lignes lues par requête
+EXPORT_CHUNK_SIZE = 2000
+
+# Instrumentation (api/metrics.py): seuil du journal 'api.slowquery' et accès à /metrics
+SLOW_QUERY_MS = 200
+METRICS_ALLOWED_IPS = ['127.0.0.1']
+
+# Admin: au-delà de ce nombre de lignes, la liste non filtrée affiche le compte estimé (MySQL/PostgreSQL)
+ADMIN_ESTIMATED_COUNT_MIN = 100000
+
+# Plafond du paramètre ?page_size= des listes paginées
+API_MAX_PAGE_SIZE = 100
+
+# Recherche de correspondances: temps de connexion minimal et escale maximale
+ITINERARY_MIN_CONNECTION_MINUTES = 45
+ITINERARY_MAX_LAYOVER_HOURS = 12
+
+# Variantes de logos: déléguer l'envoi au serveur web, ex. 'X-Accel-Redirect' avec le préfixe interne nginx
+MEDIA_SENDFILE_HEADER = None
+MEDIA_SENDFILE_PREFIX = '/protected-media/'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -10,6 +10,7 @@ function AirlineDetails() {
 
   const [flights, setFlights] = useState([]);
   const [showFlights, setShowFlights] = useState(false);
+  const [nextFlights, setNextFlights] = useState(null);
 
   useEffect(() => {
     axios.get(`http://127.0.0.1:8000/api/airlines/${id}/`)
@@ -23,12 +24,12 @@ function AirlineDetails() {
       });
   }, [id]);
 
-  const fetchFlights = () => {
-    axios.get(`http://127.0.0.1:8000/api/flights/?is_available=true`)
+  // Sans argument: première page; avec l'URL "next" de la réponse précédente: page suivante
+  const fetchFlights = (url = null) => {
+    axios.get(url || `http://127.0.0.1:8000/api/airlines/${id}/flights/?is_available=true`)
       .then(response => {
-        const allFlights = response.data;
-        const filteredFlights = allFlights.filter(flight => flight.airline === parseInt(id));
-        setFlights(filteredFlights);
+        setFlights(prev => url ? [...prev, ...response.data.results] : response.data.results);
+        setNextFlights(response.data.next);
         setShowFlights(true);
       })
       .catch(error => {
@@ -68,11 +69,16 @@ function AirlineDetails() {
       </Link>
 
       <div className="bg-white shadow-xl rounded-lg p-8 max-w-2xl w-full text-center">
-        <img
-          src={`http://127.0.0.1:8000${airline.logo}`}
-          alt={airline.name}
-          className="h-40 mx-auto object-contain mb-6"
-        />
+        <picture>
+          {airline.logo_variants?.medium && (
+            <source srcSet={airline.logo_variants.medium.webp} type="image/webp" />
+          )}
+          <img
+            src={airline.logo_variants?.medium?.png || airline.logo}
+            alt={airline.name}
+            className="h-40 mx-auto object-contain mb-6"
+          />
+        </picture>
        
 
         <p className="text-gray-700 text-base mb-4">
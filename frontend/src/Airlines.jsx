@@ -7,17 +7,24 @@ function Airlines() {
   const [airlines, setAirlines] = useState([]);
   const [loading, setLoading] = useState(true);  // Pour gérer l'état de chargement
   const [error, setError] = useState(null);  // Pour gérer les erreurs
+  const [nextUrl, setNextUrl] = useState(null);  // Page suivante de la liste (null sur la dernière)
 
-  useEffect(() => {
-    axios.get("http://127.0.0.1:8000/api/airlines/")
+  const loadAirlines = (url, append = false) => {
+    setLoading(true);
+    axios.get(url)
       .then(response => {
-        setAirlines(response.data);
+        setAirlines(prev => append ? [...prev, ...response.data.results] : response.data.results);
+        setNextUrl(response.data.next);
         setLoading(false);  // Une fois les données récupérées, on arrête le chargement
       })
       .catch(error => {
         setError("Erreur lors de la récupération des compagnies");
         setLoading(false);  // Arrêter le chargement même en cas d'erreur
       });
+  };
+
+  useEffect(() => {
+    loadAirlines("http://127.0.0.1:8000/api/airlines/");
   }, []);
 
   return (
@@ -77,6 +84,18 @@ function Airlines() {
               !loading && <p className="text-gray-600 text-center mt-4">Aucune compagnie aérienne disponible.</p>
             )}
           </ul>
+
+          {nextUrl && (
+            <div className="mt-6 text-center">
+              <button
+                onClick={() => loadAirlines(nextUrl, true)}
+                disabled={loading}
+                className="bg-indigo-600 text-white py-2 px-6 rounded-full hover:bg-indigo-700 transition duration-300"
+              >
+                {loading ? "Chargement..." : "Afficher plus de compagnies"}
+              </button>
+            </div>
+          )}
         </div>
       </div>
     </div>
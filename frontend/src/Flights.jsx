@@ -10,6 +10,8 @@ function Flights() {
   const [selectedSeats, setSelectedSeats] = useState([]);
   const [showModal, setShowModal] = useState(false);
   const [seatVisibility, setSeatVisibility] = useState({});
+  const [nextUrl, setNextUrl] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const navigate = useNavigate();
   const location = useLocation();
 
@@ -22,30 +24,45 @@ function Flights() {
 
     const params = new URLSearchParams();
     if (airlineId) params.append("airline", airlineId);
+    params.append("is_available", "true");
+    params.append("departure_from", new Date().toISOString().slice(0, 10));
 
     const url = `http://127.0.0.1:8000/api/flights/?${params.toString()}`;
 
-    axios.get(url)
-      .then((response) => {
-        const updatedFlights = response.data.map((flight) => ({
-          ...flight,
-          seats: flight.seats !== undefined ? flight.seats : 100,
-          reservedSeats: flight.reservedSeats || [],
-        }));
+    loadFlights(url, false)
+      .catch((error) => console.error("Erreur lors de la récupération des vols", error));
+  }, [airlineId]);
+
+  // Une page de la liste; "next" (URL complète, null sur la dernière page) sert au bouton "Afficher plus"
+  const loadFlights = (url, append) =>
+    axios.get(url).then((response) => {
+      const updatedFlights = response.data.results.map((flight) => ({
+        ...flight,
+        seats: flight.seats !== undefined ? flight.seats : 100,
+        reservedSeats: flight.reservedSeats || [],
+      }));
 
-        const availableFlights = updatedFlights.filter((flight) => {
-          const departureTime = new Date(flight.departure_time).getTime();
-          return departureTime > Date.now();
-        });
+      const availableFlights = updatedFlights.filter((flight) => {
+        const departureTime = new Date(flight.departure_time).getTime();
+        return departureTime > Date.now();
+      });
 
-        setFlights(availableFlights);
+      setFlights((prev) => (append ? [...prev, ...availableFlights] : availableFlights));
 
-        const visibility = {};
+      setSeatVisibility((prev) => {
+        const visibility = append ? { ...prev } : {};
         availableFlights.forEach(f => { visibility[f.id] = false; });
-        setSeatVisibility(visibility);
-      })
-      .catch((error) => console.error("Erreur lors de la récupération des vols", error));
-  }, [airlineId]);
+        return visibility;
+      });
+      setNextUrl(response.data.next);
+    });
+
+  const loadMoreFlights = () => {
+    setLoadingMore(true);
+    loadFlights(nextUrl, true)
+      .catch((error) => console.error("Erreur lors de la récupération des vols", error))
+      .finally(() => setLoadingMore(false));
+  };
 
   const calculateTimeLeft = (departureTime) => {
     const departureDate = new Date(departureTime);
@@ -240,6 +257,18 @@ function Flights() {
               <p>Aucun vol disponible</p>
             </div>
           )}
+
+          {nextUrl && (
+            <div className="text-center mt-8">
+              <button
+                onClick={loadMoreFlights}
+                disabled={loadingMore}
+                className="px-6 py-3 bg-indigo-600 text-white rounded-lg font-semibold hover:bg-indigo-700"
+              >
+                {loadingMore ? "Chargement..." : "Afficher plus de vols"}
+              </button>
+            </div>
+          )}
         </div>
       </main>
 
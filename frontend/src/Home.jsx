@@ -8,6 +8,7 @@ import '@fortawesome/fontawesome-free/css/all.min.css';
 function Home() {
   const [user, setUser] = useState(null);
   const [airlines, setAirlines] = useState([]);
+  const [nextAirlines, setNextAirlines] = useState(null);
   const [showScrollButton, setShowScrollButton] = useState(false);
 
   useEffect(() => {
@@ -16,13 +17,7 @@ function Home() {
       setUser(JSON.parse(userData));
     }
 
-    axios.get("http://127.0.0.1:8000/api/airlines/")
-      .then(response => {
-        setAirlines(response.data);
-      })
-      .catch(error => {
-        console.error("Erreur lors du chargement des compagnies :", error);
-      });
+    loadAirlines("http://127.0.0.1:8000/api/airlines/");
 
     const handleScroll = () => {
       if (window.scrollY > 300) {
@@ -36,6 +31,18 @@ function Home() {
     return () => window.removeEventListener("scroll", handleScroll);
   }, []);
 
+  // Les listes sont paginées: "next" pointe vers la page suivante (null sur la dernière)
+  const loadAirlines = (url, append = false) => {
+    axios.get(url)
+      .then(response => {
+        setAirlines(prev => append ? [...prev, ...response.data.results] : response.data.results);
+        setNextAirlines(response.data.next);
+      })
+      .catch(error => {
+        console.error("Erreur lors du chargement des compagnies :", error);
+      });
+  };
+
   const handleLogout = () => {
     localStorage.removeItem("user");
     setUser(null);
@@ -97,14 +104,29 @@ function Home() {
               to={`/airlines/${airline.id}`}
               className="hover:scale-110 transition-transform duration-300"
             >
-              <img
-                src={airline.logo}
-                alt={airline.name}
-                className="w-32 h-32 object-contain"
-              />
+              {/* Variante 256px (WebP si supporté), logo d'origine tant qu'elle n'est pas générée */}
+              <picture>
+                {airline.logo_variants?.small && (
+                  <source srcSet={airline.logo_variants.small.webp} type="image/webp" />
+                )}
+                <img
+                  src={airline.logo_variants?.small?.png || airline.logo}
+                  alt={airline.name}
+                  className="w-32 h-32 object-contain"
+                  loading="lazy"
+                />
+              </picture>
             </Link>
           ))}
         </div>
+        {nextAirlines && (
+          <button
+            onClick={() => loadAirlines(nextAirlines, true)}
+            className="mt-10 bg-indigo-600 text-white px-6 py-2 rounded-full hover:bg-indigo-700 transition"
+          >
+            Voir plus de compagnies
+          </button>
+        )}
       </div>
 
       {/* About Section */}
@@ -31,7 +31,7 @@ function Flights() {
     axios
       .get(url)
       .then((response) => {
-        const updatedFlights = response.data.map((flight) => ({
+        const updatedFlights = response.data.results.map((flight) => ({
           ...flight,
           seats: flight.seats !== undefined ? flight.seats : 100, // Nombre total de sièges
           reservedSeats: flight.reservedSeats || [], // Liste des sièges réservés (nouveau champ)